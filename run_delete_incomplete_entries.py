@@ -14,46 +14,66 @@ from dotenv import load_dotenv
 from src.app.utils.sha256_util import Sha256Util
 
 load_dotenv()
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 from src.app.log.logger import logger
-from src.app.db.mapper.image_info_mapper import ImageInfoMapper
+from src.app.db.db_backend import DBBackend
 
 
 class DeleteIncompleteEntriesUtil:
-    engine = create_engine(f"postgresql://"
-                           f"{os.getenv('POSTGRESQL_USER')}:{os.getenv('POSTGRESQL_PASSWORD')}"
-                           f"@{os.getenv('POSTGRESQL_HOST')}:{os.getenv('POSTGRESQL_PORT')}/{os.getenv('POSTGRESQL_DB')}")
-    Session = sessionmaker(bind=engine)
+    db_backend = DBBackend.get_instance()
+    Session = db_backend.Session
+
+    # 并发计算sha256的线程数
+    hash_workers = 8
+    # 每次删除的记录数量
+    delete_batch_size = 1000
 
     @staticmethod
     def delete():
         with DeleteIncompleteEntriesUtil.Session() as session:
-            image_info_mapper = ImageInfoMapper(session)
-        # 批量处理，每次从数据库中取100条
-        batch_start_id = -1
-        image_info_do_list = image_info_mapper.query_by_id_range_batch(id=batch_start_id, batch_size=100)
-        while image_info_do_list is not None and len(image_info_do_list) > 0:
-            for image_info_do in image_info_do_list:
-                file_path = image_info_do.file_path
-                logger.info(f"初始化：{file_path}")
-                if not os.path.exists(file_path) or not os.path.isfile(file_path):
-                    logger.info(f"文件不存在，删除记录：{file_path}")
-                    image_info_mapper.delete_by_file_path(file_path)
-
-                file_sha256 = Sha256Util.sha256_file(file_path)
-                if not image_info_do.file_sha256 or file_sha256 != image_info_do.file_sha256:
-                    logger.info(f"文件sha256不一致，删除记录：{file_path}")
-                    image_info_mapper.delete_by_file_path(file_path)
-                    continue
-                if not image_info_do.file_gmt_modified or not image_info_do.file_name \
-                        or image_info_do.ocr_text is None or not image_info_do.image_vector or not image_info_do.all_text_vector:
-                    logger.info(f"文件修改时间、文件名、OCR文本、图片向量、有文本向量异常或为空，删除记录：{file_path}")
-                    image_info_mapper.delete_by_file_path(file_path)
-                    continue
+            image_info_mapper = DeleteIncompleteEntriesUtil.db_backend.create_image_info_mapper(session)
+            # 流式读取全表，向量列只判断是否为空；需要删除的记录在遍历结束后统一删除，遍历期间不提交写操作
+            row_iter = image_info_mapper.scan_columns(["id", "file_path", "file_sha256", "file_gmt_modified", "file_name"],
+                                                      ["ocr_text", "image_vector", "all_text_vector"])
+            delete_id_list = []
+            # 等待计算sha256的文件路径 -> [(主键, 数据库中的sha256)]
+            hashing_dict = {}
+            file_path_iter = DeleteIncompleteEntriesUtil.__iter_file_path(row_iter, delete_id_list, hashing_dict)
+            for file_path, file_sha256 in Sha256Util.sha256_files(file_path_iter, DeleteIncompleteEntriesUtil.hash_workers):
+                for id, db_file_sha256 in hashing_dict.pop(file_path):
+                    if file_sha256 is None or file_sha256 != db_file_sha256:
+                        logger.info(f"文件sha256不一致，删除记录：{file_path}")
+                        delete_id_list.append(id)
+                    else:
+                        logger.info(f"记录完整：{file_path}")
+        for i in range(0, len(delete_id_list), DeleteIncompleteEntriesUtil.delete_batch_size):
+            with DeleteIncompleteEntriesUtil.Session() as session:
+                DeleteIncompleteEntriesUtil.db_backend.create_image_info_mapper(session).delete_batch_by_id(delete_id_list[i:i + DeleteIncompleteEntriesUtil.delete_batch_size])
+        logger.info(f"删除记录：{len(delete_id_list)}条")
 
-                logger.info(f"写表成功:{file_path}")
+    @staticmethod
+    def __iter_file_path(row_iter, delete_id_list: list[int], hashing_dict: dict[str, list[tuple[int, str]]]):
+        """ 先做无需读取文件的检查，通过检查的文件路径交给线程池计算sha256。"""
+        for id, file_path, file_sha256, file_gmt_modified, file_name, has_ocr_text, has_image_vector, has_all_text_vector in row_iter:
+            logger.info(f"检查：{file_path}")
+            if not os.path.isfile(file_path):
+                logger.info(f"文件不存在，删除记录：{file_path}")
+                delete_id_list.append(id)
+                continue
+            if not file_sha256:
+                logger.info(f"文件sha256为空，删除记录：{file_path}")
+                delete_id_list.append(id)
+                continue
+            if not file_gmt_modified or not file_name or not has_ocr_text or not has_image_vector or not has_all_text_vector:
+                logger.info(f"文件修改时间、文件名、OCR文本、图片向量、有文本向量异常或为空，删除记录：{file_path}")
+                delete_id_list.append(id)
+                continue
+            # 同一路径有多条记录时只计算一次sha256
+            if file_path in hashing_dict:
+                hashing_dict[file_path].append((id, file_sha256))
+                continue
+            hashing_dict[file_path] = [(id, file_sha256)]
+            yield file_path
 
 
 def init_log(log_dir: str, log_file_name: str):
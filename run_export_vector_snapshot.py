@@ -0,0 +1,79 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+run_export_vector_snapshot.py
+该脚本的作用是，将数据库中所有图片的特征向量导出为本地向量快照，供VECTOR_SEARCH_BACKEND=local时在本进程中检索。
+快照可以复制到没有数据库连接的电脑上使用。图库变化后需要重新导出，导出期间不影响正在使用旧快照的检索。
+快照目录由.env中的VECTOR_SNAPSHOT_PATH指定，默认为resources/vector_snapshot。
+"""
+import logging.config
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.app.db.db_backend import DBBackend
+from src.app.log.logger import logger
+from src.app.vector.local_vector_index import LocalVectorIndex
+
+
+class VectorSnapshotUtil:
+    db_backend = DBBackend.get_instance()
+    Session = db_backend.Session
+    snapshot_path = os.getenv("VECTOR_SNAPSHOT_PATH", "resources/vector_snapshot")
+    # 快照中向量的精度，float16时文件大小和检索时读取的数据量为float32的一半，余弦距离的误差在1e-3以内
+    dtype = "float16"
+    vector_dim = 1024
+    # 每次从服务端取回的行数
+    batch_size = 1000
+
+    @staticmethod
+    def export():
+        with VectorSnapshotUtil.Session() as session:
+            # 记录数和逐行读取在同一个快照中执行，导出期间的写入不会使两者不一致
+            session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            image_info_mapper = VectorSnapshotUtil.db_backend.create_image_info_mapper(session)
+            count = image_info_mapper.query_count()
+            logger.info(f"开始导出向量快照：{VectorSnapshotUtil.snapshot_path}，记录数：{count}")
+            rows = image_info_mapper.scan_columns(["id", "file_sha256", "file_path", "file_name", "image_vector", "all_text_vector"],
+                                                  batch_size=VectorSnapshotUtil.batch_size)
+            written_count = LocalVectorIndex.export(VectorSnapshotUtil.snapshot_path, rows, count,
+                                                    VectorSnapshotUtil.vector_dim, VectorSnapshotUtil.dtype)
+        logger.info(f"向量快照导出完成：{written_count}条")
+
+
+def init_log(log_dir: str, log_file_name: str):
+    os.makedirs(log_dir, exist_ok=True)
+    logging.config.dictConfig({
+        "version": 1,
+        "formatters": {
+            "standard_formatter": {"format": "%(asctime)s [%(levelname)s] [%(threadName)s]-%(name)s %(module)s:%(lineno)d - %(message)s"}
+        },
+        "handlers": {
+            "file": {
+                "class": "logging.handlers.RotatingFileHandler",
+                "filename": f"{log_dir}/{log_file_name}",
+                "maxBytes": 10 * 1024 * 1024,
+                "formatter": "standard_formatter",
+            },
+            "console": {
+                "class": "logging.StreamHandler",
+                "formatter": "standard_formatter",
+            }
+        },
+        "loggers": {
+            "standard_logger": {
+                "handlers": ["file", "console"],
+                "level": "INFO",
+                "propagate": False,
+            }
+        },
+        "root": {"handlers": ["file", "console"], "level": "INFO"}
+    })
+
+
+if __name__ == "__main__":
+    init_log("logs", "export_vector_snapshot.log")
+    VectorSnapshotUtil.export()
@@ -0,0 +1,55 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+run_ingest.py
+第一次运行GUI应用前，【必须运行该脚本】，或者依次运行run_init_db.py、run_init_image_vector.py、run_init_ocr_text.py、run_init_all_text_vector.py。
+该脚本的作用是，将SCAN_PATHS指定目录（包括子目录）的所有图片一次性入库：每个文件只读取、解码一次，
+依次计算图片特征向量、OCR文本和文本特征向量，并在同一个事务中写入完整的一行数据。已完整入库且未变化的图片将被跳过。
+"""
+import logging.config
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.app.service.ingest_service import IngestService
+
+
+def init_log(log_dir: str, log_file_name: str):
+    os.makedirs(log_dir, exist_ok=True)
+    logging.config.dictConfig({
+        "version": 1,
+        "formatters": {
+            "standard_formatter": {"format": "%(asctime)s [%(levelname)s] [%(threadName)s]-%(name)s %(module)s:%(lineno)d - %(message)s"}
+        },
+        "handlers": {
+            "file": {
+                "class": "logging.handlers.RotatingFileHandler",
+                "filename": f"{log_dir}/{log_file_name}",
+                "maxBytes": 10 * 1024 * 1024,
+                "formatter": "standard_formatter",
+            },
+            "console": {
+                "class": "logging.StreamHandler",
+                "formatter": "standard_formatter",
+            }
+        },
+        "loggers": {
+            "standard_logger": {
+                "handlers": ["file", "console"],
+                "level": "INFO",
+                "propagate": False,
+            }
+        },
+        "root": {"handlers": ["file", "console"], "level": "INFO"}
+    })
+
+
+if __name__ == "__main__":
+    init_log("logs", "ingest.log")
+    ingest_service = IngestService.get_instance()
+    paths = os.getenv("SCAN_PATHS").split(",")
+    for path in paths:
+        ingest_service.ingest(path)
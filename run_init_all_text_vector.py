@@ -16,47 +16,57 @@ from src.app.utils.string_util import StringUtil
 
 load_dotenv()
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-
 from src.app.ai.qwen_embedding import QwenEmbedding
-from src.app.db.mapper.image_info_mapper import ImageInfoMapper
+from src.app.db.db_backend import DBBackend
+from src.app.db.models.image_job_do import ImageJobStageEnum
 from src.app.log.logger import logger
 
 
 class InitAllTextVectorUtil:
-    engine = create_engine(f"postgresql://"
-                           f"{os.getenv('POSTGRESQL_USER')}:{os.getenv('POSTGRESQL_PASSWORD')}"
-                           f"@{os.getenv('POSTGRESQL_HOST')}:{os.getenv('POSTGRESQL_PORT')}/{os.getenv('POSTGRESQL_DB')}")
-    Session = sessionmaker(bind=engine)
+    db_backend = DBBackend.get_instance()
+    Session = db_backend.Session
     textEmbeddingUtil = QwenEmbedding.get_instance()
 
     @staticmethod
     def init(force_refresh: bool = False):
         with InitAllTextVectorUtil.Session() as session:
-            image_info_mapper = ImageInfoMapper(session)
+            image_info_mapper = InitAllTextVectorUtil.db_backend.create_image_info_mapper(session)
+        if not force_refresh:
+            # 内容相同（sha256相同）且都没有人工标签的图片直接复制已有的文本特征向量
+            logger.info(f"复用相同内容图片的文本特征向量：{image_info_mapper.copy_by_file_sha256('all_text_vector')}条")
         # 批量处理，每次从数据库中取100条
         batch_start_id = -1
-        image_info_do_list = image_info_mapper.query_by_id_range_batch(id=batch_start_id, batch_size=100)
-        while image_info_do_list is not None and len(image_info_do_list) > 0:
-            for image_info_do in image_info_do_list:
-                file_path = image_info_do.file_path
+        all_text_key_set = set()
+        # 只查询已完成OCR的记录；如果不要求强制刷新，则只查询尚无文本特征向量的记录
+        image_info_list = image_info_mapper.query_by_stage_batch(ImageJobStageEnum.ALL_TEXT_VECTOR, id=batch_start_id,
+                                                                 batch_size=100, pending_only=not force_refresh)
+        while image_info_list is not None and len(image_info_list) > 0:
+            id_list = []
+            all_text_list = []
+            for image_info in image_info_list:
+                file_path = image_info.file_path
                 logger.info(f"初始化：{file_path}")
-                # 如果不要求强制刷新且数据库中已有OCR文本，则跳过
-                if not force_refresh and image_info_do.all_text_vector:
-                    logger.info(f"该图已处理过：{file_path}")
-                    continue
-                # 如果不存在OCR文本表示OCR前置步骤未完成，跳过
-                if image_info_do.ocr_text is None:
-                    logger.info(f"该图未完成OCR，跳过：{file_path}")
-                    continue
-                all_text = InitAllTextVectorUtil.__build_all_text(image_info_do.ocr_text, image_info_do.tag_text)
-                all_text_vector = InitAllTextVectorUtil.textEmbeddingUtil.embed_to_vector(all_text)
-
-                image_info_mapper.update_all_text_vector_by_file_path(file_path, all_text_vector)
-                logger.info(f"写表成功:{file_path}")
-            batch_start_id = image_info_do_list[-1].id
-            image_info_do_list = image_info_mapper.query_by_id_range_batch(id=batch_start_id, batch_size=100)
+                # 内容和文本都相同、且没有人工标签的图片只计算一次，处理完成后统一复制
+                if not force_refresh and not image_info.tag_text:
+                    all_text_key = (image_info.file_sha256, image_info.ocr_text)
+                    if all_text_key in all_text_key_set:
+                        logger.info(f"相同内容的图片已处理，稍后复用结果：{file_path}")
+                        continue
+                    all_text_key_set.add(all_text_key)
+                id_list.append(image_info.id)
+                all_text_list.append(InitAllTextVectorUtil.__build_all_text(image_info.ocr_text, image_info.tag_text))
+            # 整批文本按长度分桶后一起计算特征向量
+            if all_text_list:
+                all_text_vectors = InitAllTextVectorUtil.textEmbeddingUtil.embed_to_vectors(all_text_list)
+                # 整批按主键一次写入
+                image_info_mapper.update_all_text_vector_batch_by_id(list(zip(id_list, all_text_vectors)))
+                logger.info(f"写表成功:{len(id_list)}条")
+            batch_start_id = image_info_list[-1].id
+            image_info_list = image_info_mapper.query_by_stage_batch(ImageJobStageEnum.ALL_TEXT_VECTOR, id=batch_start_id,
+                                                                     batch_size=100, pending_only=not force_refresh)
+        if not force_refresh:
+            # 本次跳过的重复内容图片，复制刚计算出的文本特征向量
+            logger.info(f"复用相同内容图片的文本特征向量：{image_info_mapper.copy_by_file_sha256('all_text_vector')}条")
 
     @staticmethod
     def __build_all_text(ocr_text, tag_text) -> str:
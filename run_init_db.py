@@ -5,7 +5,9 @@ For full terms, see the LICENSE file.
 run_init_db.py
 第一次运行GUI应用前，【必须运行该脚本】。
 该脚本的作用是，将指定目录（包括子目录）的所有图片文件基本信息载入数据库中。
+默认为增量同步：根据(路径, 文件大小, 修改时间)与数据库比较，只为新增或变化的文件计算sha256，并批量删除已不存在的文件的记录。
 可选：
+全量同步：为所有文件计算sha256后与数据库比较
 【高危操作】清除数据库中所有数据
 """
 import logging.config
@@ -16,31 +18,36 @@ from dotenv import load_dotenv
 from src.app.utils.image_util import ImageUtil
 
 load_dotenv()
-from src.app.utils.file_util import FileUtil
+from src.app.utils.file_util import FileUtil, FileInfo
+from src.app.utils.file_sync_util import FileSyncUtil
 from src.app.utils.sha256_util import Sha256Util
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-
 from src.app.log.logger import logger
-from src.app.db.mapper.image_info_mapper import ImageInfoMapper
+from src.app.db.db_backend import DBBackend
+from src.app.db.mapper.image_info_store import ImageInfoStore
 
 
 class InitDBUtil:
-    engine = create_engine(f"postgresql://"
-                           f"{os.getenv('POSTGRESQL_USER')}:{os.getenv('POSTGRESQL_PASSWORD')}"
-                           f"@{os.getenv('POSTGRESQL_HOST')}:{os.getenv('POSTGRESQL_PORT')}/{os.getenv('POSTGRESQL_DB')}")
-    Session = sessionmaker(bind=engine)
+    db_backend = DBBackend.get_instance()
+    Session = db_backend.Session
+
+    # 增量同步时每批写库的文件数量
+    batch_size = 100
+    # 并发计算sha256的线程数
+    hash_workers = 8
 
     @staticmethod
-    def init(path: str, clear_db: bool = False):
+    def init(path: str, clear_db: bool = False, incremental: bool = True):
         with InitDBUtil.Session() as session:
-            image_info_mapper = ImageInfoMapper(session)
+            image_info_mapper = InitDBUtil.db_backend.create_image_info_mapper(session)
         if clear_db:
             logger.warning("清空数据库")
             image_info_mapper.truncate()
         # 遍历path文件夹中所有文件，并添加到文件列表
         file_info_list = FileUtil.find_all_files_list(path)
+        if incremental:
+            InitDBUtil.__sync(image_info_mapper, path, file_info_list)
+            return
         for file_info in file_info_list:
             file_path = file_info.sourcePath
             logger.info(f"初始化：{file_path}")
@@ -57,18 +64,68 @@ class InitDBUtil:
                 image_info_mapper.delete_by_file_path(file_path)
                 logger.info(f"数据库记录异常，删除记录：{file_path}")
 
-            # 读取图片的拍摄时间，如果不存在或者图片异常则使用修改时间。
-            photo_date = ImageUtil.get_photo_date(file_info.sourcePath)
-            if photo_date:
-                file_info.modifiedTime = photo_date
-                logger.info(f"使用文件拍摄时间：{file_info.modifiedTime}")
             # 插入新数据
-            image_info_mapper.insert(file_gmt_modified=file_info.modifiedTime,
-                                     file_path=file_path,
-                                     file_name=file_info.get_full_name(),
-                                     file_sha256=file_sha256)
+            image_info_mapper.insert_batch([InitDBUtil.__build_image_info(file_info, file_sha256)])
             logger.info(f"写表成功:{file_path}")
 
+    @staticmethod
+    def __sync(image_info_mapper: ImageInfoStore, path: str, file_info_list: list[FileInfo]):
+        # 一次性读取数据库中该目录下所有记录的(路径, sha256, 文件大小, 修改时间)
+        file_status_dict = image_info_mapper.query_file_status_dict(os.path.abspath(path) + os.sep)
+        sync_result = FileSyncUtil.diff(file_info_list, file_status_dict)
+        logger.info(f"新增文件{len(sync_result.addedFileInfoList)}个，变化文件{len(sync_result.changedFileInfoList)}个，"
+                    f"已删除文件{len(sync_result.vanishedIdList)}个")
+        # 批量删除已不存在的文件的记录
+        image_info_mapper.delete_batch_by_id(sync_result.vanishedIdList)
+
+        # 只为新增或变化的文件计算sha256，多个文件并发计算，按完成顺序分批写库
+        pending_file_info_dict = {file_info.sourcePath: file_info
+                                  for file_info in sync_result.addedFileInfoList + sync_result.changedFileInfoList}
+        hashed_list = []
+        for file_path, file_sha256 in Sha256Util.sha256_files(pending_file_info_dict.keys(), InitDBUtil.hash_workers):
+            if file_sha256 is None:
+                logger.error(f"计算sha256异常，跳过：{file_path}")
+                continue
+            hashed_list.append((pending_file_info_dict[file_path], file_sha256))
+            if len(hashed_list) >= InitDBUtil.batch_size:
+                InitDBUtil.__write_batch(image_info_mapper, file_status_dict, hashed_list)
+                hashed_list = []
+        InitDBUtil.__write_batch(image_info_mapper, file_status_dict, hashed_list)
+
+    @staticmethod
+    def __write_batch(image_info_mapper: ImageInfoStore, file_status_dict: dict, hashed_list: list[tuple[FileInfo, str]]):
+        image_info_list = []
+        replaced_id_list = []
+        touched_id_values_list = []
+        for file_info, file_sha256 in hashed_list:
+            file_path = file_info.sourcePath
+            logger.info(f"初始化：{file_path}")
+            file_status = file_status_dict.get(file_path)
+            if file_status and file_status.fileSha256 == file_sha256:
+                # 文件内容未变化（例如只修改了时间，或旧记录没有文件大小和修改时间），只更新文件大小和修改时间
+                touched_id_values_list.append((file_status.id, {"file_size": file_info.size, "file_mtime": file_info.mtime}))
+                continue
+            if file_status:
+                logger.info(f"文件内容已变化，替换记录：{file_path}")
+                replaced_id_list.append(file_status.id)
+            image_info_list.append(InitDBUtil.__build_image_info(file_info, file_sha256))
+        image_info_mapper.update_batch_by_id(touched_id_values_list)
+        image_info_mapper.insert_batch(image_info_list, replaced_id_list)
+        logger.info(f"写表成功:{len(image_info_list)}条")
+
+    @staticmethod
+    def __build_image_info(file_info: FileInfo, file_sha256: str) -> dict:
+        # 读取图片的拍摄时间，如果不存在或者图片异常则使用修改时间。
+        photo_date = ImageUtil.get_photo_date(file_info.sourcePath)
+        if photo_date:
+            file_info.modifiedTime = photo_date
+            logger.info(f"使用文件拍摄时间：{file_info.modifiedTime}")
+        return {"file_gmt_modified": file_info.modifiedTime,
+                "file_path": file_info.sourcePath,
+                "file_name": file_info.get_full_name(),
+                "file_sha256": file_sha256,
+                "file_size": file_info.size,
+                "file_mtime": file_info.mtime}
 
 def init_log(log_dir: str, log_file_name: str):
     os.makedirs(log_dir, exist_ok=True)
@@ -102,6 +159,6 @@ def init_log(log_dir: str, log_file_name: str):
 
 if __name__ == "__main__":
     init_log("logs", "init_db.log")
-    paths = os.getenv("IMAGE_PATHS").split(",")
+    paths = os.getenv("SCAN_PATHS").split(",")
     for path in paths:
-        InitDBUtil.init(path, True)
+        InitDBUtil.init(path)
@@ -5,6 +5,7 @@ For full terms, see the LICENSE file.
 run_init_image_vector.py
 第一次运行GUI应用前，【必须运行该脚本】。
 该脚本的作用是，为数据库中所有图片的记录生成图片特征向量。如果已有图片特征向量，则跳过。
+读取解码、模型推理、写库三个阶段通过有界队列重叠执行。
 可选：强制刷新数据库中所有图片特征向量。
 """
 import logging.config
@@ -16,41 +17,119 @@ from src.app.ai.chinese_clip import ChineseClip
 
 load_dotenv()
 from PIL import Image
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 from src.app.log.logger import logger
-from src.app.db.mapper.image_info_mapper import ImageInfoMapper
+from src.app.db.db_backend import DBBackend
+from src.app.db.mapper.image_info_store import ImageInfoStore
+from src.app.db.models.image_job_do import ImageJobStageEnum
+from src.app.utils.staged_pipeline import StagedPipeline
 
 
 class InitImageVectorUtil:
-    engine = create_engine(f"postgresql://"
-                           f"{os.getenv('POSTGRESQL_USER')}:{os.getenv('POSTGRESQL_PASSWORD')}"
-                           f"@{os.getenv('POSTGRESQL_HOST')}:{os.getenv('POSTGRESQL_PORT')}/{os.getenv('POSTGRESQL_DB')}")
-    Session = sessionmaker(bind=engine)
+    db_backend = DBBackend.get_instance()
+    Session = db_backend.Session
     chineseClip = ChineseClip.get_instance()
 
+    # 每批送入模型的图片数量
+    embed_batch_size = ChineseClip.DEFAULT_IMAGE_BATCH_SIZE
+    # 读取、解码图片的线程数，图库位于网络存储时可以适当调大
+    read_workers = 8
+
     @staticmethod
     def init(force_refresh: bool = False):
         with InitImageVectorUtil.Session() as session:
-            image_info_mapper = ImageInfoMapper(session)
-        # 批量处理，每次从数据库中取100条
-        batch_start_id = -1
-        image_info_do_list = image_info_mapper.query_by_id_range_batch(id=batch_start_id, batch_size=100)
-        while image_info_do_list is not None and len(image_info_do_list) > 0:
-            for image_info_do in image_info_do_list:
-                file_path = image_info_do.file_path
-                logger.info(f"初始化：{file_path}")
-                # 如果不要求强制刷新且数据库中已有图片特征向量，则跳过
-                if not force_refresh and image_info_do.image_vector:
-                    logger.info(f"该图已处理过：{file_path}")
-                    continue
-                with Image.open(file_path) as image:
-                    image_vector = InitImageVectorUtil.chineseClip.embed_image_to_vec(image)
-                image_info_mapper.update_image_vector_by_file_path(file_path, image_vector)
-                logger.info(f"写表成功:{file_path}")
-            batch_start_id = image_info_do_list[-1].id
-            image_info_do_list = image_info_mapper.query_by_id_range_batch(id=batch_start_id, batch_size=100)
+            image_info_mapper = InitImageVectorUtil.db_backend.create_image_info_mapper(session)
+            # 已成功写入特征向量的sha256
+            done_sha256_set = set()
+            # session只在写库线程中使用
+            pipeline = StagedPipeline(read_func=InitImageVectorUtil.__read_image,
+                                      infer_func=InitImageVectorUtil.__embed,
+                                      write_func=lambda batch: InitImageVectorUtil.__write(image_info_mapper, batch, done_sha256_set),
+                                      read_workers=InitImageVectorUtil.read_workers,
+                                      batch_size=InitImageVectorUtil.embed_batch_size)
+            if not force_refresh:
+                # 内容相同（sha256相同）的图片直接复制已有的特征向量
+                copied_count = image_info_mapper.copy_by_file_sha256("image_vector")
+                logger.info(f"复用相同内容图片的特征向量：{copied_count}条")
+            # sha256 -> 暂缓处理的相同内容图片(主键, 文件路径, sha256)
+            duplicate_dict = {}
+            pipeline.run(InitImageVectorUtil.__iter_file_path(force_refresh, duplicate_dict))
+            # 相同内容的图片中处理失败的（文件不存在、无法读取等），改为处理下一个相同内容的图片
+            retry_list = InitImageVectorUtil.__next_duplicates(duplicate_dict, done_sha256_set)
+            while retry_list:
+                pipeline.run(retry_list)
+                retry_list = InitImageVectorUtil.__next_duplicates(duplicate_dict, done_sha256_set)
+            if not force_refresh:
+                # 本次跳过的重复内容图片，复制刚计算出的特征向量
+                copied_count = image_info_mapper.copy_by_file_sha256("image_vector")
+                logger.info(f"复用相同内容图片的特征向量：{copied_count}条")
+
+    @staticmethod
+    def __iter_file_path(force_refresh: bool, duplicate_dict: dict[str, list[tuple]]):
+        # 在读取线程中分页查询，使用独立的session
+        with InitImageVectorUtil.Session() as session:
+            image_info_mapper = InitImageVectorUtil.db_backend.create_image_info_mapper(session)
+            # 批量处理，每次从数据库中取100条
+            batch_start_id = -1
+            file_sha256_set = set()
+            # 如果不要求强制刷新，则只查询尚无图片特征向量的记录
+            image_info_list = image_info_mapper.query_by_stage_batch(ImageJobStageEnum.IMAGE_VECTOR, id=batch_start_id,
+                                                                     batch_size=100, pending_only=not force_refresh)
+            while image_info_list is not None and len(image_info_list) > 0:
+                for image_info in image_info_list:
+                    file_path = image_info.file_path
+                    logger.info(f"初始化：{file_path}")
+                    # 内容相同的图片只计算一次，处理完成后统一复制
+                    if not force_refresh and image_info.file_sha256 in file_sha256_set:
+                        logger.info(f"相同内容的图片已处理，稍后复用结果：{file_path}")
+                        duplicate_dict.setdefault(image_info.file_sha256, []).append(
+                            (image_info.id, file_path, image_info.file_sha256))
+                        continue
+                    file_sha256_set.add(image_info.file_sha256)
+                    yield image_info.id, file_path, image_info.file_sha256
+                batch_start_id = image_info_list[-1].id
+                image_info_list = image_info_mapper.query_by_stage_batch(ImageJobStageEnum.IMAGE_VECTOR, id=batch_start_id,
+                                                                         batch_size=100, pending_only=not force_refresh)
+
+    @staticmethod
+    def __next_duplicates(duplicate_dict: dict[str, list[tuple]], done_sha256_set: set[str]) -> list[tuple]:
+        """ 每个尚未成功处理的sha256取出下一个相同内容的图片，没有可取的图片时返回空列表。"""
+        retry_list = []
+        for file_sha256 in list(duplicate_dict.keys()):
+            duplicate_list = duplicate_dict[file_sha256]
+            if file_sha256 in done_sha256_set or not duplicate_list:
+                del duplicate_dict[file_sha256]
+                continue
+            retry_list.append(duplicate_list.pop(0))
+        return retry_list
+
+    @staticmethod
+    def __read_image(item: tuple[int, str, str]):
+        id, file_path, file_sha256 = item
+        try:
+            with Image.open(file_path) as image:
+                return id, file_path, file_sha256, image.convert("RGB")
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            logger.error(f"处理异常，跳过：{file_path}")
+            return None
+
+    @staticmethod
+    def __embed(batch: list) -> list:
+        # 整批图片一起计算特征向量
+        image_vectors = InitImageVectorUtil.chineseClip.embed_images_to_vec([image for _, _, _, image in batch],
+                                                                            InitImageVectorUtil.embed_batch_size)
+        return [(id, file_path, file_sha256, image_vector)
+                for (id, file_path, file_sha256, _), image_vector in zip(batch, image_vectors)]
+
+    @staticmethod
+    def __write(image_info_mapper: ImageInfoStore, batch: list, done_sha256_set: set[str]):
+        # 整批按主键一次写入
+        image_info_mapper.update_image_vector_batch_by_id([(id, image_vector) for id, _, _, image_vector in batch])
+        # 写入成功后才记录，读取、推理或写库失败的sha256由下一个相同内容的图片重新处理
+        for _, file_path, file_sha256, _ in batch:
+            done_sha256_set.add(file_sha256)
+            logger.info(f"写表成功:{file_path}")
 
 
 def init_log(log_dir: str, log_file_name: str):
@@ -6,6 +6,7 @@ run_init_ocr_text.py
 第一次运行GUI应用前，【必须运行该脚本】。
 该脚本的作用是，为数据库中所有图片执行OCR，并保存到数据库中。如果已执行过OCR，则跳过。
 可选：强制刷新数据库中所有OCR文本。
+可选：使用多进程OCR池，多个进程并发识别。
 """
 import logging.config
 import os
@@ -13,53 +14,117 @@ import os
 from dotenv import load_dotenv
 
 load_dotenv()
-from src.app.ai.paddle_ocr_util import PaddleOCRUtil
+from src.app.ai.paddle_ocr_util import PaddleOCRUtil, PaddleOCRPool
 
 from PIL import Image
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 from src.app.log.logger import logger
-from src.app.db.mapper.image_info_mapper import ImageInfoMapper
+from src.app.db.db_backend import DBBackend
+from src.app.db.mapper.image_info_store import ImageInfoStore
+from src.app.db.models.image_job_do import ImageJobStageEnum
 
 
 class InitOcrTextUtil:
-    engine = create_engine(f"postgresql://"
-                           f"{os.getenv('POSTGRESQL_USER')}:{os.getenv('POSTGRESQL_PASSWORD')}"
-                           f"@{os.getenv('POSTGRESQL_HOST')}:{os.getenv('POSTGRESQL_PORT')}/{os.getenv('POSTGRESQL_DB')}")
-    Session = sessionmaker(bind=engine)
-    ocrUtil = PaddleOCRUtil.get_instance()
+    db_backend = DBBackend.get_instance()
+    Session = db_backend.Session
+    # OCR工作进程数，小于等于1时在当前进程中逐张识别
+    ocr_workers = 8
+    # 每个OCR工作进程内的计算线程数
+    ocr_cpu_threads = 4
 
     @staticmethod
     def init(force_refresh: bool = False):
+        if InitOcrTextUtil.ocr_workers > 1:
+            with PaddleOCRPool(InitOcrTextUtil.ocr_workers, InitOcrTextUtil.ocr_cpu_threads) as ocr_pool:
+                InitOcrTextUtil.__do_init(force_refresh, ocr_pool.recognize_files)
+        else:
+            InitOcrTextUtil.__do_init(force_refresh, InitOcrTextUtil.__recognize_files)
+
+    @staticmethod
+    def __do_init(force_refresh: bool, recognize_files):
         with InitOcrTextUtil.Session() as session:
-            image_info_mapper = ImageInfoMapper(session)
+            image_info_mapper = InitOcrTextUtil.db_backend.create_image_info_mapper(session)
+        if not force_refresh:
+            # 内容相同（sha256相同）的图片直接复制已有的OCR文本
+            logger.info(f"复用相同内容图片的OCR文本：{image_info_mapper.copy_by_file_sha256('ocr_text')}条")
         # 批量处理，每次从数据库中取100条
         batch_start_id = -1
-        image_info_do_list = image_info_mapper.query_by_id_range_batch(id=batch_start_id, batch_size=100)
-        while image_info_do_list is not None and len(image_info_do_list) > 0:
-            for image_info_do in image_info_do_list:
-                file_path = image_info_do.file_path
+        file_sha256_set = set()
+        # 已成功写入OCR文本的sha256
+        done_sha256_set = set()
+        # sha256 -> 暂缓处理的相同内容图片(主键, 文件路径, sha256)
+        duplicate_dict = {}
+        # 如果不要求强制刷新，则只查询尚无OCR文本的记录
+        image_info_list = image_info_mapper.query_by_stage_batch(ImageJobStageEnum.OCR_TEXT, id=batch_start_id,
+                                                                 batch_size=100, pending_only=not force_refresh)
+        while image_info_list is not None and len(image_info_list) > 0:
+            item_list = []
+            for image_info in image_info_list:
+                file_path = image_info.file_path
                 logger.info(f"初始化：{file_path}")
-                # 如果不要求强制刷新且数据库中已有OCR文本，则跳过
-                if not force_refresh and image_info_do.ocr_text is not None:
-                    logger.info(f"该图已处理过：{file_path}")
+                # 内容相同的图片只识别一次，处理完成后统一复制
+                if not force_refresh and image_info.file_sha256 in file_sha256_set:
+                    logger.info(f"相同内容的图片已处理，稍后复用结果：{file_path}")
+                    duplicate_dict.setdefault(image_info.file_sha256, []).append(
+                        (image_info.id, file_path, image_info.file_sha256))
                     continue
+                file_sha256_set.add(image_info.file_sha256)
+                item_list.append((image_info.id, file_path, image_info.file_sha256))
+            InitOcrTextUtil.__recognize_and_write(image_info_mapper, recognize_files, item_list, done_sha256_set)
+            batch_start_id = image_info_list[-1].id
+            image_info_list = image_info_mapper.query_by_stage_batch(ImageJobStageEnum.OCR_TEXT, id=batch_start_id,
+                                                                     batch_size=100, pending_only=not force_refresh)
+        # 相同内容的图片中识别失败的（文件不存在、无法读取等），改为识别下一个相同内容的图片
+        retry_list = InitOcrTextUtil.__next_duplicates(duplicate_dict, done_sha256_set)
+        while retry_list:
+            InitOcrTextUtil.__recognize_and_write(image_info_mapper, recognize_files, retry_list, done_sha256_set)
+            retry_list = InitOcrTextUtil.__next_duplicates(duplicate_dict, done_sha256_set)
+        if not force_refresh:
+            # 本次跳过的重复内容图片，复制刚识别出的OCR文本
+            logger.info(f"复用相同内容图片的OCR文本：{image_info_mapper.copy_by_file_sha256('ocr_text')}条")
+
+    @staticmethod
+    def __recognize_and_write(image_info_mapper: ImageInfoStore, recognize_files, item_list: list[tuple],
+                              done_sha256_set: set[str]):
+        # 整批图片一起识别，结果与item_list顺序一致
+        id_text_list = []
+        file_sha256_list = []
+        for (id, file_path, file_sha256), ocr_texts in zip(item_list, recognize_files([file_path for _, file_path, _ in item_list])):
+            if ocr_texts is None:
+                logger.error(f"处理异常，跳过：{file_path}")
+                continue
+            # 将ocr_texts拼接为ocr_text，以逗号分隔
+            id_text_list.append((id, ",".join(ocr_texts)))
+            file_sha256_list.append(file_sha256)
+        # 整批按主键一次写入，写入成功后才记录，识别失败的sha256由下一个相同内容的图片重新识别
+        image_info_mapper.update_ocr_text_batch_by_id(id_text_list)
+        done_sha256_set.update(file_sha256_list)
+        logger.info(f"写表成功:{len(id_text_list)}条")
+
+    @staticmethod
+    def __next_duplicates(duplicate_dict: dict[str, list[tuple]], done_sha256_set: set[str]) -> list[tuple]:
+        """ 每个尚未成功处理的sha256取出下一个相同内容的图片，没有可取的图片时返回空列表。"""
+        retry_list = []
+        for file_sha256 in list(duplicate_dict.keys()):
+            duplicate_list = duplicate_dict[file_sha256]
+            if file_sha256 in done_sha256_set or not duplicate_list:
+                del duplicate_dict[file_sha256]
+                continue
+            retry_list.append(duplicate_list.pop(0))
+        return retry_list
+
+    @staticmethod
+    def __recognize_files(file_path_list: list[str]) -> list[list[str] | None]:
+        ocr_util = PaddleOCRUtil.get_instance()
+        results = []
+        for file_path in file_path_list:
+            try:
                 with Image.open(file_path) as image:
-                    try:
-                        ocr_texts = InitOcrTextUtil.ocrUtil.recognize(image)
-                    except Exception as e:
-                        logger.error(e, exc_info=True)
-                        logger.error(f"处理异常，跳过：{file_path}")
-                        continue
-                    # 将ocr_texts拼接为ocr_text，以逗号分隔
-                    ocr_text = ",".join(ocr_texts)
-                    if ocr_text is None:
-                        ocr_text = ""
-                image_info_mapper.update_ocr_text_by_file_path(file_path, ocr_text)
-                logger.info(f"写表成功:{file_path}")
-            batch_start_id = image_info_do_list[-1].id
-            image_info_do_list = image_info_mapper.query_by_id_range_batch(id=batch_start_id, batch_size=100)
+                    results.append(ocr_util.recognize(image))
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                results.append(None)
+        return results
 
 
 def init_log(log_dir: str, log_file_name: str):
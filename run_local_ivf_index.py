@@ -0,0 +1,117 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+run_local_ivf_index.py
+该脚本的作用是，管理VECTOR_SEARCH_BACKEND=local_ivf时使用的本地IVF近似向量索引。索引目录由.env中的LOCAL_IVF_INDEX_PATH指定，默认为resources/ivf_index。
+用法：
+  python run_local_ivf_index.py build     从数据库中的所有向量建立索引（训练聚类中心），图库初次入库完成或数据分布明显变化后执行
+  python run_local_ivf_index.py sync      将数据库中新增、删除、移动和重新打标的记录同步到索引的增量区，run.py中设置LOCAL_IVF_SYNC_INTERVAL后会定期自动执行
+  python run_local_ivf_index.py compact   将增量区合并到基础索引，执行前需要关闭run.py
+  python run_local_ivf_index.py report    查看索引的记录数、聚类数和增量区大小
+"""
+import logging.config
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.app.db.db_backend import DBBackend
+from src.app.log.logger import logger
+from src.app.vector.local_ivf_index import LocalIvfIndex
+
+
+class LocalIvfIndexUtil:
+    db_backend = DBBackend.get_instance()
+    Session = db_backend.Session
+    index_path = os.getenv("LOCAL_IVF_INDEX_PATH", "resources/ivf_index")
+    # 向量精度，float16时索引文件大小和检索时读取的数据量为float32的一半
+    dtype = "float16"
+    vector_dim = 1024
+    # 聚类数量，为None时按向量数量自动计算（100万以内为数量/1000，以上为数量的平方根）
+    nlist = None
+    # 每次从服务端取回的行数
+    batch_size = 1000
+
+    @staticmethod
+    def build():
+        with LocalIvfIndexUtil.Session() as session:
+            # 记录数和逐行读取在同一个快照中执行，建立期间的写入不会使两者不一致
+            session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            image_info_mapper = LocalIvfIndexUtil.db_backend.create_image_info_mapper(session)
+            count = image_info_mapper.query_count()
+            # 之后的sync只需同步修改时间晚于此时间的记录
+            synced_gmt_modified = image_info_mapper.query_max_gmt_modified()
+            logger.info(f"开始建立本地向量索引：{LocalIvfIndexUtil.index_path}，记录数：{count}")
+            rows = image_info_mapper.scan_columns(["id", "file_sha256", "file_path", "file_name", "image_vector", "all_text_vector"],
+                                                  batch_size=LocalIvfIndexUtil.batch_size)
+            written_count = LocalIvfIndex.build(LocalIvfIndexUtil.index_path, rows, count, LocalIvfIndexUtil.vector_dim,
+                                                LocalIvfIndexUtil.nlist, LocalIvfIndexUtil.dtype, synced_gmt_modified)
+        logger.info(f"本地向量索引建立完成：{written_count}条")
+
+    @staticmethod
+    def sync():
+        local_ivf_index = LocalIvfIndex(LocalIvfIndexUtil.index_path)
+        with LocalIvfIndexUtil.Session() as session:
+            added_count, deleted_count = local_ivf_index.sync_from_db(LocalIvfIndexUtil.db_backend.create_image_info_mapper(session))
+        local_ivf_index.close()
+        logger.info(f"同步完成：新增{added_count}条，删除{deleted_count}条")
+
+    @staticmethod
+    def compact():
+        LocalIvfIndex.compact(LocalIvfIndexUtil.index_path)
+        logger.info("合并完成")
+
+    @staticmethod
+    def report():
+        local_ivf_index = LocalIvfIndex(LocalIvfIndexUtil.index_path)
+        logger.info(f"建立时间：{local_ivf_index.meta['created']}，精度：{local_ivf_index.meta['dtype']}")
+        for column in LocalIvfIndex.VECTOR_COLUMNS:
+            logger.info(f"{column}：基础索引{len(local_ivf_index.ids[column])}条，聚类{len(local_ivf_index.centroids[column])}个，"
+                        f"增量{len(local_ivf_index.deltaIds[column])}条，已删除{len(local_ivf_index.tombstones[column])}条")
+        local_ivf_index.close()
+
+
+def init_log(log_dir: str, log_file_name: str):
+    os.makedirs(log_dir, exist_ok=True)
+    logging.config.dictConfig({
+        "version": 1,
+        "formatters": {
+            "standard_formatter": {"format": "%(asctime)s [%(levelname)s] [%(threadName)s]-%(name)s %(module)s:%(lineno)d - %(message)s"}
+        },
+        "handlers": {
+            "file": {
+                "class": "logging.handlers.RotatingFileHandler",
+                "filename": f"{log_dir}/{log_file_name}",
+                "maxBytes": 10 * 1024 * 1024,
+                "formatter": "standard_formatter",
+            },
+            "console": {
+                "class": "logging.StreamHandler",
+                "formatter": "standard_formatter",
+            }
+        },
+        "loggers": {
+            "standard_logger": {
+                "handlers": ["file", "console"],
+                "level": "INFO",
+                "propagate": False,
+            }
+        },
+        "root": {"handlers": ["file", "console"], "level": "INFO"}
+    })
+
+
+if __name__ == "__main__":
+    init_log("logs", "local_ivf_index.log")
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "build":
+        LocalIvfIndexUtil.build()
+    elif command == "sync":
+        LocalIvfIndexUtil.sync()
+    elif command == "compact":
+        LocalIvfIndexUtil.compact()
+    else:
+        LocalIvfIndexUtil.report()
@@ -0,0 +1,150 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+run_vector_index.py
+该脚本的作用是，管理图片特征向量和文本特征向量两列上的向量索引（HNSW或IVFFlat）。没有向量索引时，每次检索都需要与所有图片计算相似度，耗时随图库规模线性增长。
+索引的精度由.env中的VECTOR_STORAGE_MODE决定，与检索时使用的SQL一致。
+用法：
+  python run_vector_index.py report                查看索引、大小、使用次数以及pgvector版本
+  python run_vector_index.py create [hnsw|ivfflat] 建立索引，默认为hnsw。建立期间不阻塞读写
+  python run_vector_index.py rebuild [hnsw|ivfflat] 重建索引，大量增删图片后执行。IVFFlat在数据分布变化后需要重建
+  python run_vector_index.py drop [hnsw|ivfflat]   删除索引
+建议在图库初次入库完成之后再建立索引，先建索引再大量写入会慢很多。
+"""
+import logging.config
+import math
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+from sqlalchemy.orm import sessionmaker
+
+from src.app.db.db_engine import DBEngine
+from src.app.db.mapper.vector_index_mapper import VectorIndexMapper
+from src.app.db.models.vector_storage_mode_enum import VectorStorageModeEnum
+from src.app.log.logger import logger
+
+
+class VectorIndexUtil:
+    # CONCURRENTLY操作不能在事务中执行
+    engine = DBEngine.get_instance().engine.execution_options(isolation_level="AUTOCOMMIT")
+    Session = sessionmaker(bind=engine)
+    vector_storage_mode = VectorStorageModeEnum(os.getenv("VECTOR_STORAGE_MODE", VectorStorageModeEnum.FULL.value))
+
+    # HNSW参数：每个节点的连接数，以及建立索引时的候选队列长度。越大召回率越高，建立越慢、索引越大
+    hnsw_m = 16
+    hnsw_ef_construction = 64
+    # IVFFlat参数：聚类数量，为None时按行数自动计算（100万行以内为行数/1000，以上为行数的平方根）
+    ivfflat_lists = None
+    # 建立索引时可使用的内存和并行进程数
+    maintenance_work_mem = "2GB"
+    parallel_workers = 4
+
+    @staticmethod
+    def report():
+        with VectorIndexUtil.Session() as session:
+            vector_index_mapper = VectorIndexMapper(session)
+            table_stats = vector_index_mapper.query_table_stats()
+            logger.info(f"pgvector版本：{table_stats['vector_version']}，表大小：{VectorIndexUtil.__format_size(table_stats['table_size'])}，"
+                        f"记录数：{table_stats['row_count']}，图片特征向量：{table_stats['image_vector_count']}，"
+                        f"文本特征向量：{table_stats['all_text_vector_count']}，当前索引精度：{VectorIndexUtil.vector_storage_mode.value}")
+            vector_index_list = vector_index_mapper.query_vector_indexes()
+            if not vector_index_list:
+                logger.warning("没有向量索引，检索时将逐行计算相似度")
+            for vector_index in vector_index_list:
+                logger.info(f"{vector_index['index_name']}：大小{VectorIndexUtil.__format_size(vector_index['index_size'])}，"
+                            f"{'可用' if vector_index['is_valid'] else '不可用（建立失败或正在建立）'}，"
+                            f"使用次数{vector_index['scan_count']}，定义：{vector_index['index_def']}")
+
+    @staticmethod
+    def create(method: str):
+        with VectorIndexUtil.Session() as session:
+            vector_index_mapper = VectorIndexMapper(session)
+            with_params = VectorIndexUtil.__build_with_params(vector_index_mapper, method)
+            for column in VectorIndexMapper.VECTOR_COLUMNS:
+                logger.info(f"开始建立索引：{column}，{method}，{with_params}")
+                index_name = vector_index_mapper.create_index(column, VectorIndexUtil.vector_storage_mode, method, with_params,
+                                                              VectorIndexUtil.maintenance_work_mem,
+                                                              VectorIndexUtil.parallel_workers)
+                logger.info(f"索引建立完成：{index_name}")
+
+    @staticmethod
+    def rebuild(method: str):
+        with VectorIndexUtil.Session() as session:
+            vector_index_mapper = VectorIndexMapper(session)
+            for column in VectorIndexMapper.VECTOR_COLUMNS:
+                index_name = VectorIndexMapper.get_index_name(column, VectorIndexUtil.vector_storage_mode, method)
+                logger.info(f"开始重建索引：{index_name}")
+                vector_index_mapper.rebuild_index(index_name, VectorIndexUtil.maintenance_work_mem,
+                                                  VectorIndexUtil.parallel_workers)
+                logger.info(f"索引重建完成：{index_name}")
+
+    @staticmethod
+    def drop(method: str):
+        with VectorIndexUtil.Session() as session:
+            vector_index_mapper = VectorIndexMapper(session)
+            for column in VectorIndexMapper.VECTOR_COLUMNS:
+                index_name = VectorIndexMapper.get_index_name(column, VectorIndexUtil.vector_storage_mode, method)
+                vector_index_mapper.drop_index(index_name)
+                logger.info(f"索引已删除：{index_name}")
+
+    @staticmethod
+    def __build_with_params(vector_index_mapper: VectorIndexMapper, method: str) -> dict[str, int]:
+        if method == "hnsw":
+            return {"m": VectorIndexUtil.hnsw_m, "ef_construction": VectorIndexUtil.hnsw_ef_construction}
+        lists = VectorIndexUtil.ivfflat_lists
+        if lists is None:
+            row_count = vector_index_mapper.query_table_stats()["row_count"]
+            lists = max(1, row_count // 1000) if row_count <= 1000000 else int(math.sqrt(row_count))
+        return {"lists": lists}
+
+    @staticmethod
+    def __format_size(size: int) -> str:
+        return f"{size / 1024 / 1024:.1f}MB"
+
+
+def init_log(log_dir: str, log_file_name: str):
+    os.makedirs(log_dir, exist_ok=True)
+    logging.config.dictConfig({
+        "version": 1,
+        "formatters": {
+            "standard_formatter": {"format": "%(asctime)s [%(levelname)s] [%(threadName)s]-%(name)s %(module)s:%(lineno)d - %(message)s"}
+        },
+        "handlers": {
+            "file": {
+                "class": "logging.handlers.RotatingFileHandler",
+                "filename": f"{log_dir}/{log_file_name}",
+                "maxBytes": 10 * 1024 * 1024,
+                "formatter": "standard_formatter",
+            },
+            "console": {
+                "class": "logging.StreamHandler",
+                "formatter": "standard_formatter",
+            }
+        },
+        "loggers": {
+            "standard_logger": {
+                "handlers": ["file", "console"],
+                "level": "INFO",
+                "propagate": False,
+            }
+        },
+        "root": {"handlers": ["file", "console"], "level": "INFO"}
+    })
+
+
+if __name__ == "__main__":
+    init_log("logs", "vector_index.log")
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    index_method = sys.argv[2] if len(sys.argv) > 2 else "hnsw"
+    if command == "create":
+        VectorIndexUtil.create(index_method)
+    elif command == "rebuild":
+        VectorIndexUtil.rebuild(index_method)
+    elif command == "drop":
+        VectorIndexUtil.drop(index_method)
+    else:
+        VectorIndexUtil.report()
@@ -0,0 +1,53 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+run_watch.py
+持续监听SCAN_PATHS指定的目录（包括子目录），新增、修改、移动、删除图片后自动同步到图库数据库，无需重新执行图库准备的脚本。
+启动时会先与数据库同步一次。图库位于网络存储时收不到文件系统事件，请在.env中设置WATCH_POLLING=true使用轮询模式。
+"""
+import logging.config
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.app.service.watch_service import WatchService
+
+
+def init_log(log_dir: str, log_file_name: str):
+    os.makedirs(log_dir, exist_ok=True)
+    logging.config.dictConfig({
+        "version": 1,
+        "formatters": {
+            "standard_formatter": {"format": "%(asctime)s [%(levelname)s] [%(threadName)s]-%(name)s %(module)s:%(lineno)d - %(message)s"}
+        },
+        "handlers": {
+            "file": {
+                "class": "logging.handlers.RotatingFileHandler",
+                "filename": f"{log_dir}/{log_file_name}",
+                "maxBytes": 10 * 1024 * 1024,
+                "formatter": "standard_formatter",
+            },
+            "console": {
+                "class": "logging.StreamHandler",
+                "formatter": "standard_formatter",
+            }
+        },
+        "loggers": {
+            "standard_logger": {
+                "handlers": ["file", "console"],
+                "level": "INFO",
+                "propagate": False,
+            }
+        },
+        "root": {"handlers": ["file", "console"], "level": "INFO"}
+    })
+
+
+if __name__ == "__main__":
+    init_log("logs", "watch.log")
+    paths = os.getenv("SCAN_PATHS").split(",")
+    use_polling = os.getenv("WATCH_POLLING", "false").lower() == "true"
+    WatchService(paths, use_polling).run()
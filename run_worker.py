@@ -0,0 +1,57 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+run_worker.py
+该脚本的作用是，从任务表dev.tb_image_job中领取任务，为图片生成图片特征向量、OCR文本或文本特征向量。
+可以在多台机器上同时运行任意数量的该脚本，共同处理同一个数据库中的图片；某个进程崩溃后，它领取的任务在租约到期后会被其他进程重新领取。
+需要先执行run_init_db.py将图片基本信息载入数据库。
+用法：python run_worker.py [image_vector] [ocr_text] [all_text_vector]，不指定时处理所有阶段。
+例如只有CPU的机器可以只处理OCR：python run_worker.py ocr_text
+"""
+import logging.config
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.app.db.models.image_job_do import ImageJobStageEnum
+from src.app.service.image_job_service import ImageJobService
+
+
+def init_log(log_dir: str, log_file_name: str):
+    os.makedirs(log_dir, exist_ok=True)
+    logging.config.dictConfig({
+        "version": 1,
+        "formatters": {
+            "standard_formatter": {"format": "%(asctime)s [%(levelname)s] [%(threadName)s]-%(name)s %(module)s:%(lineno)d - %(message)s"}
+        },
+        "handlers": {
+            "file": {
+                "class": "logging.handlers.RotatingFileHandler",
+                "filename": f"{log_dir}/{log_file_name}",
+                "maxBytes": 10 * 1024 * 1024,
+                "formatter": "standard_formatter",
+            },
+            "console": {
+                "class": "logging.StreamHandler",
+                "formatter": "standard_formatter",
+            }
+        },
+        "loggers": {
+            "standard_logger": {
+                "handlers": ["file", "console"],
+                "level": "INFO",
+                "propagate": False,
+            }
+        },
+        "root": {"handlers": ["file", "console"], "level": "INFO"}
+    })
+
+
+if __name__ == "__main__":
+    init_log("logs", f"worker_{os.getpid()}.log")
+    stages = [ImageJobStageEnum(stage) for stage in sys.argv[1:]] or list(ImageJobStageEnum)
+    ImageJobService(stages).run(exit_when_idle=False)
@@ -73,12 +73,20 @@ class RenameUtil:
             if photo_date:
                 file_info.modifiedTime = photo_date
                 logger.info(f"使用文件拍摄时间：{file_info.modifiedTime}")
-            # 4
-            file_info.sha256 = Sha256Util.sha256_file(file_info.sourcePath)
+        # 4，多个文件并发计算
+        file_info_dict = {file_info.sourcePath: file_info for file_info in file_info_list}
+        for file_path, file_sha256 in Sha256Util.sha256_files(file_info_dict.keys()):
+            file_info_dict[file_path].sha256 = file_sha256
+            if file_sha256 is None:
+                # 读取失败的文件没有sha256，不参与重复文件的判断，也不能按sha256重命名
+                file_info_dict[file_path].status = FileStatusEnum.INVALID
+                logger.warning(f"计算sha256异常：{file_path}")
 
         # 将正常文件按sha256值分组，每个sha256值对应一个文件列表，该文件列表按修改日期进行排序
         grouped_file_info = {}
         for file_info in file_info_list:
+            if file_info.sha256 is None:
+                continue
             if file_info.sha256 not in grouped_file_info:
                 group = []
                 grouped_file_info[file_info.sha256] = group
@@ -6,12 +6,16 @@ chinese_clip.py
 """
 from threading import Lock
 
+import numpy as np
+import torch
 from transformers import ChineseCLIPModel, ChineseCLIPProcessor, AutoTokenizer
 
 
 class ChineseClip:
     _instance = None
     _lock = Lock()
+    # 批量计算图片特征向量时，每次前向传播的默认图片数量
+    DEFAULT_IMAGE_BATCH_SIZE = 32
 
     @classmethod
     def get_instance(cls):
@@ -23,10 +27,13 @@ class ChineseClip:
         return cls._instance
 
     def __init__(self):
-        self.tokenizer = AutoTokenizer.from_pretrained("OFA-Sys/chinese-clip-vit-huge-patch14")
-        self.processor = ChineseCLIPProcessor.from_pretrained("OFA-Sys/chinese-clip-vit-huge-patch14")
+        self.modelName = "OFA-Sys/chinese-clip-vit-huge-patch14"
+        self.tokenizer = AutoTokenizer.from_pretrained(self.modelName)
+        self.processor = ChineseCLIPProcessor.from_pretrained(self.modelName)
 
-        self.model = ChineseCLIPModel.from_pretrained("OFA-Sys/chinese-clip-vit-huge-patch14").to("cuda")
+        self.model = ChineseCLIPModel.from_pretrained(self.modelName).to("cuda")
+        # 模型文件的版本（Hugging Face的提交哈希），用于判断缓存的特征向量是否仍然有效
+        self.modelVersion = getattr(self.model.config, "_commit_hash", None) or "unknown"
 
     def embed_text_to_vec(self, text):
         inputs = self.tokenizer(text, max_length=512, padding=True, return_tensors="pt", truncation=True).to("cuda")
@@ -42,6 +49,27 @@ class ChineseClip:
         feature = feature.cpu().detach().numpy()
         return feature[0]
 
+    def embed_images_to_vec(self, images: list, batch_size: int = DEFAULT_IMAGE_BATCH_SIZE) -> np.ndarray:
+        """ 批量计算图片特征向量。
+
+        Args:
+            images: PIL图片列表
+            batch_size: 每次前向传播的图片数量
+
+        Returns:
+            形状为(N,1024)的矩阵，每一行为对应图片归一化后的特征向量，顺序与images一致
+        """
+        features = []
+        with torch.inference_mode():
+            for start in range(0, len(images), batch_size):
+                inputs = self.processor(images=images[start:start + batch_size], return_tensors="pt").to("cuda")
+                feature = self.model.get_image_features(**inputs)
+                feature = feature / feature.norm(p=2, dim=-1, keepdim=True)  # normalize
+                features.append(feature.cpu().numpy())
+        if not features:
+            return np.empty((0, self.model.config.projection_dim), dtype=np.float32)
+        return np.concatenate(features, axis=0)
+
 
 if __name__ == '__main__':
     clip = ChineseClip()
@@ -0,0 +1,155 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+embedding_cache.py
+"""
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable
+
+import numpy as np
+
+from src.app.log.logger import logger
+
+
+class EmbeddingCache:
+    """ 查询文本特征向量的缓存，键为(模型名, 规范化后的文本)。
+
+    - 内存层：按最近使用淘汰的LRU缓存，最多MAX_MEMORY_ENTRIES条；
+    - 磁盘层：可选，.env中设置EMBEDDING_CACHE_PATH后使用SQLite文件保存，重启后仍然有效，最多MAX_DISK_ENTRIES条。
+
+    每条缓存记录生成时的模型版本，模型版本变化后旧的缓存不再命中，并在读到时删除。
+    """
+    _instance = None
+    _lock = Lock()
+    # 内存中缓存的最大条数
+    MAX_MEMORY_ENTRIES = 1024
+    # 磁盘上缓存的最大条数
+    MAX_DISK_ENTRIES = 100000
+    # 每写入多少条检查一次磁盘缓存是否超过上限
+    PRUNE_INTERVAL = 100
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance:
+            return cls._instance
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = EmbeddingCache(os.getenv("EMBEDDING_CACHE_PATH"))
+        return cls._instance
+
+    def __init__(self, disk_path: str | None = None):
+        self.lock = Lock()
+        # (模型名, 文本) -> (模型版本, 特征向量)
+        self.memoryCache: OrderedDict[tuple[str, str], tuple[str, np.ndarray]] = OrderedDict()
+        self.connection = None
+        self.putCount = 0
+        if disk_path:
+            # 编码线程池中的多个线程共用一个连接，所有访问都在self.lock内
+            self.connection = sqlite3.connect(disk_path, check_same_thread=False)
+            self.connection.execute("""
+                                    CREATE TABLE IF NOT EXISTS embedding_cache
+                                    (
+                                        model      TEXT NOT NULL,
+                                        text       TEXT NOT NULL,
+                                        version    TEXT NOT NULL,
+                                        vector     BLOB NOT NULL,
+                                        gmt_access REAL NOT NULL,
+                                        PRIMARY KEY (model, text)
+                                    )
+                                    """)
+            self.connection.execute("CREATE INDEX IF NOT EXISTS embedding_cache_gmt_access_index ON embedding_cache (gmt_access)")
+            self.connection.commit()
+
+    def get_or_compute(self, model_name: str, model_version: str, text: str,
+                       compute_func: Callable[[str], np.ndarray]) -> np.ndarray:
+        """ 从缓存读取文本的特征向量，未命中时计算并写入缓存。
+
+        Args:
+            model_name: 模型名
+            model_version: 模型版本，与缓存中的版本不一致时视为未命中
+            text: 查询文本
+            compute_func: 计算特征向量的函数，入参为规范化后的文本
+
+        Returns:
+            只读的特征向量
+        """
+        text = EmbeddingCache.normalize(text)
+        key = (model_name, text)
+        vector = self.__get(key, model_version)
+        if vector is not None:
+            return vector
+        vector = np.asarray(compute_func(text), dtype=np.float32)
+        vector.setflags(write=False)
+        self.__put(key, model_version, vector)
+        return vector
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        # 首尾空白和连续的空白不影响检索意图
+        return re.sub(r"\s+", " ", text).strip()
+
+    def __get(self, key: tuple[str, str], model_version: str) -> np.ndarray | None:
+        with self.lock:
+            cached = self.memoryCache.get(key)
+            if cached is not None:
+                version, vector = cached
+                if version == model_version:
+                    self.memoryCache.move_to_end(key)
+                    return vector
+                del self.memoryCache[key]
+            if self.connection is None:
+                return None
+            row = self.connection.execute("SELECT version, vector FROM embedding_cache WHERE model = ? AND text = ?",
+                                          key).fetchone()
+            if row is None:
+                return None
+            version, blob = row
+            if version != model_version:
+                self.connection.execute("DELETE FROM embedding_cache WHERE model = ? AND text = ?", key)
+                self.connection.commit()
+                return None
+            self.connection.execute("UPDATE embedding_cache SET gmt_access = ? WHERE model = ? AND text = ?",
+                                    (time.time(), *key))
+            self.connection.commit()
+            vector = np.frombuffer(blob, dtype=np.float32)
+            self.__put_memory(key, model_version, vector)
+            return vector
+
+    def __put(self, key: tuple[str, str], model_version: str, vector: np.ndarray):
+        with self.lock:
+            self.__put_memory(key, model_version, vector)
+            if self.connection is None:
+                return
+            try:
+                self.connection.execute("INSERT OR REPLACE INTO embedding_cache (model, text, version, vector, gmt_access) "
+                                        "VALUES (?, ?, ?, ?, ?)", (*key, model_version, vector.tobytes(), time.time()))
+                self.putCount += 1
+                if self.putCount % EmbeddingCache.PRUNE_INTERVAL == 0:
+                    self.__prune_disk()
+                self.connection.commit()
+            except sqlite3.Error as e:
+                # 磁盘缓存写入失败不影响检索
+                logger.error(e, exc_info=True)
+
+    def __put_memory(self, key: tuple[str, str], model_version: str, vector: np.ndarray):
+        self.memoryCache[key] = (model_version, vector)
+        self.memoryCache.move_to_end(key)
+        while len(self.memoryCache) > EmbeddingCache.MAX_MEMORY_ENTRIES:
+            self.memoryCache.popitem(last=False)
+
+    def __prune_disk(self):
+        # 删除最久未使用的记录，使磁盘缓存不超过上限
+        self.connection.execute("""
+                                DELETE
+                                FROM embedding_cache
+                                WHERE rowid IN (SELECT rowid
+                                                FROM embedding_cache
+                                                ORDER BY gmt_access
+                                                LIMIT max((SELECT count(*) FROM embedding_cache) - ?, 0))
+                                """, (EmbeddingCache.MAX_DISK_ENTRIES,))
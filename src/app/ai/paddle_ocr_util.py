@@ -5,6 +5,8 @@ For full terms, see the LICENSE file.
 paddle_ocr_util.py
 """
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from threading import Lock
 
 import numpy as np
@@ -17,6 +19,8 @@ from src.app.log.logger import logger
 class PaddleOCRUtil:
     _instance = None
     _lock = Lock()
+    TEXT_DETECTION_MODEL_DIR = "resources/ai-models/PP-OCRv5_server_det_infer"
+    TEXT_RECOGNITION_MODEL_DIR = "resources/ai-models/PP-OCRv5_server_rec_infer"
 
     @classmethod
     def get_instance(cls):
@@ -24,15 +28,15 @@ class PaddleOCRUtil:
             return cls._instance
         with cls._lock:
             if not cls._instance:
-                cls._instance = PaddleOCRUtil("resources/ai-models/PP-OCRv5_server_det_infer",
-                                              "resources/ai-models/PP-OCRv5_server_rec_infer")
+                cls._instance = PaddleOCRUtil(cls.TEXT_DETECTION_MODEL_DIR, cls.TEXT_RECOGNITION_MODEL_DIR)
         return cls._instance
 
-    def __init__(self, text_detection_model_dir, text_recognition_model_dir):
+    def __init__(self, text_detection_model_dir, text_recognition_model_dir, cpu_threads: int | None = None):
         self.ocr = PaddleOCR(text_detection_model_dir=text_detection_model_dir,
                              text_recognition_model_dir=text_recognition_model_dir,
                              use_doc_unwarping=False,
-                             device="cpu")
+                             device="cpu",
+                             cpu_threads=cpu_threads)
         self.text_detection_model = TextDetection(model_dir=text_detection_model_dir, device="cpu")
         self.text_recognition_model = TextRecognition(model_dir=text_recognition_model_dir, device="cpu")
         # 兼容paddle ocr中，修改了root logger日志级别的bug
@@ -49,6 +53,94 @@ class PaddleOCRUtil:
         return output[0]['rec_texts']
 
 
+class PaddleOCRPool:
+    """ 多进程OCR池。
+
+    每个工作进程各自持有一个PaddleOCR实例，并限制进程内的计算线程数，避免多个进程争抢CPU核心。
+    结果按输入顺序返回。
+    """
+
+    def __init__(self, workers: int, cpu_threads: int = 4,
+                 text_detection_model_dir: str = PaddleOCRUtil.TEXT_DETECTION_MODEL_DIR,
+                 text_recognition_model_dir: str = PaddleOCRUtil.TEXT_RECOGNITION_MODEL_DIR):
+        """
+        Args:
+            workers: 工作进程数
+            cpu_threads: 每个工作进程内的计算线程数。workers * cpu_threads 不宜超过CPU核心数
+            text_detection_model_dir: 文本检测模型目录
+            text_recognition_model_dir: 文本识别模型目录
+        """
+        # paddle不支持fork后继续使用，工作进程使用spawn方式启动
+        self.executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker,
+                                            initargs=(text_detection_model_dir, text_recognition_model_dir, cpu_threads))
+
+    def recognize_batch(self, images: list) -> list[list[str] | None]:
+        """ 并发识别多张图片中的文字。
+
+        Args:
+            images: PIL图片列表
+
+        Returns:
+            与images顺序一致的识别结果列表。识别异常的图片对应None
+        """
+        futures = [self.executor.submit(_recognize_array, np.array(image.convert('RGB'))) for image in images]
+        return PaddleOCRPool.__collect(futures)
+
+    def recognize_files(self, file_paths: list[str]) -> list[list[str] | None]:
+        """ 并发识别多个图片文件中的文字。图片在工作进程中读取，无需在进程间传输图片数据。
+
+        Args:
+            file_paths: 图片文件路径列表
+
+        Returns:
+            与file_paths顺序一致的识别结果列表。读取或识别异常的图片对应None
+        """
+        futures = [self.executor.submit(_recognize_file, file_path) for file_path in file_paths]
+        return PaddleOCRPool.__collect(futures)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    @staticmethod
+    def __collect(futures) -> list[list[str] | None]:
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                results.append(None)
+        return results
+
+
+# 工作进程内的OCR实例
+_worker_ocr_util: PaddleOCRUtil | None = None
+
+
+def _init_worker(text_detection_model_dir: str, text_recognition_model_dir: str, cpu_threads: int):
+    global _worker_ocr_util
+    # 进程内的计算线程数由PaddleOCR的cpu_threads限制
+    _worker_ocr_util = PaddleOCRUtil(text_detection_model_dir, text_recognition_model_dir, cpu_threads)
+
+
+def _recognize_array(img_array: np.ndarray) -> list[str]:
+    output = _worker_ocr_util.ocr.predict(img_array)
+    return output[0]['rec_texts']
+
+
+def _recognize_file(file_path: str) -> list[str]:
+    with Image.open(file_path) as image:
+        return _worker_ocr_util.recognize(image)
+
+
 if __name__ == "__main__":
     ocr_util = PaddleOCRUtil("../resources/ai-models/PP-OCRv5_server_det_infer",
                              "../resources/ai-models/PP-OCRv5_server_rec_infer")
@@ -6,6 +6,7 @@ qwen_embedding.py
 """
 from threading import Lock
 
+import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModel
 
@@ -13,6 +14,10 @@ from transformers import AutoTokenizer, AutoModel
 class QwenEmbedding:
     _instance = None
     _lock = Lock()
+    # 单条文本的最大token数
+    MAX_LENGTH = 10240
+    # 批量计算时，每批补齐后的token总数上限（批内文本数 x 批内最长文本的token数）
+    DEFAULT_MAX_TOKENS_PER_BATCH = 16384
 
     @classmethod
     def get_instance(cls):
@@ -27,16 +32,61 @@ class QwenEmbedding:
         self.modelName = "Qwen/Qwen3-Embedding-0.6B"
         self.tokenizer = AutoTokenizer.from_pretrained(self.modelName)
         self.model = AutoModel.from_pretrained(self.modelName).to("cuda").eval()
+        # 模型文件的版本（Hugging Face的提交哈希），用于判断缓存的特征向量是否仍然有效
+        self.modelVersion = getattr(self.model.config, "_commit_hash", None) or "unknown"
 
     def embed_to_vector(self, text: str):
         tokenized_text = self.tokenizer([text], padding=True, truncation=True,
-                                        max_length=10240, return_tensors="pt").to("cuda")
+                                        max_length=self.MAX_LENGTH, return_tensors="pt").to("cuda")
         with torch.no_grad():
             outputs = self.model(**tokenized_text)
             # 使用平均池化获取整个文本的嵌入
             embeddings = outputs.last_hidden_state.mean(dim=1).squeeze()
             return embeddings.cpu().numpy()
 
+    def embed_to_vectors(self, texts: list[str], max_tokens_per_batch: int = DEFAULT_MAX_TOKENS_PER_BATCH) -> np.ndarray:
+        """ 批量计算文本特征向量。
+
+        文本先按token数排序，再在token预算内分桶，使同一批内的文本长度相近，尽量减少补齐带来的无效计算。
+
+        Args:
+            texts: 文本列表
+            max_tokens_per_batch: 每批补齐后的token总数上限。超长的单条文本会独占一批
+
+        Returns:
+            形状为(N,1024)的矩阵，每一行为对应文本的特征向量，顺序与texts一致
+        """
+        result = np.empty((len(texts), self.model.config.hidden_size), dtype=np.float32)
+        if not texts:
+            return result
+        input_ids_list = self.tokenizer(texts, truncation=True, max_length=self.MAX_LENGTH)["input_ids"]
+        sorted_indexes = sorted(range(len(texts)), key=lambda i: len(input_ids_list[i]))
+        with torch.inference_mode():
+            for bucket in QwenEmbedding.__split_buckets(sorted_indexes, input_ids_list, max_tokens_per_batch):
+                tokenized_text = self.tokenizer.pad({"input_ids": [input_ids_list[i] for i in bucket]},
+                                                    padding=True, return_tensors="pt").to("cuda")
+                outputs = self.model(**tokenized_text)
+                # 使用平均池化获取整个文本的嵌入，补齐的token不参与计算
+                mask = tokenized_text["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+                embeddings = (outputs.last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+                result[bucket] = embeddings.float().cpu().numpy()
+        return result
+
+    @staticmethod
+    def __split_buckets(sorted_indexes: list[int], input_ids_list: list, max_tokens_per_batch: int) -> list[list[int]]:
+        # sorted_indexes已按token数升序排列，所以桶内最后加入的文本就是桶内最长的文本
+        buckets = []
+        bucket = []
+        for i in sorted_indexes:
+            length = max(len(input_ids_list[i]), 1)
+            if bucket and (len(bucket) + 1) * length > max_tokens_per_batch:
+                buckets.append(bucket)
+                bucket = []
+            bucket.append(i)
+        if bucket:
+            buckets.append(bucket)
+        return buckets
+
 
 if __name__ == "__main__":
     qwen_embedding = QwenEmbedding()
@@ -0,0 +1,47 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+db_backend.py
+"""
+import os
+from threading import Lock
+
+from src.app.db.mapper.image_info_mapper import ImageInfoMapper
+from src.app.db.mapper.image_info_store import ImageInfoStore
+from src.app.db.mapper.sqlite_image_info_mapper import SqliteImageInfoMapper
+from src.app.db.models.db_backend_enum import DBBackendEnum
+from src.app.db.sqlite_engine import SqliteEngine
+
+
+class DBBackend:
+    """ 按.env中的DB_BACKEND选择图片信息的存储后端，默认为postgres。
+    Session用于创建会话，两种后端的会话都支持with语句、commit和rollback；
+    create_image_info_mapper在会话上创建对应后端的ImageInfoStore。
+    """
+    _instance = None
+    _lock = Lock()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance:
+            return cls._instance
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = DBBackend()
+        return cls._instance
+
+    def __init__(self):
+        self.backend = DBBackendEnum(os.getenv("DB_BACKEND", DBBackendEnum.POSTGRES.value))
+        if self.backend == DBBackendEnum.SQLITE:
+            self.engine = SqliteEngine(os.getenv("SQLITE_DB_PATH", "resources/image_db"))
+        else:
+            # 使用SQLite时无需安装psycopg
+            from src.app.db.db_engine import DBEngine
+            self.engine = DBEngine.get_instance()
+        self.Session = self.engine.Session
+
+    def create_image_info_mapper(self, session) -> ImageInfoStore:
+        if self.backend == DBBackendEnum.SQLITE:
+            return SqliteImageInfoMapper(session)
+        return ImageInfoMapper(session)
@@ -0,0 +1,40 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+db_engine.py
+"""
+import os
+from threading import Lock
+
+from pgvector.psycopg import register_vector
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+
+class DBEngine:
+    """ 进程内共用的数据库引擎。使用psycopg 3驱动，并在每个新连接上注册pgvector的适配器，
+    使vector列与numpy数组之间直接按二进制格式转换。
+    """
+    _instance = None
+    _lock = Lock()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance:
+            return cls._instance
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = DBEngine()
+        return cls._instance
+
+    def __init__(self):
+        self.engine = create_engine(f"postgresql+psycopg://"
+                                    f"{os.getenv('POSTGRESQL_USER')}:{os.getenv('POSTGRESQL_PASSWORD')}"
+                                    f"@{os.getenv('POSTGRESQL_HOST')}:{os.getenv('POSTGRESQL_PORT')}/{os.getenv('POSTGRESQL_DB')}")
+        event.listen(self.engine, "connect", DBEngine.__on_connect)
+        self.Session = sessionmaker(bind=self.engine)
+
+    @staticmethod
+    def __on_connect(dbapi_connection, connection_record):
+        register_vector(dbapi_connection)
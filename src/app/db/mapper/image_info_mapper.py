@@ -4,30 +4,66 @@ Licensed under the Apache-2.0 License.
 For full terms, see the LICENSE file.  
 image_info_mapper.py
 """
+import os
+import re
 from datetime import datetime
+from typing import Iterator
 
-from sqlalchemy import text, bindparam
+from sqlalchemy import text, bindparam, or_, insert, update, literal, func, case
 from sqlalchemy.orm import Session
 
+from src.app.db.mapper.image_info_store import ImageInfoStore
 from src.app.db.models import ImageInfoDO
+from src.app.db.models.image_file_status import ImageFileStatus
+from src.app.db.models.image_job_do import ImageJobStageEnum
 from src.app.db.models.image_info_result import ImageInfoResult
+from src.app.db.models.image_reusable_result import ImageReusableResult
+from src.app.db.models.vector_storage_mode_enum import VectorStorageModeEnum
+from src.app.db.models.vector_type import VectorType
 
 
-class ImageInfoMapper:
+class ImageInfoMapper(ImageInfoStore):
+    # 批量更新时允许写入的列及其数据库类型
+    _COLUMN_DB_TYPES = {
+        "file_gmt_modified": "TIMESTAMP",
+        "file_path": "VARCHAR",
+        "file_name": "VARCHAR",
+        "file_sha256": "VARCHAR",
+        "file_size": "BIGINT",
+        "file_mtime": "DOUBLE PRECISION",
+        "ocr_text": "TEXT",
+        "tag_text": "TEXT",
+        "image_vector": "VECTOR",
+        "all_text_vector": "VECTOR",
+    }
+    _VECTOR_COLUMNS = ("image_vector", "all_text_vector")
+    # 批量写入时单条SQL语句包含的最大行数
+    _MAX_ROWS_PER_STATEMENT = 500
+    # 向量维度
+    _VECTOR_DIM = 1024
+    # 从索引中取出的候选结果数量为最终结果数量的倍数。低精度模式下候选结果再用全精度向量重排
+    _RERANK_FACTORS = {
+        VectorStorageModeEnum.FULL: 1,
+        VectorStorageModeEnum.HALFVEC: 2,
+        VectorStorageModeEnum.BINARY: 10,
+    }
+
+    # pgvector中hnsw.ef_search的默认值和上限
+    _DEFAULT_EF_SEARCH = 40
+    _MAX_EF_SEARCH = 1000
+    # 数据库中的pgvector是否支持迭代扫描，首次检索时查询
+    _iterativeScanSupported: bool | None = None
+
     def __init__(self, session: Session):
         self.session = session
-        self.sql_template_image_vector_search \
-            = text("""
-                   SELECT id,
-                          file_path,
-                          file_name,
-                          file_sha256,
-                          image_vector <=> :query_vec AS cosine_distance
-                   FROM dev.tb_image_info
-                   WHERE image_vector <=> :query_vec < :max_cosine_distance
-                   ORDER BY image_vector <=> :query_vec
-                   LIMIT :limit
-                   """)
+        self.vectorStorageMode = VectorStorageModeEnum(os.getenv("VECTOR_STORAGE_MODE", VectorStorageModeEnum.FULL.value))
+        # 向量索引的检索参数默认值，可以在每次检索时单独指定
+        self.efSearch: int | None = int(os.getenv("VECTOR_INDEX_EF_SEARCH")) if os.getenv("VECTOR_INDEX_EF_SEARCH") else None
+        self.probes: int | None = int(os.getenv("VECTOR_INDEX_PROBES")) if os.getenv("VECTOR_INDEX_PROBES") else None
+        # 是否带相似度阈值 -> 检索SQL
+        self.sql_templates_image_vector_search \
+            = {with_threshold: text(ImageInfoMapper.__build_vector_search_sql("image_vector", self.vectorStorageMode, with_threshold))
+               for with_threshold in (True, False)}
         self.sql_template_text_search \
             = text("""
                    SELECT id,
@@ -35,24 +71,62 @@ class ImageInfoMapper:
                           file_name,
                           file_sha256
                    FROM dev.tb_image_info
-                   WHERE to_tsvector('chinese_ocr', ocr_text) @@ to_tsquery('chinese_ocr', :search_text)
-                   ORDER BY id
+                   WHERE to_tsvector('chinese_ocr', ocr_text) @@ plainto_tsquery('chinese_ocr', :search_text)
+                   ORDER BY ts_rank(to_tsvector('chinese_ocr', ocr_text), plainto_tsquery('chinese_ocr', :search_text)) DESC, id
                    LIMIT :limit
                    """)
-        self.sql_template_all_text_vector_search \
+        # 按结果的完整程度排序，每个sha256只取一条记录
+        self.sql_template_reusable_query \
             = text("""
-                   SELECT id,
-                          file_path,
-                          file_name,
-                          file_sha256,
-                          all_text_vector <=> :query_vec AS cosine_distance
+                   SELECT DISTINCT ON (file_sha256) file_sha256,
+                                                    image_vector,
+                                                    ocr_text,
+                                                    CASE WHEN COALESCE(tag_text, '') = '' THEN all_text_vector END AS all_text_vector
                    FROM dev.tb_image_info
-                   WHERE all_text_vector <=> :query_vec < :max_cosine_distance
-                   ORDER BY all_text_vector <=> :query_vec
-                   LIMIT :limit
-                   """)
+                   WHERE file_sha256 IN :file_sha256_list
+                     AND (image_vector IS NOT NULL OR ocr_text IS NOT NULL)
+                   ORDER BY file_sha256,
+                            image_vector IS NULL,
+                            ocr_text IS NULL,
+                            all_text_vector IS NULL OR COALESCE(tag_text, '') != '',
+                            id
+                   """).bindparams(bindparam("file_sha256_list", expanding=True))
+        # {column}为列名，{{id_filter}}、{{donor_filter}}在执行时替换为可选的主键过滤条件
+        self.sql_template_copy_by_file_sha256 \
+            = """
+              UPDATE dev.tb_image_info AS t
+              SET {column} = d.{column}
+              FROM (SELECT DISTINCT ON (file_sha256) file_sha256, {column}
+                    FROM dev.tb_image_info
+                    WHERE {column} IS NOT NULL {{donor_filter}}
+                    ORDER BY file_sha256, id) AS d
+              WHERE t.file_sha256 = d.file_sha256
+                AND t.{column} IS NULL {{id_filter}}
+              """
+        self.sql_template_copy_all_text_vector \
+            = """
+              UPDATE dev.tb_image_info AS t
+              SET all_text_vector = d.all_text_vector
+              FROM (SELECT DISTINCT ON (file_sha256, ocr_text) file_sha256, ocr_text, all_text_vector
+                    FROM dev.tb_image_info
+                    WHERE all_text_vector IS NOT NULL
+                      AND COALESCE(tag_text, '') = '' {donor_filter}
+                    ORDER BY file_sha256, ocr_text, id) AS d
+              WHERE t.file_sha256 = d.file_sha256
+                AND t.ocr_text = d.ocr_text
+                AND COALESCE(t.tag_text, '') = ''
+                AND t.all_text_vector IS NULL {id_filter}
+              """
+        self.sql_templates_all_text_vector_search \
+            = {with_threshold: text(ImageInfoMapper.__build_vector_search_sql("all_text_vector", self.vectorStorageMode, with_threshold))
+               for with_threshold in (True, False)}
+        # 两个向量列的检索合并为一条SQL，一次往返同时返回两组结果
+        self.sql_templates_dual_vector_search \
+            = {with_threshold: text(ImageInfoMapper.__build_dual_vector_search_sql(self.vectorStorageMode, with_threshold))
+               for with_threshold in (True, False)}
 
-    def insert(self, file_gmt_modified, file_path, file_name, file_sha256):
+    def insert(self, file_gmt_modified, file_path, file_name, file_sha256,
+               ocr_text=None, tag_text=None, image_vector=None, all_text_vector=None):
         image_info_do = ImageInfoDO()
         image_info_do.gmt_create = datetime.now()
         image_info_do.gmt_modified = datetime.now()
@@ -60,17 +134,98 @@ class ImageInfoMapper:
         image_info_do.file_path = file_path
         image_info_do.file_name = file_name
         image_info_do.file_sha256 = file_sha256
-        image_info_do.ocr_text = None
-        image_info_do.tag_text = None
-        image_info_do.image_vector = None
-        image_info_do.all_text_vector = None
+        image_info_do.ocr_text = ocr_text
+        image_info_do.tag_text = tag_text
+        image_info_do.image_vector = image_vector
+        image_info_do.all_text_vector = all_text_vector
         self.session.add(image_info_do)
         self.session.commit()
 
+    def insert_batch(self, image_info_list: list[dict], delete_ids: list[int] | None = None):
+        """ 批量插入记录，整批数据在同一个事务中写入并只提交一次。
+
+        Args:
+            image_info_list: 待插入的记录列表，字典的键为列名，未提供的列写入None
+            delete_ids: 插入前需要在同一事务中删除的记录主键，用于替换已有的异常记录
+        """
+        now = datetime.now()
+        row_list = []
+        for image_info in image_info_list:
+            row = {"gmt_create": now, "gmt_modified": now, "ocr_text": None, "tag_text": None,
+                   "image_vector": None, "all_text_vector": None}
+            row.update(image_info)
+            for column in ImageInfoMapper._VECTOR_COLUMNS:
+                row[column] = ImageInfoMapper.__to_db_value(column, row[column])
+            row_list.append(row)
+        try:
+            if delete_ids:
+                (self.session.query(ImageInfoDO)
+                 .filter(ImageInfoDO.id.in_(delete_ids))
+                 .delete(synchronize_session=False))
+            if row_list:
+                self.session.execute(insert(ImageInfoDO), row_list)
+            self.session.commit()
+        except Exception:
+            # 出错后事务处于中止状态，回滚后同一会话才能继续写入之后的批次
+            self.session.rollback()
+            raise
+
+    def delete_batch_by_id(self, ids: list[int]):
+        if not ids:
+            return
+        self.session.query(ImageInfoDO).filter(ImageInfoDO.id.in_(ids)).delete(synchronize_session=False)
+        self.session.commit()
+
     def delete_by_file_path(self, file_path):
         self.session.query(ImageInfoDO).filter(ImageInfoDO.file_path == file_path).delete()
         self.session.commit()
 
+    def delete_batch_by_file_path(self, file_paths: list[str], sep: str):
+        """ 批量删除指定路径的记录。路径为目录时，同时删除该目录下所有文件的记录。
+
+        Args:
+            file_paths: 已被删除的文件或目录路径
+            sep: 路径分隔符
+        """
+        if not file_paths:
+            return
+        for i in range(0, len(file_paths), ImageInfoMapper._MAX_ROWS_PER_STATEMENT):
+            chunk = file_paths[i:i + ImageInfoMapper._MAX_ROWS_PER_STATEMENT]
+            (self.session.query(ImageInfoDO)
+             .filter(or_(ImageInfoDO.file_path.in_(chunk),
+                         *[ImageInfoDO.file_path.startswith(file_path + sep, autoescape=True) for file_path in chunk]))
+             .delete(synchronize_session=False))
+        self.session.commit()
+
+    def move_file_path(self, src_path: str, dest_path: str, sep: str) -> int:
+        """ 文件或目录被移动、重命名后，直接修改记录中的路径，无需重新计算向量和OCR文本。
+        目标路径上已有的记录会在同一事务中被删除。
+
+        Args:
+            src_path: 原文件或目录路径
+            dest_path: 新文件或目录路径
+            sep: 路径分隔符
+
+        Returns:
+            被修改路径的记录数量
+        """
+        (self.session.query(ImageInfoDO)
+         .filter(or_(ImageInfoDO.file_path == dest_path,
+                     ImageInfoDO.file_path.startswith(dest_path + sep, autoescape=True)))
+         .delete(synchronize_session=False))
+        # 目录下的文件只替换路径前缀，文件名不变
+        result = self.session.execute(
+            update(ImageInfoDO)
+            .where(or_(ImageInfoDO.file_path == src_path,
+                       ImageInfoDO.file_path.startswith(src_path + sep, autoescape=True)))
+            .values(file_path=literal(dest_path) + func.substr(ImageInfoDO.file_path, len(src_path) + 1),
+                    file_name=case((ImageInfoDO.file_path == src_path, dest_path.rsplit(sep, 1)[-1]),
+                                   else_=ImageInfoDO.file_name),
+                    gmt_modified=datetime.now())
+            .execution_options(synchronize_session=False))
+        self.session.commit()
+        return result.rowcount
+
     def truncate(self):
         self.session.execute(text("TRUNCATE TABLE dev.tb_image_info"))
         self.session.commit()
@@ -81,6 +236,104 @@ class ImageInfoMapper:
                 .limit(batch_size)
                 .all())
 
+    def query_count(self) -> int:
+        return self.session.query(func.count(ImageInfoDO.id)).scalar()
+
+    def scan_columns(self, columns: list[str], not_null_columns: list[str] | None = None,
+                     batch_size: int = 1000) -> Iterator[tuple]:
+        """ 使用服务端游标按主键顺序流式读取全表，只读取指定的列，内存占用与表大小无关。
+        遍历期间不能在同一个session中提交写操作，否则游标会被关闭，需要修改的记录应在遍历结束后统一处理。
+
+        Args:
+            columns: 需要读取的列名
+            not_null_columns: 只需要判断是否为空的列名，不读取列的内容，例如向量列
+            batch_size: 每次从服务端取回的行数
+
+        Returns:
+            逐行返回元组，依次为columns各列的值和not_null_columns各列是否不为空
+        """
+        expressions = [getattr(ImageInfoDO, column) for column in columns]
+        expressions += [getattr(ImageInfoDO, column).isnot(None) for column in not_null_columns or []]
+        query = (self.session.query(*expressions)
+                 .order_by(ImageInfoDO.id.asc())
+                 .execution_options(stream_results=True, yield_per=batch_size))
+        for row in query:
+            yield tuple(row)
+
+    def query_by_stage_batch(self, stage: ImageJobStageEnum, id: int, batch_size: int = 100, pending_only: bool = True):
+        """ 按主键分页查询某个处理阶段的输入，只读取该阶段需要的列，不读取向量等大字段。
+
+        Args:
+            stage: 处理阶段
+            id: 只查询主键大于该值的记录
+            batch_size: 每页数量
+            pending_only: 为True时只查询该阶段结果为空的记录，由对应的部分索引支持
+
+        Returns:
+            按主键升序排列的Row列表，可以通过列名访问各列
+        """
+        columns, conditions = ImageInfoMapper.__stage_columns_conditions(stage, pending_only)
+        return (self.session.query(*columns)
+                .filter(ImageInfoDO.id > id, *conditions)
+                .order_by(ImageInfoDO.id.asc())
+                .limit(batch_size)
+                .all())
+
+    @staticmethod
+    def __stage_columns_conditions(stage: ImageJobStageEnum, pending_only: bool) -> tuple[list, list]:
+        columns = [ImageInfoDO.id, ImageInfoDO.file_path, ImageInfoDO.file_sha256]
+        conditions = []
+        if stage == ImageJobStageEnum.ALL_TEXT_VECTOR:
+            # 文本特征向量依赖OCR文本
+            columns += [ImageInfoDO.ocr_text, ImageInfoDO.tag_text]
+            conditions.append(ImageInfoDO.ocr_text.isnot(None))
+        if pending_only:
+            conditions.append(getattr(ImageInfoDO, stage.value).is_(None))
+        return columns, conditions
+
+    def query_by_id_list(self, ids: list[int]) -> list[ImageInfoDO]:
+        if not ids:
+            return []
+        return self.session.query(ImageInfoDO).filter(ImageInfoDO.id.in_(ids)).all()
+
+    def query_max_gmt_modified(self) -> datetime | None:
+        """ 查询所有记录中最晚的修改时间，表为空时返回None。"""
+        return self.session.query(func.max(ImageInfoDO.gmt_modified)).scalar()
+
+    def query_file_status_dict(self, path_prefix: str | None = None,
+                               file_paths: list[str] | None = None) -> dict[str, ImageFileStatus]:
+        """ 一次性读取记录的文件状态快照，不读取向量等大字段。
+
+        Args:
+            path_prefix: 只读取文件路径以此开头的记录，为None时读取全部记录。按目录读取时需要以路径分隔符结尾，否则会读取到同名前缀的其他目录
+            file_paths: 只读取这些文件路径的记录，为None时不按文件路径过滤
+
+        Returns:
+            文件路径 -> 文件状态
+        """
+        query = self.session.query(ImageInfoDO.file_path,
+                                   ImageInfoDO.id,
+                                   ImageInfoDO.file_sha256,
+                                   ImageInfoDO.file_size,
+                                   ImageInfoDO.file_mtime,
+                                   ImageInfoDO.tag_text,
+                                   ImageInfoDO.image_vector.isnot(None),
+                                   ImageInfoDO.ocr_text.isnot(None),
+                                   ImageInfoDO.all_text_vector.isnot(None))
+        if path_prefix is not None:
+            query = query.filter(ImageInfoDO.file_path.startswith(path_prefix, autoescape=True))
+        if file_paths is None:
+            rows = query.all()
+        else:
+            rows = []
+            for i in range(0, len(file_paths), ImageInfoMapper._MAX_ROWS_PER_STATEMENT):
+                rows.extend(query.filter(ImageInfoDO.file_path.in_(
+                    file_paths[i:i + ImageInfoMapper._MAX_ROWS_PER_STATEMENT])).all())
+        return {file_path: ImageFileStatus(id, file_sha256, file_size, file_mtime, tag_text,
+                                           has_image_vector, has_ocr_text, has_all_text_vector)
+                for file_path, id, file_sha256, file_size, file_mtime, tag_text,
+                has_image_vector, has_ocr_text, has_all_text_vector in rows}
+
     def query_by_file_sha256(self, file_sha256) -> ImageInfoDO | None:
         image_info_do = self.session.query(ImageInfoDO).filter(ImageInfoDO.file_sha256 == file_sha256).first()
         return image_info_do
@@ -89,51 +342,297 @@ class ImageInfoMapper:
         image_info_do = self.session.query(ImageInfoDO).filter(ImageInfoDO.file_path == file_path).first()
         return image_info_do
 
+    def query_vectors(self, id: int | None = None, file_sha256: str | None = None) -> tuple | None:
+        """ 按主键或文件sha256查询图库中已保存的图片特征向量和文本特征向量，用于以图库中的图片检索相似图片。
+
+        Args:
+            id: 记录主键
+            file_sha256: 文件sha256，同一内容有多条记录时取主键最小的一条。id和file_sha256至少指定一个
+
+        Returns:
+            (图片特征向量, 文本特征向量)，记录不存在或向量尚未计算完成时返回None
+        """
+        if id is None and file_sha256 is None:
+            raise ValueError("id和file_sha256至少指定一个")
+        query = self.session.query(ImageInfoDO.image_vector, ImageInfoDO.all_text_vector).filter(
+            ImageInfoDO.image_vector.isnot(None), ImageInfoDO.all_text_vector.isnot(None))
+        if id is not None:
+            query = query.filter(ImageInfoDO.id == id)
+        if file_sha256 is not None:
+            query = query.filter(ImageInfoDO.file_sha256 == file_sha256)
+        row = query.order_by(ImageInfoDO.id.asc()).first()
+        if row is None:
+            return None
+        return VectorType.to_numpy(row[0]), VectorType.to_numpy(row[1])
+
+    def query_reusable_by_file_sha256_list(self, file_sha256_list: list[str]) -> dict[str, ImageReusableResult]:
+        """ 按文件内容查询可复用的模型结果。同一sha256有多条记录时，优先选择结果最完整的一条。
+
+        Args:
+            file_sha256_list: 文件sha256列表
+
+        Returns:
+            sha256 -> 可复用的结果，没有任何可复用结果的sha256不在字典中
+        """
+        result = {}
+        file_sha256_list = list(set(file_sha256_list))
+        for i in range(0, len(file_sha256_list), ImageInfoMapper._MAX_ROWS_PER_STATEMENT):
+            rows = self.session.execute(self.sql_template_reusable_query,
+                                        {"file_sha256_list": file_sha256_list[i:i + ImageInfoMapper._MAX_ROWS_PER_STATEMENT]}).all()
+            for file_sha256, image_vector, ocr_text, all_text_vector in rows:
+                result[file_sha256] = ImageReusableResult(VectorType.to_numpy(image_vector), ocr_text,
+                                                          VectorType.to_numpy(all_text_vector))
+        return result
+
+    def copy_by_file_sha256(self, column: str, ids: list[int] | None = None) -> int:
+        """ 将已有记录的模型结果复制给文件内容（sha256）相同、但该列为空的记录，无需重新计算。
+        文本特征向量只在来源和目标记录都没有人工标签、且OCR文本相同时复制。
+
+        Args:
+            column: image_vector、ocr_text或all_text_vector
+            ids: 只复制给这些主键的记录，为None时复制给所有记录
+
+        Returns:
+            被复制的记录数量
+        """
+        if ids is not None and not ids:
+            return 0
+        if column == "all_text_vector":
+            sql = self.sql_template_copy_all_text_vector
+        else:
+            sql = self.sql_template_copy_by_file_sha256.format(column=column)
+        if ids is None:
+            sql = sql.format(id_filter="", donor_filter="")
+            result = self.session.execute(text(sql))
+        else:
+            sql = sql.format(id_filter="AND t.id IN :ids",
+                             donor_filter="AND file_sha256 IN (SELECT file_sha256 FROM dev.tb_image_info WHERE id IN :ids)")
+            result = self.session.execute(text(sql).bindparams(bindparam("ids", expanding=True)), {"ids": ids})
+        self.session.commit()
+        return result.rowcount
+
+    # 原地修改记录时同时更新gmt_modified，本地IVF索引按其增量同步
     def update_image_vector_by_file_sha256(self, file_sha256, image_vector):
-        self.session.query(ImageInfoDO).filter(ImageInfoDO.file_sha256 == file_sha256).update({ImageInfoDO.image_vector: image_vector})
+        self.session.query(ImageInfoDO).filter(ImageInfoDO.file_sha256 == file_sha256).update(
+            {ImageInfoDO.image_vector: image_vector, ImageInfoDO.gmt_modified: datetime.now()})
         self.session.commit()
 
     def update_ocr_text_by_file_path(self, file_path, ocr_text):
-        self.session.query(ImageInfoDO).filter(ImageInfoDO.file_path == file_path).update({ImageInfoDO.ocr_text: ocr_text})
+        self.session.query(ImageInfoDO).filter(ImageInfoDO.file_path == file_path).update(
+            {ImageInfoDO.ocr_text: ocr_text, ImageInfoDO.gmt_modified: datetime.now()})
         self.session.commit()
 
     def update_tag_text_by_file_path(self, file_path, tag_text):
-        self.session.query(ImageInfoDO).filter(ImageInfoDO.file_path == file_path).update({ImageInfoDO.tag_text: tag_text})
+        self.session.query(ImageInfoDO).filter(ImageInfoDO.file_path == file_path).update(
+            {ImageInfoDO.tag_text: tag_text, ImageInfoDO.gmt_modified: datetime.now()})
         self.session.commit()
 
     def update_image_vector_by_file_path(self, file_path, image_vector):
-        vector_str = ImageInfoMapper.__vector_to_pg_str(image_vector)
-        self.session.query(ImageInfoDO).filter(ImageInfoDO.file_path == file_path).update({ImageInfoDO.image_vector: vector_str})
+        self.session.query(ImageInfoDO).filter(ImageInfoDO.file_path == file_path).update(
+            {ImageInfoDO.image_vector: image_vector, ImageInfoDO.gmt_modified: datetime.now()})
         self.session.commit()
 
     def update_all_text_vector_by_file_path(self, file_path, all_text_vector):
-        vector_str = ImageInfoMapper.__vector_to_pg_str(all_text_vector)
-        self.session.query(ImageInfoDO).filter(ImageInfoDO.file_path == file_path).update({ImageInfoDO.all_text_vector: vector_str})
+        self.session.query(ImageInfoDO).filter(ImageInfoDO.file_path == file_path).update(
+            {ImageInfoDO.all_text_vector: all_text_vector, ImageInfoDO.gmt_modified: datetime.now()})
         self.session.commit()
 
-    def search_by_image_vector(self, image_vector, cosine_similarity: float, limit: int):
-        vector_str = ImageInfoMapper.__vector_to_pg_str(image_vector)
-        max_cosine_distance = 1 - cosine_similarity
-        execute_result = self.session.execute(self.sql_template_image_vector_search.bindparams(
-            bindparam("query_vec", value=vector_str),
-            bindparam("max_cosine_distance", value=max_cosine_distance),
-            bindparam("limit", value=limit))).mappings().all()
+    def update_batch_by_id(self, id_values_list: list[tuple[int, dict]]):
+        """ 按主键批量更新。每500行合并为一条UPDATE ... FROM (VALUES ...)语句，整批只提交一次。
 
-        result = [ImageInfoResult(**row) for row in execute_result]
-        return result
+        Args:
+            id_values_list: [(主键, {列名: 值})]，所有字典的列名必须一致
+        """
+        if not id_values_list:
+            return
+        columns = list(id_values_list[0][1].keys())
+        set_sql = ", ".join(f"{column} = v.{column}" for column in columns) + ", gmt_modified = :gmt_modified"
+        now = datetime.now()
+        try:
+            for start in range(0, len(id_values_list), ImageInfoMapper._MAX_ROWS_PER_STATEMENT):
+                params = {"gmt_modified": now}
+                values_sql_list = []
+                for i, (id, values) in enumerate(id_values_list[start:start + ImageInfoMapper._MAX_ROWS_PER_STATEMENT]):
+                    params[f"id_{i}"] = id
+                    placeholder_list = [f"CAST(:id_{i} AS BIGINT)"]
+                    for column in columns:
+                        params[f"{column}_{i}"] = ImageInfoMapper.__to_db_value(column, values[column])
+                        placeholder_list.append(f"CAST(:{column}_{i} AS {ImageInfoMapper._COLUMN_DB_TYPES[column]})")
+                    values_sql_list.append(f"({', '.join(placeholder_list)})")
+                sql = (f"UPDATE dev.tb_image_info AS t SET {set_sql} "
+                       f"FROM (VALUES {', '.join(values_sql_list)}) AS v(id, {', '.join(columns)}) "
+                       f"WHERE t.id = v.id")
+                self.session.execute(text(sql), params)
+            self.session.commit()
+        except Exception:
+            # 同insert_batch，回滚后才能继续写入之后的批次
+            self.session.rollback()
+            raise
 
-    def search_by_all_text_vector(self, text_vector, cosine_similarity: float, limit: int):
-        vector_str = ImageInfoMapper.__vector_to_pg_str(text_vector)
-        max_cosine_distance = 1 - cosine_similarity
+    def search_by_image_vector(self, image_vector, cosine_similarity: float | None, limit: int,
+                               ef_search: int | None = None, probes: int | None = None):
+        return self.__search_by_vector(self.sql_templates_image_vector_search, image_vector, cosine_similarity, limit,
+                                       ef_search, probes)
 
-        execute_result = self.session.execute(self.sql_template_all_text_vector_search.bindparams(
-            bindparam("query_vec", value=vector_str),
-            bindparam("max_cosine_distance", value=max_cosine_distance),
-            bindparam("limit", value=limit))).mappings().all()
+    def search_by_all_text_vector(self, text_vector, cosine_similarity: float | None, limit: int,
+                                  ef_search: int | None = None, probes: int | None = None):
+        return self.__search_by_vector(self.sql_templates_all_text_vector_search, text_vector, cosine_similarity, limit,
+                                       ef_search, probes)
+
+    def search_by_image_and_all_text_vector(self, image_vector, text_vector, cosine_similarity: float | None, limit: int,
+                                            ef_search: int | None = None, probes: int | None = None):
+        """ 同时按图片特征向量和文本特征向量检索，两次检索在同一条SQL中执行。
+
+        Args:
+            image_vector: 查询图片特征向量
+            text_vector: 查询文本特征向量
+            cosine_similarity: 相似度阈值，为None时不过滤
+            limit: 每组最多返回的记录数量
+
+        Returns:
+            (按图片特征向量检索的结果, 按文本特征向量检索的结果)
+        """
+        params = self.__build_search_params(cosine_similarity, limit, ef_search, probes)
+        params["image_query_vec"] = VectorType.to_db(image_vector)
+        params["text_query_vec"] = VectorType.to_db(text_vector)
+        execute_result = self.session.execute(self.sql_templates_dual_vector_search[cosine_similarity is not None],
+                                              params).mappings().all()
+
+        result = {"image_vector": [], "all_text_vector": []}
+        for row in execute_result:
+            row = dict(row)
+            result[row.pop("source")].append(ImageInfoResult(**row))
+        return result["image_vector"], result["all_text_vector"]
+
+    def search_by_ocr_text(self, search_text: str, limit: int) -> list[ImageInfoResult]:
+        """ 按OCR文本全文检索，查询文本按普通文本解析，不需要转义tsquery的运算符。
+
+        Args:
+            search_text: 查询文本
+            limit: 最多返回的记录数量
+
+        Returns:
+            按相关度降序排列的结果，cosine_distance为None
+        """
+        execute_result = self.session.execute(self.sql_template_text_search,
+                                              {"search_text": search_text, "limit": limit}).mappings().all()
+        return [ImageInfoResult(**row) for row in execute_result]
+
+    def __search_by_vector(self, sql_templates: dict, vector, cosine_similarity: float | None, limit: int,
+                           ef_search: int | None, probes: int | None):
+        """ 按余弦距离检索最相似的记录。
+
+        Args:
+            sql_templates: 是否带相似度阈值 -> 检索SQL
+            vector: 查询向量
+            cosine_similarity: 相似度阈值，为None时不过滤，直接返回最相似的limit条记录
+            limit: 最多返回的记录数量
+        """
+        params = self.__build_search_params(cosine_similarity, limit, ef_search, probes)
+        params["query_vec"] = VectorType.to_db(vector)
+        execute_result = self.session.execute(sql_templates[cosine_similarity is not None], params).mappings().all()
 
         result = [ImageInfoResult(**row) for row in execute_result]
         return result
 
+    def __build_search_params(self, cosine_similarity: float | None, limit: int,
+                              ef_search: int | None, probes: int | None) -> dict:
+        """ 设置本次检索的索引参数，并返回检索SQL中除查询向量外的参数。"""
+        candidate_limit = limit * ImageInfoMapper._RERANK_FACTORS[self.vectorStorageMode]
+        params = {"limit": limit, "candidate_limit": candidate_limit}
+        if cosine_similarity is not None:
+            params["max_cosine_distance"] = 1 - cosine_similarity
+        self.__set_index_options(candidate_limit, ef_search, probes)
+        return params
+
+    def __set_index_options(self, fetch_count: int, ef_search: int | None, probes: int | None):
+        """ 设置本次检索的索引参数，只在当前事务中生效。
+
+        Args:
+            fetch_count: 需要从索引中取出的结果数量
+            ef_search: HNSW检索时的候选队列长度，越大召回率越高、速度越慢
+            probes: IVFFlat检索时访问的聚类数量，越大召回率越高、速度越慢
+        """
+        ef_search = ef_search or self.efSearch or ImageInfoMapper._DEFAULT_EF_SEARCH
+        options = {}
+        if self.__supports_iterative_scan():
+            # 迭代扫描在结果不足时继续扫描索引，取出的结果数量不再受ef_search、probes限制。
+            # relaxed_order下结果可能略微乱序，检索SQL的外层查询会按余弦距离重新排序
+            options["hnsw.iterative_scan"] = "relaxed_order"
+            options["ivfflat.iterative_scan"] = "relaxed_order"
+        else:
+            # HNSW单次检索最多返回ef_search条结果，因此不能小于需要取出的结果数量
+            ef_search = max(ef_search, fetch_count)
+        options["hnsw.ef_search"] = str(min(ef_search, ImageInfoMapper._MAX_EF_SEARCH))
+        probes = probes or self.probes
+        if probes:
+            options["ivfflat.probes"] = str(probes)
+        select_sql = ", ".join(f"set_config(:name_{i}, :value_{i}, true)" for i in range(len(options)))
+        params = {}
+        for i, (name, value) in enumerate(options.items()):
+            params[f"name_{i}"] = name
+            params[f"value_{i}"] = value
+        self.session.execute(text(f"SELECT {select_sql}"), params)
+
+    def __supports_iterative_scan(self) -> bool:
+        """ pgvector 0.8.0起支持索引的迭代扫描，每个进程只查询一次扩展版本。"""
+        if ImageInfoMapper._iterativeScanSupported is None:
+            version = self.session.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+            version_numbers = tuple(int(number) for number in re.findall(r"\d+", version or "")[:2])
+            ImageInfoMapper._iterativeScanSupported = version_numbers >= (0, 8)
+        return ImageInfoMapper._iterativeScanSupported
+
+    @staticmethod
+    def __build_vector_search_sql(column: str, vector_storage_mode: VectorStorageModeEnum, with_threshold: bool,
+                                  query_param: str = "query_vec") -> str:
+        """ 生成向量检索SQL。内层查询只按向量距离排序并取出候选结果，使查询可以使用向量索引；
+        相似度阈值在外层查询中过滤，不会使查询退化为全表扫描。
+        低精度模式下，先按索引中的低精度副本取出候选结果，再按全精度向量的余弦距离重排。
+        ORDER BY中的表达式必须与索引表达式一致，否则无法使用索引。
+        """
+        dim = ImageInfoMapper._VECTOR_DIM
+        if vector_storage_mode == VectorStorageModeEnum.FULL:
+            approximate_order = f"{column} <=> :{query_param}"
+        elif vector_storage_mode == VectorStorageModeEnum.HALFVEC:
+            approximate_order = f"{column}::halfvec({dim}) <=> CAST(:{query_param} AS halfvec({dim}))"
+        else:
+            approximate_order = f"binary_quantize({column})::bit({dim}) <~> binary_quantize(CAST(:{query_param} AS vector({dim})))"
+        # 全精度模式下候选结果按余弦距离升序排列，阈值过滤后取前limit条与直接在WHERE中过滤的结果相同
+        threshold_filter = "WHERE cosine_distance < :max_cosine_distance" if with_threshold else ""
+        return f"""
+                SELECT id,
+                       file_path,
+                       file_name,
+                       file_sha256,
+                       cosine_distance
+                FROM (SELECT id,
+                             file_path,
+                             file_name,
+                             file_sha256,
+                             {column} <=> :{query_param} AS cosine_distance
+                      FROM dev.tb_image_info
+                      WHERE {column} IS NOT NULL
+                      ORDER BY {approximate_order}
+                      LIMIT :candidate_limit) AS c
+                {threshold_filter}
+                ORDER BY cosine_distance
+                LIMIT :limit
+                """
+
+    @staticmethod
+    def __build_dual_vector_search_sql(vector_storage_mode: VectorStorageModeEnum, with_threshold: bool) -> str:
+        # UNION ALL不保证各部分结果的顺序，最后按来源和余弦距离重新排序
+        image_sql = ImageInfoMapper.__build_vector_search_sql("image_vector", vector_storage_mode, with_threshold, "image_query_vec")
+        text_sql = ImageInfoMapper.__build_vector_search_sql("all_text_vector", vector_storage_mode, with_threshold, "text_query_vec")
+        return f"""
+                SELECT 'image_vector' AS source, r.* FROM ({image_sql}) AS r
+                UNION ALL
+                SELECT 'all_text_vector' AS source, r.* FROM ({text_sql}) AS r
+                ORDER BY source, cosine_distance
+                """
+
     @staticmethod
-    def __vector_to_pg_str(vector):
-        return "[" + ",".join([str(x) for x in vector]) + "]"
+    def __to_db_value(column: str, value):
+        if column in ImageInfoMapper._VECTOR_COLUMNS:
+            return VectorType.to_db(value)
+        return value
@@ -0,0 +1,138 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+image_info_store.py
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Iterator
+
+from src.app.db.models import ImageInfoDO
+from src.app.db.models.image_file_status import ImageFileStatus
+from src.app.db.models.image_info_result import ImageInfoResult
+from src.app.db.models.image_job_do import ImageJobStageEnum
+from src.app.db.models.image_reusable_result import ImageReusableResult
+
+
+class ImageInfoStore(ABC):
+    """ 图片信息存储的接口，服务和脚本只通过该接口读写图片信息。
+    - ImageInfoMapper：PostgreSQL + pgvector；
+    - SqliteImageInfoMapper：SQLite保存元数据，numpy内存映射文件保存向量。
+
+    实例由DBBackend按.env中的DB_BACKEND创建。各方法的参数和返回值的含义见ImageInfoMapper。
+    """
+
+    @abstractmethod
+    def insert_batch(self, image_info_list: list[dict], delete_ids: list[int] | None = None):
+        pass
+
+    @abstractmethod
+    def delete_batch_by_id(self, ids: list[int]):
+        pass
+
+    @abstractmethod
+    def delete_by_file_path(self, file_path):
+        pass
+
+    @abstractmethod
+    def delete_batch_by_file_path(self, file_paths: list[str], sep: str):
+        pass
+
+    @abstractmethod
+    def move_file_path(self, src_path: str, dest_path: str, sep: str) -> int:
+        pass
+
+    @abstractmethod
+    def truncate(self):
+        pass
+
+    @abstractmethod
+    def query_count(self) -> int:
+        pass
+
+    @abstractmethod
+    def scan_columns(self, columns: list[str], not_null_columns: list[str] | None = None,
+                     batch_size: int = 1000) -> Iterator[tuple]:
+        pass
+
+    @abstractmethod
+    def query_by_stage_batch(self, stage: ImageJobStageEnum, id: int, batch_size: int = 100, pending_only: bool = True):
+        pass
+
+    @abstractmethod
+    def query_by_id_list(self, ids: list[int]) -> list[ImageInfoDO]:
+        pass
+
+    @abstractmethod
+    def query_max_gmt_modified(self) -> datetime | None:
+        pass
+
+    @abstractmethod
+    def query_file_status_dict(self, path_prefix: str | None = None,
+                               file_paths: list[str] | None = None) -> dict[str, ImageFileStatus]:
+        pass
+
+    @abstractmethod
+    def query_by_file_sha256(self, file_sha256) -> ImageInfoDO | None:
+        pass
+
+    @abstractmethod
+    def query_by_file_path(self, file_path) -> ImageInfoDO | None:
+        pass
+
+    @abstractmethod
+    def query_vectors(self, id: int | None = None, file_sha256: str | None = None) -> tuple | None:
+        pass
+
+    @abstractmethod
+    def query_reusable_by_file_sha256_list(self, file_sha256_list: list[str]) -> dict[str, ImageReusableResult]:
+        pass
+
+    @abstractmethod
+    def copy_by_file_sha256(self, column: str, ids: list[int] | None = None) -> int:
+        pass
+
+    @abstractmethod
+    def update_tag_text_by_file_path(self, file_path, tag_text):
+        pass
+
+    @abstractmethod
+    def update_image_vector_by_file_path(self, file_path, image_vector):
+        pass
+
+    @abstractmethod
+    def update_all_text_vector_by_file_path(self, file_path, all_text_vector):
+        pass
+
+    @abstractmethod
+    def update_batch_by_id(self, id_values_list: list[tuple[int, dict]]):
+        pass
+
+    def update_image_vector_batch_by_id(self, id_vector_list: list[tuple[int, object]]):
+        self.update_batch_by_id([(id, {"image_vector": image_vector}) for id, image_vector in id_vector_list])
+
+    def update_ocr_text_batch_by_id(self, id_text_list: list[tuple[int, str]]):
+        self.update_batch_by_id([(id, {"ocr_text": ocr_text}) for id, ocr_text in id_text_list])
+
+    def update_all_text_vector_batch_by_id(self, id_vector_list: list[tuple[int, object]]):
+        self.update_batch_by_id([(id, {"all_text_vector": all_text_vector}) for id, all_text_vector in id_vector_list])
+
+    @abstractmethod
+    def search_by_image_vector(self, image_vector, cosine_similarity: float | None, limit: int,
+                               ef_search: int | None = None, probes: int | None = None) -> list[ImageInfoResult]:
+        pass
+
+    @abstractmethod
+    def search_by_all_text_vector(self, text_vector, cosine_similarity: float | None, limit: int,
+                                  ef_search: int | None = None, probes: int | None = None) -> list[ImageInfoResult]:
+        pass
+
+    @abstractmethod
+    def search_by_ocr_text(self, search_text: str, limit: int) -> list[ImageInfoResult]:
+        pass
+
+    @abstractmethod
+    def search_by_image_and_all_text_vector(self, image_vector, text_vector, cosine_similarity: float | None, limit: int,
+                                            ef_search: int | None = None, probes: int | None = None):
+        pass
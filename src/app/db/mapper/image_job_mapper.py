@@ -0,0 +1,196 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+image_job_mapper.py
+"""
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+
+from src.app.db.models.image_job_do import ImageJobStageEnum
+
+
+class ImageJobMapper:
+    # 各处理阶段需要满足的前置条件，文本特征向量依赖OCR文本
+    _STAGE_PRECONDITIONS = {
+        ImageJobStageEnum.IMAGE_VECTOR: "",
+        ImageJobStageEnum.OCR_TEXT: "",
+        ImageJobStageEnum.ALL_TEXT_VECTOR: "AND i.ocr_text IS NOT NULL",
+    }
+
+    def __init__(self, session: Session):
+        self.session = session
+        # 已完成的任务在结果被清空后（例如强制刷新）重新变为待处理
+        self.sql_template_enqueue \
+            = """
+              INSERT INTO dev.tb_image_job AS j (gmt_create, gmt_modified, image_id, stage, status, retry_count)
+              SELECT now(), now(), i.id, :stage, 'pending', 0
+              FROM dev.tb_image_info i
+              WHERE i.{column} IS NULL {precondition}
+              ON CONFLICT (image_id, stage) DO UPDATE
+                  SET status       = 'pending',
+                      retry_count  = 0,
+                      worker_id    = NULL,
+                      lease_until  = NULL,
+                      last_error   = NULL,
+                      gmt_modified = now()
+              WHERE j.status = 'done'
+              """
+        # SKIP LOCKED使多个工作进程同时领取时互不阻塞，各自拿到不同的任务。
+        # 租约已过期的任务说明原工作进程已崩溃，重新领取时计入一次重试
+        self.sql_template_claim \
+            = text("""
+                   UPDATE dev.tb_image_job j
+                   SET status       = 'running',
+                       worker_id    = :worker_id,
+                       heartbeat    = now(),
+                       lease_until  = now() + make_interval(secs => :lease_seconds),
+                       retry_count  = j.retry_count + CASE WHEN j.status = 'running' THEN 1 ELSE 0 END,
+                       gmt_modified = now()
+                   FROM (SELECT id
+                         FROM dev.tb_image_job
+                         WHERE stage = :stage
+                           AND ((status = 'pending' AND retry_count < :max_retries)
+                             OR (status = 'running' AND lease_until < now() AND retry_count + 1 < :max_retries))
+                         ORDER BY id
+                         LIMIT :limit
+                         FOR UPDATE SKIP LOCKED) c
+                   WHERE j.id = c.id
+                   RETURNING j.id, j.image_id
+                   """)
+
+    def enqueue_missing(self, stage: ImageJobStageEnum) -> int:
+        """ 为该阶段结果为空的图片创建任务，已存在的任务不会重复创建。
+
+        Returns:
+            新建或重新变为待处理的任务数量
+        """
+        sql = self.sql_template_enqueue.format(column=stage.value,
+                                               precondition=ImageJobMapper._STAGE_PRECONDITIONS[stage])
+        result = self.session.execute(text(sql), {"stage": stage.value})
+        self.session.commit()
+        return result.rowcount
+
+    def expire_abandoned(self, max_retries: int) -> int:
+        """ 租约已过期且重试次数已用完的任务标记为失败，不再被领取。"""
+        result = self.session.execute(text("""
+                                           UPDATE dev.tb_image_job
+                                           SET status       = 'failed',
+                                               last_error   = '租约过期次数超过上限',
+                                               gmt_modified = now()
+                                           WHERE status = 'running'
+                                             AND lease_until < now()
+                                             AND retry_count + 1 >= :max_retries
+                                           """), {"max_retries": max_retries})
+        self.session.commit()
+        return result.rowcount
+
+    def delete_orphans(self) -> int:
+        """ 删除图片记录已不存在的任务。"""
+        result = self.session.execute(text("""
+                                           DELETE
+                                           FROM dev.tb_image_job j
+                                           WHERE NOT EXISTS (SELECT 1 FROM dev.tb_image_info i WHERE i.id = j.image_id)
+                                           """))
+        self.session.commit()
+        return result.rowcount
+
+    def claim(self, stage: ImageJobStageEnum, worker_id: str, limit: int, lease_seconds: int,
+              max_retries: int) -> list[tuple[int, int]]:
+        """ 领取一批任务，并在同一事务中写入租约。
+
+        Returns:
+            (任务主键, 图片主键)列表
+        """
+        rows = self.session.execute(self.sql_template_claim, {"stage": stage.value,
+                                                              "worker_id": worker_id,
+                                                              "lease_seconds": lease_seconds,
+                                                              "max_retries": max_retries,
+                                                              "limit": limit}).all()
+        self.session.commit()
+        return [(job_id, image_id) for job_id, image_id in rows]
+
+    def heartbeat(self, worker_id: str, lease_seconds: int) -> int:
+        """ 为该工作进程正在处理的所有任务续约。"""
+        result = self.session.execute(text("""
+                                           UPDATE dev.tb_image_job
+                                           SET heartbeat   = now(),
+                                               lease_until = now() + make_interval(secs => :lease_seconds)
+                                           WHERE worker_id = :worker_id
+                                             AND status = 'running'
+                                           """), {"worker_id": worker_id, "lease_seconds": lease_seconds})
+        self.session.commit()
+        return result.rowcount
+
+    def complete(self, job_ids: list[int], worker_id: str):
+        if not job_ids:
+            return
+        # 只更新仍由该工作进程持有的任务，租约过期后被其他进程领走的任务以对方的结果为准
+        self.session.execute(text("""
+                                  UPDATE dev.tb_image_job
+                                  SET status       = 'done',
+                                      lease_until  = NULL,
+                                      last_error   = NULL,
+                                      gmt_modified = now()
+                                  WHERE id IN :job_ids
+                                    AND worker_id = :worker_id
+                                    AND status = 'running'
+                                  """).bindparams(bindparam("job_ids", expanding=True)),
+                             {"job_ids": job_ids, "worker_id": worker_id})
+        self.session.commit()
+
+    def fail(self, job_ids: list[int], worker_id: str, error: str, max_retries: int):
+        if not job_ids:
+            return
+        self.session.execute(text("""
+                                  UPDATE dev.tb_image_job
+                                  SET status       = CASE WHEN retry_count + 1 >= :max_retries THEN 'failed' ELSE 'pending' END,
+                                      retry_count  = retry_count + 1,
+                                      worker_id    = NULL,
+                                      lease_until  = NULL,
+                                      last_error   = :error,
+                                      gmt_modified = now()
+                                  WHERE id IN :job_ids
+                                    AND worker_id = :worker_id
+                                    AND status = 'running'
+                                  """).bindparams(bindparam("job_ids", expanding=True)),
+                             {"job_ids": job_ids, "worker_id": worker_id, "error": error, "max_retries": max_retries})
+        self.session.commit()
+
+    def release(self, worker_id: str) -> int:
+        """ 工作进程正常退出时归还未完成的任务，不计入重试次数。"""
+        result = self.session.execute(text("""
+                                           UPDATE dev.tb_image_job
+                                           SET status       = 'pending',
+                                               worker_id    = NULL,
+                                               lease_until  = NULL,
+                                               gmt_modified = now()
+                                           WHERE worker_id = :worker_id
+                                             AND status = 'running'
+                                           """), {"worker_id": worker_id})
+        self.session.commit()
+        return result.rowcount
+
+    def reset_failed(self, stage: ImageJobStageEnum) -> int:
+        """ 将失败的任务重新变为待处理，重试次数清零。"""
+        result = self.session.execute(text("""
+                                           UPDATE dev.tb_image_job
+                                           SET status       = 'pending',
+                                               retry_count  = 0,
+                                               worker_id    = NULL,
+                                               lease_until  = NULL,
+                                               gmt_modified = now()
+                                           WHERE stage = :stage
+                                             AND status = 'failed'
+                                           """), {"stage": stage.value})
+        self.session.commit()
+        return result.rowcount
+
+    def count_by_status(self, stage: ImageJobStageEnum) -> dict[str, int]:
+        rows = self.session.execute(text("""
+                                         SELECT status, count(*)
+                                         FROM dev.tb_image_job
+                                         WHERE stage = :stage
+                                         GROUP BY status
+                                         """), {"stage": stage.value}).all()
+        return {status: count for status, count in rows}
@@ -0,0 +1,477 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+sqlite_image_info_mapper.py
+"""
+import re
+from datetime import datetime
+from typing import Iterator
+
+import numpy as np
+
+from src.app.db.mapper.image_info_store import ImageInfoStore
+from src.app.db.models import ImageInfoDO
+from src.app.db.models.image_file_status import ImageFileStatus
+from src.app.db.models.image_info_result import ImageInfoResult
+from src.app.db.models.image_job_do import ImageJobStageEnum
+from src.app.db.models.image_reusable_result import ImageReusableResult
+from src.app.db.sqlite_engine import SqliteEngine, SqliteSession
+
+
+class SqliteImageInfoMapper(ImageInfoStore):
+    """ 嵌入式存储上的图片信息读写，与ImageInfoMapper行为一致。
+    元数据在SQLite中读写，向量列在表中只保存是否不为空，向量本身由SqliteEngine的向量文件保存。
+    向量检索为精确检索：分块读取向量不为空的记录计算余弦相似度，每块用argpartition取出前k个，最后合并排序。
+    """
+    _META_COLUMNS = ("id", "gmt_create", "gmt_modified", "file_gmt_modified", "file_path", "file_name", "file_sha256",
+                     "file_size", "file_mtime", "ocr_text", "tag_text")
+    _DATETIME_COLUMNS = ("gmt_create", "gmt_modified", "file_gmt_modified")
+    _VECTOR_COLUMNS = SqliteEngine.VECTOR_COLUMNS
+    # 按主键或路径批量查询时单条SQL语句包含的最大参数数量
+    _MAX_ROWS_PER_STATEMENT = 500
+    # 检索时每块参与矩阵乘法的行数
+    _BLOCK_ROWS = 16384
+
+    def __init__(self, session: SqliteSession):
+        self.session = session
+        self.engine = session.engine
+
+    def insert_batch(self, image_info_list: list[dict], delete_ids: list[int] | None = None):
+        connection = self.session.connection()
+        now = datetime.now()
+        try:
+            if delete_ids:
+                self.__delete_by_ids(delete_ids)
+            for image_info in image_info_list:
+                row = {"gmt_create": now, "gmt_modified": now}
+                row.update(image_info)
+                vectors = {column: row.pop(column, None) for column in SqliteImageInfoMapper._VECTOR_COLUMNS}
+                SqliteImageInfoMapper.__check_columns(row.keys())
+                for column, vector in vectors.items():
+                    row[f"{column}_valid"] = int(vector is not None)
+                cursor = connection.execute(
+                    f"INSERT INTO tb_image_info ({', '.join(row.keys())}) VALUES ({', '.join('?' * len(row))})",
+                    [SqliteImageInfoMapper.__to_db_value(value) for value in row.values()])
+                for column, vector in vectors.items():
+                    if vector is not None:
+                        self.session.pendingVectors[column][cursor.lastrowid] = np.asarray(vector, dtype=np.float32)
+            self.session.commit()
+        except Exception:
+            # 丢弃本批已执行的语句和暂存的向量，否则会随之后的批次一起提交
+            self.session.rollback()
+            raise
+
+    def delete_batch_by_id(self, ids: list[int]):
+        if not ids:
+            return
+        self.__delete_by_ids(ids)
+        self.session.commit()
+
+    def delete_by_file_path(self, file_path):
+        self.session.connection().execute("DELETE FROM tb_image_info WHERE file_path = ?", (file_path,))
+        self.session.commit()
+
+    def delete_batch_by_file_path(self, file_paths: list[str], sep: str):
+        if not file_paths:
+            return
+        # 比较前缀而不使用LIKE：SQLite的LIKE不区分大小写，且路径中的%、_需要转义
+        self.session.connection().executemany(
+            "DELETE FROM tb_image_info WHERE file_path = ? OR substr(file_path, 1, ?) = ?",
+            [(file_path, len(file_path + sep), file_path + sep) for file_path in file_paths])
+        self.session.commit()
+
+    def move_file_path(self, src_path: str, dest_path: str, sep: str) -> int:
+        connection = self.session.connection()
+        connection.execute("DELETE FROM tb_image_info WHERE file_path = ? OR substr(file_path, 1, ?) = ?",
+                           (dest_path, len(dest_path + sep), dest_path + sep))
+        # SET中的表达式使用更新前的值，目录下的文件只替换路径前缀，文件名不变
+        cursor = connection.execute("""
+                                    UPDATE tb_image_info
+                                    SET file_path    = ? || substr(file_path, ?),
+                                        file_name    = CASE WHEN file_path = ? THEN ? ELSE file_name END,
+                                        gmt_modified = ?
+                                    WHERE file_path = ?
+                                       OR substr(file_path, 1, ?) = ?
+                                    """, (dest_path, len(src_path) + 1, src_path, dest_path.rsplit(sep, 1)[-1],
+                                          SqliteImageInfoMapper.__to_db_value(datetime.now()),
+                                          src_path, len(src_path + sep), src_path + sep))
+        self.session.commit()
+        return cursor.rowcount
+
+    def truncate(self):
+        connection = self.session.connection()
+        connection.execute("DELETE FROM tb_image_info")
+        # 主键重新从1开始，向量文件中的旧数据会被覆盖
+        connection.execute("DELETE FROM sqlite_sequence WHERE name = 'tb_image_info'")
+        self.session.commit()
+
+    def query_count(self) -> int:
+        return self.session.connection().execute("SELECT count(*) FROM tb_image_info").fetchone()[0]
+
+    def scan_columns(self, columns: list[str], not_null_columns: list[str] | None = None,
+                     batch_size: int = 1000) -> Iterator[tuple]:
+        not_null_columns = not_null_columns or []
+        SqliteImageInfoMapper.__check_columns(columns + not_null_columns)
+        expressions = [f"{column}_valid" if column in SqliteImageInfoMapper._VECTOR_COLUMNS else column for column in columns]
+        expressions += [f"{column}_valid = 1" if column in SqliteImageInfoMapper._VECTOR_COLUMNS else f"{column} IS NOT NULL"
+                        for column in not_null_columns]
+        cursor = self.session.connection().execute(f"SELECT id, {', '.join(expressions)} FROM tb_image_info ORDER BY id")
+        while rows := cursor.fetchmany(batch_size):
+            ids = np.array([row[0] for row in rows], dtype=np.int64)
+            column_values = []
+            for i, column in enumerate(columns):
+                values = [row[i + 1] for row in rows]
+                if column in SqliteImageInfoMapper._VECTOR_COLUMNS:
+                    values = self.__read_vectors(column, ids, values)
+                else:
+                    values = [SqliteImageInfoMapper.__from_db_value(column, value) for value in values]
+                column_values.append(values)
+            for i, row in enumerate(rows):
+                yield (tuple(values[i] for values in column_values)
+                       + tuple(bool(flag) for flag in row[len(columns) + 1:]))
+
+    def query_by_stage_batch(self, stage: ImageJobStageEnum, id: int, batch_size: int = 100, pending_only: bool = True):
+        columns = ["id", "file_path", "file_sha256"]
+        conditions = ["id > ?"]
+        if stage == ImageJobStageEnum.ALL_TEXT_VECTOR:
+            # 文本特征向量依赖OCR文本
+            columns += ["ocr_text", "tag_text"]
+            conditions.append("ocr_text IS NOT NULL")
+        if pending_only:
+            if stage.value in SqliteImageInfoMapper._VECTOR_COLUMNS:
+                conditions.append(f"{stage.value}_valid = 0")
+            else:
+                conditions.append(f"{stage.value} IS NULL")
+        rows = self.session.connection().execute(f"SELECT {', '.join(columns)} FROM tb_image_info "
+                                                 f"WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+                                                 (id, batch_size)).fetchall()
+        return [ImageInfoDO(**dict(zip(columns, row))) for row in rows]
+
+    def query_by_id_list(self, ids: list[int]) -> list[ImageInfoDO]:
+        result = []
+        for i in range(0, len(ids), SqliteImageInfoMapper._MAX_ROWS_PER_STATEMENT):
+            chunk = ids[i:i + SqliteImageInfoMapper._MAX_ROWS_PER_STATEMENT]
+            result.extend(self.__query_image_info_do_list(f"id IN ({', '.join('?' * len(chunk))})", chunk))
+        return result
+
+    def query_max_gmt_modified(self) -> datetime | None:
+        value = self.session.connection().execute("SELECT max(gmt_modified) FROM tb_image_info").fetchone()[0]
+        return SqliteImageInfoMapper.__from_db_value("gmt_modified", value)
+
+    def query_file_status_dict(self, path_prefix: str | None = None,
+                               file_paths: list[str] | None = None) -> dict[str, ImageFileStatus]:
+        sql = """
+              SELECT file_path,
+                     id,
+                     file_sha256,
+                     file_size,
+                     file_mtime,
+                     tag_text,
+                     image_vector_valid,
+                     ocr_text IS NOT NULL,
+                     all_text_vector_valid
+              FROM tb_image_info
+              WHERE 1 = 1
+              """
+        params = []
+        if path_prefix is not None:
+            sql += " AND substr(file_path, 1, ?) = ?"
+            params += [len(path_prefix), path_prefix]
+        connection = self.session.connection()
+        if file_paths is None:
+            rows = connection.execute(sql, params).fetchall()
+        else:
+            rows = []
+            for i in range(0, len(file_paths), SqliteImageInfoMapper._MAX_ROWS_PER_STATEMENT):
+                chunk = file_paths[i:i + SqliteImageInfoMapper._MAX_ROWS_PER_STATEMENT]
+                rows.extend(connection.execute(sql + f" AND file_path IN ({', '.join('?' * len(chunk))})",
+                                               params + chunk).fetchall())
+        return {file_path: ImageFileStatus(id, file_sha256, file_size, file_mtime, tag_text,
+                                           bool(has_image_vector), bool(has_ocr_text), bool(has_all_text_vector))
+                for file_path, id, file_sha256, file_size, file_mtime, tag_text,
+                has_image_vector, has_ocr_text, has_all_text_vector in rows}
+
+    def query_by_file_sha256(self, file_sha256) -> ImageInfoDO | None:
+        result = self.__query_image_info_do_list("file_sha256 = ?", [file_sha256], limit=1)
+        return result[0] if result else None
+
+    def query_by_file_path(self, file_path) -> ImageInfoDO | None:
+        result = self.__query_image_info_do_list("file_path = ?", [file_path], limit=1)
+        return result[0] if result else None
+
+    def query_vectors(self, id: int | None = None, file_sha256: str | None = None) -> tuple | None:
+        if id is None and file_sha256 is None:
+            raise ValueError("id和file_sha256至少指定一个")
+        sql = "SELECT id FROM tb_image_info WHERE image_vector_valid = 1 AND all_text_vector_valid = 1"
+        params = []
+        if id is not None:
+            sql += " AND id = ?"
+            params.append(id)
+        if file_sha256 is not None:
+            sql += " AND file_sha256 = ?"
+            params.append(file_sha256)
+        row = self.session.connection().execute(sql + " ORDER BY id LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        ids = np.array([row[0]], dtype=np.int64)
+        return tuple(self.engine.vectorFiles[column].read(ids)[0] for column in SqliteImageInfoMapper._VECTOR_COLUMNS)
+
+    def query_reusable_by_file_sha256_list(self, file_sha256_list: list[str]) -> dict[str, ImageReusableResult]:
+        result = {}
+        file_sha256_list = list(set(file_sha256_list))
+        for i in range(0, len(file_sha256_list), SqliteImageInfoMapper._MAX_ROWS_PER_STATEMENT):
+            chunk = file_sha256_list[i:i + SqliteImageInfoMapper._MAX_ROWS_PER_STATEMENT]
+            # 排序方式与ImageInfoMapper相同，每个sha256取结果最完整的一条记录
+            rows = self.session.connection().execute(f"""
+                                                     SELECT file_sha256,
+                                                            id,
+                                                            image_vector_valid,
+                                                            ocr_text,
+                                                            all_text_vector_valid = 1 AND COALESCE(tag_text, '') = ''
+                                                     FROM (SELECT *,
+                                                                  row_number() OVER (
+                                                                      PARTITION BY file_sha256
+                                                                      ORDER BY image_vector_valid DESC,
+                                                                          ocr_text IS NULL,
+                                                                          all_text_vector_valid = 0 OR COALESCE(tag_text, '') != '',
+                                                                          id) AS row_number
+                                                           FROM tb_image_info
+                                                           WHERE file_sha256 IN ({', '.join('?' * len(chunk))})
+                                                             AND (image_vector_valid = 1 OR ocr_text IS NOT NULL))
+                                                     WHERE row_number = 1
+                                                     """, chunk).fetchall()
+            ids = np.array([row[1] for row in rows], dtype=np.int64)
+            image_vectors = self.__read_vectors("image_vector", ids, [row[2] for row in rows])
+            all_text_vectors = self.__read_vectors("all_text_vector", ids, [row[4] for row in rows])
+            for row, image_vector, all_text_vector in zip(rows, image_vectors, all_text_vectors):
+                result[row[0]] = ImageReusableResult(image_vector, row[3], all_text_vector)
+        return result
+
+    def copy_by_file_sha256(self, column: str, ids: list[int] | None = None) -> int:
+        if ids is not None and not ids:
+            return 0
+        if column == "all_text_vector":
+            # 文本特征向量只在来源和目标记录都没有人工标签、且OCR文本相同时复制
+            donor_filter = "d.all_text_vector_valid = 1 AND COALESCE(d.tag_text, '') = '' AND d.ocr_text = t.ocr_text"
+            target_filter = "t.all_text_vector_valid = 0 AND COALESCE(t.tag_text, '') = ''"
+        elif column == "image_vector":
+            donor_filter = "d.image_vector_valid = 1"
+            target_filter = "t.image_vector_valid = 0"
+        elif column == "ocr_text":
+            donor_filter = "d.ocr_text IS NOT NULL"
+            target_filter = "t.ocr_text IS NULL"
+        else:
+            raise ValueError(f"不支持复制的列：{column}")
+        sql = f"""
+               SELECT t.id,
+                      (SELECT d.id FROM tb_image_info d WHERE d.file_sha256 = t.file_sha256 AND {donor_filter} ORDER BY d.id LIMIT 1)
+               FROM tb_image_info t
+               WHERE {target_filter}
+               """
+        connection = self.session.connection()
+        if ids is None:
+            rows = connection.execute(sql).fetchall()
+        else:
+            rows = []
+            for i in range(0, len(ids), SqliteImageInfoMapper._MAX_ROWS_PER_STATEMENT):
+                chunk = ids[i:i + SqliteImageInfoMapper._MAX_ROWS_PER_STATEMENT]
+                rows.extend(connection.execute(sql + f" AND t.id IN ({', '.join('?' * len(chunk))})", chunk).fetchall())
+        id_pairs = [(target_id, donor_id) for target_id, donor_id in rows if donor_id is not None]
+        if not id_pairs:
+            return 0
+        if column == "ocr_text":
+            connection.executemany("UPDATE tb_image_info SET ocr_text = (SELECT ocr_text FROM tb_image_info WHERE id = ?) WHERE id = ?",
+                                   [(donor_id, target_id) for target_id, donor_id in id_pairs])
+        else:
+            vectors = self.engine.vectorFiles[column].read(np.array([donor_id for _, donor_id in id_pairs], dtype=np.int64))
+            for (target_id, _), vector in zip(id_pairs, vectors):
+                self.session.pendingVectors[column][target_id] = vector
+            connection.executemany(f"UPDATE tb_image_info SET {column}_valid = 1 WHERE id = ?",
+                                   [(target_id,) for target_id, _ in id_pairs])
+        self.session.commit()
+        return len(id_pairs)
+
+    def update_tag_text_by_file_path(self, file_path, tag_text):
+        self.__update_by_file_path(file_path, "tag_text", tag_text)
+
+    def update_image_vector_by_file_path(self, file_path, image_vector):
+        self.__update_by_file_path(file_path, "image_vector", image_vector)
+
+    def update_all_text_vector_by_file_path(self, file_path, all_text_vector):
+        self.__update_by_file_path(file_path, "all_text_vector", all_text_vector)
+
+    def update_batch_by_id(self, id_values_list: list[tuple[int, dict]]):
+        if not id_values_list:
+            return
+        columns = list(id_values_list[0][1].keys())
+        SqliteImageInfoMapper.__check_columns(columns)
+        set_sql = ", ".join(f"{column}_valid = ?" if column in SqliteImageInfoMapper._VECTOR_COLUMNS else f"{column} = ?"
+                            for column in columns) + ", gmt_modified = ?"
+        now = SqliteImageInfoMapper.__to_db_value(datetime.now())
+        params_list = []
+        for id, values in id_values_list:
+            params = []
+            for column in columns:
+                value = values[column]
+                if column in SqliteImageInfoMapper._VECTOR_COLUMNS:
+                    if value is not None:
+                        self.session.pendingVectors[column][id] = np.asarray(value, dtype=np.float32)
+                    params.append(int(value is not None))
+                else:
+                    params.append(SqliteImageInfoMapper.__to_db_value(value))
+            params_list.append(params + [now, id])
+        try:
+            self.session.connection().executemany(f"UPDATE tb_image_info SET {set_sql} WHERE id = ?", params_list)
+            self.session.commit()
+        except Exception:
+            # 同insert_batch
+            self.session.rollback()
+            raise
+
+    def search_by_image_vector(self, image_vector, cosine_similarity: float | None, limit: int,
+                               ef_search: int | None = None, probes: int | None = None) -> list[ImageInfoResult]:
+        return self.__search_by_vector("image_vector", image_vector, cosine_similarity, limit)
+
+    def search_by_all_text_vector(self, text_vector, cosine_similarity: float | None, limit: int,
+                                  ef_search: int | None = None, probes: int | None = None) -> list[ImageInfoResult]:
+        return self.__search_by_vector("all_text_vector", text_vector, cosine_similarity, limit)
+
+    def search_by_ocr_text(self, search_text: str, limit: int) -> list[ImageInfoResult]:
+        """ 按OCR文本检索。SQLite没有中文分词，连续的中文按相邻两个字切分为检索词，
+        包含任意一个检索词的记录都会命中，按命中的检索词数量降序排列，英文不区分大小写。
+        """
+        terms = []
+        for word in re.findall(r"[\u4e00-\u9fff]+|\w+", search_text.lower()):
+            if re.match(r"[\u4e00-\u9fff]", word) and len(word) > 1:
+                terms += [word[i:i + 2] for i in range(len(word) - 1)]
+            else:
+                terms.append(word)
+        terms = list(dict.fromkeys(terms))
+        if not terms:
+            return []
+        match_count_sql = " + ".join(["(instr(lower(ocr_text), ?) > 0)"] * len(terms))
+        rows = self.session.connection().execute(f"""
+                                                 SELECT id, file_path, file_name, file_sha256
+                                                 FROM (SELECT *, {match_count_sql} AS match_count
+                                                       FROM tb_image_info
+                                                       WHERE ocr_text IS NOT NULL)
+                                                 WHERE match_count > 0
+                                                 ORDER BY match_count DESC, id
+                                                 LIMIT ?
+                                                 """, terms + [limit]).fetchall()
+        return [ImageInfoResult(id=id, file_path=file_path, file_name=file_name, file_sha256=file_sha256)
+                for id, file_path, file_name, file_sha256 in rows]
+
+    def search_by_image_and_all_text_vector(self, image_vector, text_vector, cosine_similarity: float | None, limit: int,
+                                            ef_search: int | None = None, probes: int | None = None):
+        return (self.__search_by_vector("image_vector", image_vector, cosine_similarity, limit),
+                self.__search_by_vector("all_text_vector", text_vector, cosine_similarity, limit))
+
+    def __search_by_vector(self, column: str, vector, cosine_similarity: float | None, limit: int) -> list[ImageInfoResult]:
+        """ 按余弦距离精确检索最相似的记录。ef_search、probes只用于近似索引，这里忽略。"""
+        ids = self.engine.query_valid_ids(column)
+        vector_file = self.engine.vectorFiles[column]
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        candidate_ids = []
+        candidate_scores = []
+        for start in range(0, len(ids), SqliteImageInfoMapper._BLOCK_ROWS):
+            block_ids = ids[start:start + SqliteImageInfoMapper._BLOCK_ROWS]
+            matrix = vector_file.read(block_ids)
+            norms = np.linalg.norm(matrix, axis=1)
+            norms[norms == 0] = 1
+            scores = matrix @ query / norms
+            if len(scores) > limit:
+                rows = np.argpartition(-scores, limit - 1)[:limit]
+            else:
+                rows = np.arange(len(scores))
+            candidate_ids.append(block_ids[rows])
+            candidate_scores.append(scores[rows])
+        if not candidate_ids:
+            return []
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        order = np.argsort(-scores, kind="stable")[:limit]
+        id_distance_list = []
+        for id, score in zip(ids[order], scores[order]):
+            cosine_distance = float(1 - score)
+            if cosine_similarity is not None and cosine_distance >= 1 - cosine_similarity:
+                break
+            id_distance_list.append((int(id), cosine_distance))
+        if not id_distance_list:
+            return []
+        rows = self.session.connection().execute(
+            f"SELECT id, file_path, file_name, file_sha256 FROM tb_image_info WHERE id IN ({', '.join('?' * len(id_distance_list))})",
+            [id for id, _ in id_distance_list]).fetchall()
+        row_dict = {row[0]: row for row in rows}
+        # 检索期间被删除的记录不返回
+        return [ImageInfoResult(id=id, file_path=row_dict[id][1], file_name=row_dict[id][2], file_sha256=row_dict[id][3],
+                                cosine_distance=cosine_distance)
+                for id, cosine_distance in id_distance_list if id in row_dict]
+
+    def __query_image_info_do_list(self, where_sql: str, params: list, limit: int | None = None) -> list[ImageInfoDO]:
+        columns = SqliteImageInfoMapper._META_COLUMNS
+        valid_columns = [f"{column}_valid" for column in SqliteImageInfoMapper._VECTOR_COLUMNS]
+        sql = f"SELECT {', '.join(columns + tuple(valid_columns))} FROM tb_image_info WHERE {where_sql} ORDER BY id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        rows = self.session.connection().execute(sql, params).fetchall()
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        vectors = {column: self.__read_vectors(column, ids, [row[len(columns) + i] for row in rows])
+                   for i, column in enumerate(SqliteImageInfoMapper._VECTOR_COLUMNS)}
+        result = []
+        for i, row in enumerate(rows):
+            values = {column: SqliteImageInfoMapper.__from_db_value(column, value) for column, value in zip(columns, row)}
+            for column in SqliteImageInfoMapper._VECTOR_COLUMNS:
+                values[column] = vectors[column][i]
+            result.append(ImageInfoDO(**values))
+        return result
+
+    def __read_vectors(self, column: str, ids: np.ndarray, valids: list) -> list[np.ndarray | None]:
+        """ 读取向量不为空的记录的向量，其余记录返回None。"""
+        result: list[np.ndarray | None] = [None] * len(ids)
+        valid_rows = [i for i, valid in enumerate(valids) if valid]
+        if valid_rows:
+            vectors = self.engine.vectorFiles[column].read(ids[valid_rows])
+            for i, vector in zip(valid_rows, vectors):
+                result[i] = vector
+        return result
+
+    def __update_by_file_path(self, file_path, column: str, value):
+        connection = self.session.connection()
+        now = SqliteImageInfoMapper.__to_db_value(datetime.now())
+        if column in SqliteImageInfoMapper._VECTOR_COLUMNS:
+            if value is not None:
+                for (id,) in connection.execute("SELECT id FROM tb_image_info WHERE file_path = ?", (file_path,)).fetchall():
+                    self.session.pendingVectors[column][id] = np.asarray(value, dtype=np.float32)
+            connection.execute(f"UPDATE tb_image_info SET {column}_valid = ?, gmt_modified = ? WHERE file_path = ?",
+                               (int(value is not None), now, file_path))
+        else:
+            connection.execute(f"UPDATE tb_image_info SET {column} = ?, gmt_modified = ? WHERE file_path = ?",
+                               (value, now, file_path))
+        self.session.commit()
+
+    def __delete_by_ids(self, ids: list[int]):
+        connection = self.session.connection()
+        for i in range(0, len(ids), SqliteImageInfoMapper._MAX_ROWS_PER_STATEMENT):
+            chunk = ids[i:i + SqliteImageInfoMapper._MAX_ROWS_PER_STATEMENT]
+            connection.execute(f"DELETE FROM tb_image_info WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+
+    @staticmethod
+    def __check_columns(columns):
+        for column in columns:
+            if column not in SqliteImageInfoMapper._META_COLUMNS and column not in SqliteImageInfoMapper._VECTOR_COLUMNS:
+                raise ValueError(f"不支持的列：{column}")
+
+    @staticmethod
+    def __to_db_value(value):
+        if isinstance(value, datetime):
+            return value.isoformat(sep=" ")
+        return value
+
+    @staticmethod
+    def __from_db_value(column: str, value):
+        if value is not None and column in SqliteImageInfoMapper._DATETIME_COLUMNS:
+            return datetime.fromisoformat(value)
+        return value
@@ -0,0 +1,121 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+vector_index_mapper.py
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.app.db.models.vector_storage_mode_enum import VectorStorageModeEnum
+
+
+class VectorIndexMapper:
+    """ 向量列上HNSW、IVFFlat索引的建立、重建、删除和统计。
+    CREATE/DROP/REINDEX ... CONCURRENTLY不能在事务中执行，session需要绑定AUTOCOMMIT隔离级别的引擎。
+    """
+    VECTOR_COLUMNS = ("image_vector", "all_text_vector")
+    INDEX_METHODS = ("hnsw", "ivfflat")
+    # 索引表达式必须与ImageInfoMapper中检索SQL的ORDER BY表达式一致，否则检索时无法使用索引
+    _INDEX_EXPRESSIONS = {
+        VectorStorageModeEnum.FULL: "{column}",
+        VectorStorageModeEnum.HALFVEC: "({column}::halfvec({dim}))",
+        VectorStorageModeEnum.BINARY: "(binary_quantize({column})::bit({dim}))",
+    }
+    _OPERATOR_CLASSES = {
+        VectorStorageModeEnum.FULL: "vector_cosine_ops",
+        VectorStorageModeEnum.HALFVEC: "halfvec_cosine_ops",
+        VectorStorageModeEnum.BINARY: "bit_hamming_ops",
+    }
+    _VECTOR_DIM = 1024
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    @staticmethod
+    def get_index_name(column: str, mode: VectorStorageModeEnum, method: str) -> str:
+        if mode == VectorStorageModeEnum.FULL:
+            return f"tb_image_info_{column}_{method}_index"
+        return f"tb_image_info_{column}_{mode.value}_{method}_index"
+
+    def create_index(self, column: str, mode: VectorStorageModeEnum, method: str, with_params: dict[str, int],
+                     maintenance_work_mem: str | None = None, parallel_workers: int | None = None) -> str:
+        """ 建立向量索引，建立期间不阻塞读写。同名索引已存在时跳过。
+
+        Args:
+            column: 向量列名
+            mode: 向量索引的精度
+            method: hnsw或ivfflat
+            with_params: 索引参数，hnsw为m、ef_construction，ivfflat为lists
+            maintenance_work_mem: 建立索引时可使用的内存，例如"2GB"，索引图能完整放入内存时建立速度快很多
+            parallel_workers: 建立索引的并行进程数
+
+        Returns:
+            索引名
+        """
+        VectorIndexMapper.__check(column, method)
+        index_name = VectorIndexMapper.get_index_name(column, mode, method)
+        expression = VectorIndexMapper._INDEX_EXPRESSIONS[mode].format(column=column, dim=VectorIndexMapper._VECTOR_DIM)
+        with_sql = ", ".join(f"{key} = {int(value)}" for key, value in with_params.items())
+        self.__set_maintenance_options(maintenance_work_mem, parallel_workers)
+        self.session.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                                  f"ON dev.tb_image_info USING {method} ({expression} {VectorIndexMapper._OPERATOR_CLASSES[mode]})"
+                                  + (f" WITH ({with_sql})" if with_sql else "")))
+        return index_name
+
+    def rebuild_index(self, index_name: str, maintenance_work_mem: str | None = None, parallel_workers: int | None = None):
+        """ 重建索引，用于大量写入或删除后恢复索引质量。IVFFlat的聚类中心只在建立时计算，数据分布变化后需要重建。"""
+        self.__set_maintenance_options(maintenance_work_mem, parallel_workers)
+        self.session.execute(text(f"REINDEX INDEX CONCURRENTLY dev.{VectorIndexMapper.__quote_name(index_name)}"))
+
+    def drop_index(self, index_name: str):
+        self.session.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS dev.{VectorIndexMapper.__quote_name(index_name)}"))
+
+    def query_vector_indexes(self) -> list[dict]:
+        """ 查询表上所有HNSW、IVFFlat索引的名称、定义、大小和是否可用。"""
+        rows = self.session.execute(text("""
+                                         SELECT c.relname                          AS index_name,
+                                                am.amname                          AS method,
+                                                pg_get_indexdef(c.oid)             AS index_def,
+                                                pg_relation_size(c.oid)            AS index_size,
+                                                i.indisvalid                       AS is_valid,
+                                                COALESCE(pg_stat_get_numscans(c.oid), 0) AS scan_count
+                                         FROM pg_index i
+                                                  JOIN pg_class c ON c.oid = i.indexrelid
+                                                  JOIN pg_am am ON am.oid = c.relam
+                                         WHERE i.indrelid = 'dev.tb_image_info'::regclass
+                                           AND am.amname IN ('hnsw', 'ivfflat')
+                                         ORDER BY c.relname
+                                         """)).mappings().all()
+        return [dict(row) for row in rows]
+
+    def query_table_stats(self) -> dict:
+        """ 查询pgvector版本、表大小以及各向量列不为空的行数。"""
+        row = self.session.execute(text("""
+                                        SELECT (SELECT extversion FROM pg_extension WHERE extname = 'vector') AS vector_version,
+                                               pg_total_relation_size('dev.tb_image_info'::regclass)         AS table_size,
+                                               count(*)                                                      AS row_count,
+                                               count(image_vector)                                           AS image_vector_count,
+                                               count(all_text_vector)                                        AS all_text_vector_count
+                                        FROM dev.tb_image_info
+                                        """)).mappings().one()
+        return dict(row)
+
+    def __set_maintenance_options(self, maintenance_work_mem: str | None, parallel_workers: int | None):
+        if maintenance_work_mem:
+            self.session.execute(text("SELECT set_config('maintenance_work_mem', :value, false)"),
+                                 {"value": maintenance_work_mem})
+        if parallel_workers is not None:
+            self.session.execute(text("SELECT set_config('max_parallel_maintenance_workers', :value, false)"),
+                                 {"value": str(parallel_workers)})
+
+    @staticmethod
+    def __check(column: str, method: str):
+        if column not in VectorIndexMapper.VECTOR_COLUMNS:
+            raise ValueError(f"不支持的向量列：{column}")
+        if method not in VectorIndexMapper.INDEX_METHODS:
+            raise ValueError(f"不支持的索引类型：{method}")
+
+    @staticmethod
+    def __quote_name(index_name: str) -> str:
+        return '"' + index_name.replace('"', '""') + '"'
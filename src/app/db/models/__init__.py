@@ -11,5 +11,6 @@ from ...log.logger import logger
 Base = declarative_base()
 
 from .image_info_do import ImageInfoDO
+from .image_job_do import ImageJobDO
 
 logger.info("载入数据库模块...")
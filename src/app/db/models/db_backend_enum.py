@@ -0,0 +1,15 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+db_backend_enum.py
+"""
+from enum import Enum
+
+
+class DBBackendEnum(Enum):
+    """ 图片信息的存储后端，通过.env中的DB_BACKEND配置。"""
+    # PostgreSQL + pgvector
+    POSTGRES = "postgres"
+    # 嵌入式存储：SQLite文件保存元数据，numpy内存映射文件保存向量，无需部署数据库
+    SQLITE = "sqlite"
@@ -0,0 +1,25 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+image_file_status.py
+"""
+
+
+class ImageFileStatus:
+
+    def __init__(self, id: int, file_sha256: str, file_size: int | None, file_mtime: float | None, tag_text: str | None,
+                 has_image_vector: bool, has_ocr_text: bool, has_all_text_vector: bool):
+        self.id: int = id
+        self.fileSha256: str = file_sha256
+        self.fileSize: int | None = file_size
+        self.fileMtime: float | None = file_mtime
+        self.tagText: str | None = tag_text
+        self.hasImageVector: bool = has_image_vector
+        self.hasOcrText: bool = has_ocr_text
+        self.hasAllTextVector: bool = has_all_text_vector
+        # 图片向量、OCR文本、文本向量是否均已生成
+        self.isComplete: bool = has_image_vector and has_ocr_text and has_all_text_vector
+
+    def is_same_file(self, file_size: int, file_mtime: float) -> bool:
+        return self.fileSize == file_size and self.fileMtime == file_mtime
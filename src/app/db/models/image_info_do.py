@@ -5,9 +5,10 @@ For full terms, see the LICENSE file.
 image_info_do.py
 """
 
-from sqlalchemy import Column, BigInteger, TIMESTAMP, String
+from sqlalchemy import Column, BigInteger, TIMESTAMP, String, Float
 
 from src.app.db.models import Base
+from src.app.db.models.vector_type import VectorType
 
 
 class ImageInfoDO(Base):
@@ -22,9 +23,13 @@ class ImageInfoDO(Base):
     file_path = Column(String)
     file_name = Column(String)
     file_sha256 = Column(String)
+    # 文件大小（字节）和文件系统中的修改时间（时间戳），用于增量同步时判断文件是否变化
+    file_size = Column(BigInteger)
+    file_mtime = Column(Float)
 
     ocr_text = Column(String)
     tag_text = Column(String)
 
-    image_vector = Column(String)
-    all_text_vector = Column(String)
+    # 读出为numpy数组，写入时接受numpy数组或列表
+    image_vector = Column(VectorType(1024))
+    all_text_vector = Column(VectorType(1024))
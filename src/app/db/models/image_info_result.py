@@ -19,6 +19,8 @@ class ImageInfoResult(Base):
     file_path = None
     file_name = None
     file_sha256 = None
+    file_size = None
+    file_mtime = None
 
     ocr_text = None
     tag_text = None
@@ -0,0 +1,45 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+image_job_do.py
+"""
+from enum import Enum
+
+from sqlalchemy import Column, BigInteger, TIMESTAMP, String, Integer
+
+from src.app.db.models import Base
+
+
+class ImageJobDO(Base):
+    """ 图片处理任务。每张图片的每个处理阶段对应一条任务，多个工作进程通过租约领取任务。"""
+    __tablename__ = 'tb_image_job'
+    __table_args__ = {'schema': 'dev'}
+
+    id = Column(BigInteger, primary_key=True)
+    gmt_create = Column(TIMESTAMP)
+    gmt_modified = Column(TIMESTAMP)
+
+    image_id = Column(BigInteger)
+    stage = Column(String)
+    status = Column(String)
+    # 领取任务的工作进程，租约到期前该进程需要持续续约，否则任务可以被其他进程重新领取
+    worker_id = Column(String)
+    lease_until = Column(TIMESTAMP)
+    heartbeat = Column(TIMESTAMP)
+    retry_count = Column(Integer)
+    last_error = Column(String)
+
+
+class ImageJobStageEnum(Enum):
+    """ 处理阶段，值与tb_image_info中该阶段生成的列名一致。"""
+    IMAGE_VECTOR = "image_vector"
+    OCR_TEXT = "ocr_text"
+    ALL_TEXT_VECTOR = "all_text_vector"
+
+
+class ImageJobStatusEnum(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
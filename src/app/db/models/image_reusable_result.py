@@ -0,0 +1,16 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+image_reusable_result.py
+"""
+
+
+class ImageReusableResult:
+    """ 与某个文件内容（sha256）相同的已有记录中，可以直接复用的模型结果。"""
+
+    def __init__(self, image_vector, ocr_text: str | None, all_text_vector):
+        self.imageVector = image_vector
+        self.ocrText: str | None = ocr_text
+        # 只有来源记录没有人工标签时才可复用，否则文本特征向量中包含了来源记录的标签
+        self.allTextVector = all_text_vector
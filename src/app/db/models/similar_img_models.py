@@ -8,8 +8,11 @@ similar_img_models.py
 
 class SimilarImgModel:
 
-    def __init__(self, file_path: str, file_name: str, cosine_distance: float, file_sha256: str):
+    def __init__(self, file_path: str, file_name: str, cosine_distance: float | None, file_sha256: str, score: float | None = None):
         self.filePath: str = file_path
         self.fileName: str = file_name
-        self.cosineDistance: float = cosine_distance
+        # 只由全文检索命中的结果没有余弦距离
+        self.cosineDistance: float | None = cosine_distance
         self.fileSha256: str = file_sha256
+        # 混合检索的融合得分，越大越相似
+        self.score: float | None = score
@@ -0,0 +1,19 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+vector_storage_mode_enum.py
+"""
+from enum import Enum
+
+
+class VectorStorageModeEnum(Enum):
+    """ 向量检索时第一轮近似检索使用的索引精度，通过.env中的VECTOR_STORAGE_MODE配置。
+    表中始终保存全精度向量，halfvec、binary模式只在索引中保存低精度的副本，候选结果再用全精度向量重排。
+    """
+    # 直接使用全精度vector索引
+    FULL = "full"
+    # 半精度halfvec表达式索引，索引大小约为全精度的一半
+    HALFVEC = "halfvec"
+    # binary_quantize二值化表达式索引，索引大小约为全精度的1/32，需要取更多候选结果重排
+    BINARY = "binary"
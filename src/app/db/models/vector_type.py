@@ -0,0 +1,57 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+vector_type.py
+"""
+import numpy as np
+from pgvector import Vector
+from sqlalchemy import Float
+from sqlalchemy.types import UserDefinedType, TypeEngine
+
+
+class VectorType(UserDefinedType):
+    """ pgvector的vector列。写入时以numpy数组交给psycopg，由pgvector注册的适配器按二进制格式传输；
+    读出时转换为numpy数组。两个方向都不做浮点数与字符串之间的转换。
+    """
+    cache_ok = True
+
+    def __init__(self, dim: int | None = None):
+        super().__init__()
+        self.dim = dim
+
+    def get_col_spec(self, **kw):
+        if self.dim is None:
+            return "VECTOR"
+        return f"VECTOR({self.dim})"
+
+    def bind_processor(self, dialect):
+        return VectorType.to_db
+
+    def result_processor(self, dialect, coltype):
+        return VectorType.to_numpy
+
+    @staticmethod
+    def to_db(value) -> np.ndarray | None:
+        """ 转换为float32的numpy数组，作为SQL参数使用。"""
+        if value is None:
+            return None
+        if isinstance(value, (Vector, str)):
+            return VectorType.to_numpy(value)
+        return np.asarray(value, dtype=np.float32)
+
+    @staticmethod
+    def to_numpy(value) -> np.ndarray | None:
+        """ 将从数据库中读出的值转换为numpy数组。"""
+        if value is None:
+            return None
+        if isinstance(value, Vector):
+            return value.to_numpy()
+        # 连接未注册pgvector适配器时读出的是文本
+        if isinstance(value, str):
+            return Vector.from_text(value).to_numpy()
+        return np.asarray(value, dtype=np.float32)
+
+    class comparator_factory(TypeEngine.Comparator):
+        def cosine_distance(self, other):
+            return self.op("<=>", return_type=Float)(other)
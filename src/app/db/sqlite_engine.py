@@ -0,0 +1,180 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+sqlite_engine.py
+"""
+import os
+import sqlite3
+from functools import partial
+from threading import Lock
+
+import numpy as np
+
+from src.app.log.logger import logger
+
+
+class SqliteEngine:
+    """ 嵌入式存储，DB_BACKEND=sqlite时使用，无需部署数据库。存储是一个目录：
+    - image_info.db：SQLite文件，保存图片元数据，以及每个向量列是否不为空（{列名}_valid）；
+    - {列名}_{分段号}.f32：float32向量矩阵的分段，主键为id的记录的向量位于第id行，以内存映射方式读写。
+
+    已删除记录的向量行不再被读取，主键重新从1开始（清空图库）后被覆盖。写入向量时先写入向量文件，再提交元数据的事务，
+    中途崩溃时元数据中的向量仍为空，会被重新计算。
+    """
+    VECTOR_COLUMNS = ("image_vector", "all_text_vector")
+    VECTOR_DIM = 1024
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dbPath = os.path.join(path, "image_info.db")
+        self.vectorFiles = {column: _VectorFile(os.path.join(path, column), SqliteEngine.VECTOR_DIM)
+                            for column in SqliteEngine.VECTOR_COLUMNS}
+        with self.connect() as connection:
+            # WAL模式下读不阻塞写，检索和入库可以同时进行
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript("""
+                                     CREATE TABLE IF NOT EXISTS tb_image_info
+                                     (
+                                         id                    INTEGER PRIMARY KEY AUTOINCREMENT,
+                                         gmt_create            TEXT,
+                                         gmt_modified          TEXT,
+                                         file_gmt_modified     TEXT,
+                                         file_path             TEXT,
+                                         file_name             TEXT,
+                                         file_sha256           TEXT,
+                                         file_size             INTEGER,
+                                         file_mtime            REAL,
+                                         ocr_text              TEXT,
+                                         tag_text              TEXT,
+                                         image_vector_valid    INTEGER NOT NULL DEFAULT 0,
+                                         all_text_vector_valid INTEGER NOT NULL DEFAULT 0
+                                     );
+                                     CREATE INDEX IF NOT EXISTS tb_image_info_file_path_index ON tb_image_info (file_path);
+                                     CREATE INDEX IF NOT EXISTS tb_image_info_file_sha256_index ON tb_image_info (file_sha256);
+                                     """)
+        # 检索时使用的向量不为空的主键列表，其他连接提交写入后重新读取
+        self.lock = Lock()
+        self.monitorConnection = self.connect()
+        self.dataVersion: int | None = None
+        self.validIds: dict[str, np.ndarray] = {}
+        self.Session = partial(SqliteSession, self)
+        logger.info(f"使用嵌入式存储：{path}")
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.dbPath, timeout=30, check_same_thread=False)
+
+    def query_valid_ids(self, column: str) -> np.ndarray:
+        """ 查询向量不为空的记录主键，按主键升序排列。"""
+        with self.lock:
+            # data_version在其他连接提交写入后变化，本连接只读，因此任何写入都会使其变化
+            data_version = self.monitorConnection.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self.dataVersion:
+                for vector_column in SqliteEngine.VECTOR_COLUMNS:
+                    rows = self.monitorConnection.execute(
+                        f"SELECT id FROM tb_image_info WHERE {vector_column}_valid = 1 ORDER BY id").fetchall()
+                    self.validIds[vector_column] = np.array([row[0] for row in rows], dtype=np.int64)
+                self.dataVersion = data_version
+            return self.validIds[column]
+
+
+class SqliteSession:
+    """ SQLite后端的会话，用法与SQLAlchemy的Session相同，支持with语句、commit和rollback。
+    本会话写入的向量暂存在内存中，commit时先写入向量文件再提交元数据，rollback时丢弃。
+    """
+
+    def __init__(self, engine: SqliteEngine):
+        self.engine = engine
+        self.__connection: sqlite3.Connection | None = None
+        # 列名 -> {主键: 向量}
+        self.pendingVectors: dict[str, dict[int, np.ndarray]] = {column: {} for column in SqliteEngine.VECTOR_COLUMNS}
+
+    def connection(self, execution_options: dict | None = None) -> sqlite3.Connection:
+        """ 返回本会话的连接，关闭后再次使用时重新建立。
+        execution_options中指定isolation_level时立即开始事务，之后的读取都在同一个快照中进行（向量文件除外）。
+        """
+        if self.__connection is None:
+            self.__connection = self.engine.connect()
+        if execution_options and execution_options.get("isolation_level") and not self.__connection.in_transaction:
+            self.__connection.execute("BEGIN")
+        return self.__connection
+
+    def commit(self):
+        for column, vector_dict in self.pendingVectors.items():
+            if vector_dict:
+                ids = np.fromiter(vector_dict.keys(), dtype=np.int64, count=len(vector_dict))
+                self.engine.vectorFiles[column].write(ids, np.stack(list(vector_dict.values())))
+                vector_dict.clear()
+        if self.__connection is not None:
+            self.__connection.commit()
+
+    def rollback(self):
+        for vector_dict in self.pendingVectors.values():
+            vector_dict.clear()
+        if self.__connection is not None:
+            self.__connection.rollback()
+
+    def close(self):
+        if self.__connection is not None:
+            self.rollback()
+            self.__connection.close()
+            self.__connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _VectorFile:
+    """ 按主键定位行的float32向量矩阵，由多个固定大小的分段文件组成，第id行位于第id // CHUNK_ROWS个分段中。
+    分段文件建立时即分配好大小，之后不再改变，其他进程或线程已映射的分段不需要重新映射。
+    """
+    # 每个分段的行数，1024维时每个分段为64MB
+    CHUNK_ROWS = 16384
+
+    def __init__(self, path_prefix: str, dim: int):
+        self.pathPrefix = path_prefix
+        self.dim = dim
+        self.lock = Lock()
+        self.chunks: dict[int, np.ndarray] = {}
+
+    def read(self, ids: np.ndarray) -> np.ndarray:
+        vectors = np.zeros((len(ids), self.dim), dtype=np.float32)
+        chunk_numbers = ids // _VectorFile.CHUNK_ROWS
+        for chunk_number in np.unique(chunk_numbers):
+            chunk = self.__get_chunk(int(chunk_number), create=False)
+            if chunk is None:
+                continue
+            mask = chunk_numbers == chunk_number
+            vectors[mask] = chunk[ids[mask] % _VectorFile.CHUNK_ROWS]
+        return vectors
+
+    def write(self, ids: np.ndarray, vectors: np.ndarray):
+        chunk_numbers = ids // _VectorFile.CHUNK_ROWS
+        for chunk_number in np.unique(chunk_numbers):
+            chunk = self.__get_chunk(int(chunk_number), create=True)
+            mask = chunk_numbers == chunk_number
+            chunk[ids[mask] % _VectorFile.CHUNK_ROWS] = vectors[mask]
+            chunk.flush()
+
+    def __get_chunk(self, chunk_number: int, create: bool) -> np.ndarray | None:
+        with self.lock:
+            chunk = self.chunks.get(chunk_number)
+            if chunk is not None:
+                return chunk
+            path = f"{self.pathPrefix}_{chunk_number}.f32"
+            if not os.path.exists(path):
+                if not create:
+                    return None
+                try:
+                    with open(path, "xb") as f:
+                        f.truncate(_VectorFile.CHUNK_ROWS * self.dim * 4)
+                except FileExistsError:
+                    # 其他进程同时建立了该分段
+                    pass
+            chunk = np.memmap(path, dtype=np.float32, mode="r+", shape=(_VectorFile.CHUNK_ROWS, self.dim))
+            self.chunks[chunk_number] = chunk
+            return chunk
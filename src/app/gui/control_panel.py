@@ -15,7 +15,9 @@ from src.app.gui.grid_widget_image_to_search import GridWidgetImageToSearch
 from src.app.log.logger import logger
 from src.app.qt.image_label import ImageLabel
 from src.app.qt.llm_thread import LlmThread
+from src.app.qt.search_by_hybrid_thread import SearchByHybridThread
 from src.app.qt.search_by_img_thread import SearchByImgThread
+from src.app.qt.search_by_library_img_thread import SearchByLibraryImgThread
 from src.app.qt.search_by_text_and_img_thread import SearchByTextAndImgThread
 from src.app.qt.search_by_text_thread import SearchByTextThread
 from src.app.service.img_search_service import ImgSearchService
@@ -36,6 +38,8 @@ class ControlPanel(QWidget):
         self.searchByTextThread = None
         self.searchByImgThread = None
         self.searchByTextAndImgThread = None
+        self.searchByLibraryImgThread = None
+        self.searchByHybridThread = None
         self.imgSearchTool = ImgSearchTool.get_instance()
         self.imgSearchTool.signal_start_img_search_by_text.connect(self.on_signal_start_img_search_by_text)
         self.imgSearchTool.signal_start_img_search_by_img.connect(self.on_signal_start_img_search_by_img)
@@ -47,7 +51,7 @@ class ControlPanel(QWidget):
         # -滚动布局：待检索图片区域
         # -大模型检索文本框
         # -左右布局：新增图片按钮、清除历史、提问/停止
-        # -左右布局：直接用文本检索、直接用图片检索、图文结合搜索
+        # -左右布局：直接用文本检索、直接用图片检索、图文结合搜索、混合检索
         #####################################
         # 控制区（上下布局）
         self.vBoxLayoutControl = QVBoxLayout()
@@ -113,10 +117,16 @@ class ControlPanel(QWidget):
         self.pushButtonSearchByTextAndImage.setStyleSheet("font-size: 12pt;font-family: 微软雅黑;")
         self.pushButtonSearchByTextAndImage.setFixedHeight(30)
         self.pushButtonSearchByTextAndImage.clicked.connect(self.on_click_push_button_search_by_text_and_image)
+        # --混合检索：多模态、文本特征向量和OCR全文检索的结果融合为一个列表
+        self.pushButtonSearchByHybrid = QPushButton("混合检索")
+        self.pushButtonSearchByHybrid.setStyleSheet("font-size: 12pt;font-family: 微软雅黑;")
+        self.pushButtonSearchByHybrid.setFixedHeight(30)
+        self.pushButtonSearchByHybrid.clicked.connect(self.on_click_push_button_search_by_hybrid)
 
         self.hBoxLayoutSearchDirectLy.addWidget(self.pushButtonSearchByText)
         self.hBoxLayoutSearchDirectLy.addWidget(self.pushButtonSearchByImage)
         self.hBoxLayoutSearchDirectLy.addWidget(self.pushButtonSearchByTextAndImage)
+        self.hBoxLayoutSearchDirectLy.addWidget(self.pushButtonSearchByHybrid)
 
         self.vBoxLayoutControl.addWidget(self.labelTitleSearchByLlm)
         self.vBoxLayoutControl.addWidget(self.textEditLlmHistory)
@@ -183,10 +193,15 @@ class ControlPanel(QWidget):
                 and self.textEditLlmToSearch.toPlainText()):
             self.do_push_button_search_by_text_and_img(self.textEditLlmToSearch.toPlainText())
 
+    def on_click_push_button_search_by_hybrid(self):
+        if self.textEditLlmToSearch.toPlainText():
+            self.do_push_button_search_by_hybrid(self.textEditLlmToSearch.toPlainText())
+
     def do_push_button_search_by_text(self, text: str):
         self.signalSwitchOverlay.emit(True)
         self.signalClearImages.emit()
-        cosine_similarity = 0.0
+        # 不设置相似度阈值，直接返回最相似的结果
+        cosine_similarity = None
         # 创建工作线程处理查询请求
         self.searchByTextThread = SearchByTextThread(text, cosine_similarity, ExhibitionPanel.MAX_SIMILAR_IMG_COUNT)
         self.searchByTextThread.finished.connect(
@@ -194,10 +209,23 @@ class ControlPanel(QWidget):
         self.searchByTextThread.error.connect(self.on_signal_search_error)
         self.searchByTextThread.start()
 
+    def do_push_button_search_by_hybrid(self, text: str):
+        self.signalSwitchOverlay.emit(True)
+        self.signalClearImages.emit()
+        # 不设置相似度阈值，直接返回最相似的结果
+        cosine_similarity = None
+        # 创建工作线程处理查询请求
+        self.searchByHybridThread = SearchByHybridThread(text, cosine_similarity, ExhibitionPanel.MAX_SIMILAR_IMG_COUNT)
+        self.searchByHybridThread.finished.connect(
+            lambda search_thread=self.searchByHybridThread: self.on_signal_search_finished(search_thread))
+        self.searchByHybridThread.error.connect(self.on_signal_search_error)
+        self.searchByHybridThread.start()
+
     def do_push_button_search_by_img(self):
         self.signalSwitchOverlay.emit(True)
         self.signalClearImages.emit()
-        cosine_similarity = 0.0
+        # 不设置相似度阈值，直接返回最相似的结果
+        cosine_similarity = None
         label_image_to_search_list = self.gridWidgetImageToSearch.labelImageToSearchList
 
         # 创建工作线程处理查询请求
@@ -210,7 +238,8 @@ class ControlPanel(QWidget):
     def do_push_button_search_by_text_and_img(self, text: str):
         self.signalSwitchOverlay.emit(True)
         self.signalClearImages.emit()
-        cosine_similarity = 0.0
+        # 不设置相似度阈值，直接返回最相似的结果
+        cosine_similarity = None
         label_image_to_search_list = self.gridWidgetImageToSearch.labelImageToSearchList
         # 创建工作线程处理查询请求
         self.searchByTextAndImgThread = SearchByTextAndImgThread(label_image_to_search_list[0].imagePath, text, cosine_similarity,
@@ -221,6 +250,19 @@ class ControlPanel(QWidget):
         self.searchByTextAndImgThread.error.connect(self.on_signal_search_error)
         self.searchByTextAndImgThread.start()
 
+    def do_search_by_library_img(self, file_sha256: str, image_path: str):
+        self.signalSwitchOverlay.emit(True)
+        self.signalClearImages.emit()
+        # 不设置相似度阈值，直接返回最相似的结果
+        cosine_similarity = None
+        # 创建工作线程处理查询请求
+        self.searchByLibraryImgThread = SearchByLibraryImgThread(file_sha256, image_path, cosine_similarity,
+                                                                 ExhibitionPanel.MAX_SIMILAR_IMG_COUNT)
+        self.searchByLibraryImgThread.finished.connect(
+            lambda search_thread=self.searchByLibraryImgThread: self.on_signal_search_finished(search_thread))
+        self.searchByLibraryImgThread.error.connect(self.on_signal_search_error)
+        self.searchByLibraryImgThread.start()
+
     def on_signal_mixed_img_generated(self, text, mixed_image_path):
         text_cursor: QTextCursor = self.textEditLlmHistory.textCursor()
         text_cursor.movePosition(QTextCursor.End)
@@ -4,7 +4,7 @@ Licensed under the Apache-2.0 License.
 For full terms, see the LICENSE file.  
 exhibition_panel.py
 """
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QGridLayout, QFrame
 
@@ -13,6 +13,8 @@ from src.app.qt.image_label import ImageLabel
 
 
 class ExhibitionPanel(QWidget):
+    # 以检索结果中的图片继续检索：文件sha256、文件路径
+    signalSearchByLibraryImg = pyqtSignal(str, str)
     SIMILAR_IMG_COLS = 8
     SIMILAR_IMG_ROWS = 2
     MAX_SIMILAR_IMG_COUNT = SIMILAR_IMG_COLS * SIMILAR_IMG_ROWS
@@ -45,6 +47,7 @@ class ExhibitionPanel(QWidget):
                 label.setStyleSheet("border: 1px solid black;")
                 label.setAlignment(Qt.AlignCenter)
                 label.signal_mark.connect(self.on_signal_mark_image)
+                label.signal_search_similar.connect(self.on_signal_search_similar_image)
                 self.gridLayoutMultiModel.addWidget(label, row, col)
                 label_row.append(label)
             self.labelImageSearchResultMultiModelMatrix.append(label_row)
@@ -70,6 +73,7 @@ class ExhibitionPanel(QWidget):
                 label.setStyleSheet("border: 1px solid black;")
                 label.setAlignment(Qt.AlignCenter)
                 label.signal_mark.connect(self.on_signal_mark_image)
+                label.signal_search_similar.connect(self.on_signal_search_similar_image)
                 self.gridLayoutTextInfo.addWidget(label, row, col)
                 label_row.append(label)
             self.labelImageSearchResultTextInfoMatrix.append(label_row)
@@ -103,7 +107,9 @@ class ExhibitionPanel(QWidget):
             image_label.setPixmap(QPixmap(similar_img_model.filePath))
             image_label.setImagePath(similar_img_model.filePath)
             image_label.setFileSha256(similar_img_model.fileSha256)
-            image_label.setCosineSimilarity(1 - similar_img_model.cosineDistance)
+            # 混合检索的结果没有余弦距离，展示融合得分
+            image_label.setCosineSimilarity(1 - similar_img_model.cosineDistance if similar_img_model.cosineDistance is not None else None)
+            image_label.setFusionScore(similar_img_model.score)
             i += 1
             if i >= ExhibitionPanel.MAX_SIMILAR_IMG_COUNT:
                 break
@@ -126,3 +132,7 @@ class ExhibitionPanel(QWidget):
         image_label: ImageLabel = self.sender()
         self.childMarkingWindow = MarkingWindow(image_label.imagePath, image_label.fileSha256)
         self.childMarkingWindow.show()
+
+    def on_signal_search_similar_image(self):
+        image_label: ImageLabel = self.sender()
+        self.signalSearchByLibraryImg.emit(image_label.fileSha256, image_label.imagePath)
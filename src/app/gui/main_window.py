@@ -47,6 +47,7 @@ class MainWindow(QMainWindow):
         self.controlPanel.signalUpdateLabelImageSearchResultMultiModelMatrix.connect(
             self.update_label_image_search_result_multi_model_matrix)
         self.controlPanel.signalUpdateLabelImageSearchResultTextInfoMatrix.connect(self.update_label_image_search_result_text_info_matrix)
+        self.exhibitionPanel.signalSearchByLibraryImg.connect(self.controlPanel.do_search_by_library_img)
 
         self.splitterMain.addWidget(self.controlPanel)
         self.splitterMain.addWidget(self.exhibitionPanel)
@@ -4,15 +4,11 @@ Licensed under the Apache-2.0 License.
 For full terms, see the LICENSE file.  
 marking_window.py
 """
-import os
-
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import QWidget, QHBoxLayout, QSplitter, QVBoxLayout, QLineEdit, QPushButton, QScrollArea
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
-from src.app.db.mapper.image_info_mapper import ImageInfoMapper
+from src.app.db.db_backend import DBBackend
 from src.app.gui.grid_widget_tag_list import GridWidgetTagList
 from src.app.log.logger import logger
 from src.app.qt.image_label import ImageLabel
@@ -20,10 +16,8 @@ from src.app.service.repo_vector_service import RepoVectorService
 
 
 class MarkingWindow(QWidget):
-    engine = create_engine(f"postgresql://"
-                           f"{os.getenv('POSTGRESQL_USER')}:{os.getenv('POSTGRESQL_PASSWORD')}"
-                           f"@{os.getenv('POSTGRESQL_HOST')}:{os.getenv('POSTGRESQL_PORT')}/{os.getenv('POSTGRESQL_DB')}")
-    Session = sessionmaker(bind=engine)
+    db_backend = DBBackend.get_instance()
+    Session = db_backend.Session
     repo_vector_service = RepoVectorService.get_instance()
 
     def __init__(self, file_path, file_sha256):
@@ -113,7 +107,7 @@ class MarkingWindow(QWidget):
         tags = [line_edit_tag.text() for line_edit_tag in self.gridWidgetTagList.lineEditTagList]
         logger.info(f"保存标签：{",".join(tags)}")
         with self.Session() as session:
-            image_info_mapper = ImageInfoMapper(session)
+            image_info_mapper = self.db_backend.create_image_info_mapper(session)
             # 更新标签到数据库
             image_info_mapper.update_tag_text_by_file_path(self.filePath, ",".join(tags))
             # 更新向量到数据库
@@ -122,7 +116,7 @@ class MarkingWindow(QWidget):
 
     def load_tags(self):
         with self.Session() as session:
-            image_info_mapper = ImageInfoMapper(session)
+            image_info_mapper = self.db_backend.create_image_info_mapper(session)
             tag_text = image_info_mapper.query_by_file_path(self.filePath).tag_text
             if tag_text is None:
                 return
@@ -15,6 +15,7 @@ from src.app.log.logger import logger
 class ImageLabel(QLabel):
     signal_delete_image = pyqtSignal()
     signal_mark = pyqtSignal()
+    signal_search_similar = pyqtSignal()
 
     def __init__(self, *__args):
         super().__init__(*__args)
@@ -24,6 +25,8 @@ class ImageLabel(QLabel):
         self.imageClipboardPath = None
         self.fileSha256 = None
         self.cosineSimilarity = None
+        # 混合检索结果的融合得分，与相似度不同时存在
+        self.fusionScore = None
         self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.on_show_context_menu)
 
@@ -46,6 +49,9 @@ class ImageLabel(QLabel):
     def setCosineSimilarity(self, cosine_similarity):
         self.cosineSimilarity = cosine_similarity
 
+    def setFusionScore(self, fusion_score):
+        self.fusionScore = fusion_score
+
     def clear(self):
         self.originalPixmap = None
         self.imagePath = None
@@ -73,9 +79,13 @@ class ImageLabel(QLabel):
         menu = QMenu()
         if image_label.cosineSimilarity:
             menu.addAction(f"相似度: {image_label.cosineSimilarity:.2f}")
+        if image_label.fusionScore:
+            menu.addAction(f"融合得分: {image_label.fusionScore:.4f}")
         copy_action = menu.addAction("复制图片")
         delete_action = menu.addAction("删除图片")
         mark_action = menu.addAction("打标...")
+        # 只有图库中的图片（检索结果）才能直接使用库中的特征向量检索
+        search_similar_action = menu.addAction("以此图搜图") if image_label.fileSha256 else None
         action = menu.exec(image_label.mapToGlobal(pos))
 
         if action == copy_action:
@@ -88,3 +98,5 @@ class ImageLabel(QLabel):
             self.signal_delete_image.emit()
         elif action == mark_action:
             self.signal_mark.emit()
+        elif search_similar_action and action == search_similar_action:
+            self.signal_search_similar.emit()
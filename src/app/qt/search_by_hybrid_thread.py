@@ -0,0 +1,36 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+search_by_hybrid_thread.py
+"""
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from src.app.log.logger import logger
+from src.app.service.img_search_service import ImgSearchService
+
+
+class SearchByHybridThread(QThread):
+    # 定义信号：完成信号、错误信号
+    finished = pyqtSignal()
+    error = pyqtSignal(str)
+
+    def __init__(self, text: str, cosine_similarity: float | None, img_count: int):
+        super().__init__()
+        self.imgSearchService = ImgSearchService.get_instance()
+        self.text = text
+        self.cosineSimilarity = cosine_similarity
+        self.imgCount = img_count
+        # 融合后的结果展示在多模态检索结果区域，文本信息检索结果区域为空
+        self.similar_img_model_multi_model_list = None
+        self.similar_img_model_all_text_list = []
+
+    def run(self):
+        try:
+            self.similar_img_model_multi_model_list = self.imgSearchService.search_hybrid(self.text, self.cosineSimilarity,
+                                                                                         self.imgCount)
+            logger.info("[SearchByHybridThread]已完成")
+            self.finished.emit()
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            self.error.emit("模型执行异常")
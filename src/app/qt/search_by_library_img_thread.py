@@ -0,0 +1,39 @@
+"""
+Copyright © 2025-2025 tmx0103.  
+Licensed under the Apache-2.0 License.  
+For full terms, see the LICENSE file.  
+search_by_library_img_thread.py
+"""
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from src.app.log.logger import logger
+from src.app.service.img_search_service import ImgSearchService
+
+
+class SearchByLibraryImgThread(QThread):
+    # 定义信号：完成信号、错误信号
+    finished = pyqtSignal()
+    error = pyqtSignal(str)
+
+    def __init__(self, file_sha256: str, image_path: str, cosine_similarity: float | None, img_count: int):
+        super().__init__()
+        self.imgSearchService = ImgSearchService.get_instance()
+        self.fileSha256 = file_sha256
+        self.imagePath = image_path
+        self.cosineSimilarity = cosine_similarity
+        self.imgCount = img_count
+        self.similar_img_model_multi_model_list = None
+        self.similar_img_model_all_text_list = None
+
+    def run(self):
+        try:
+            result = self.imgSearchService.search_by_library_img(self.cosineSimilarity, self.imgCount, file_sha256=self.fileSha256)
+            if result is None:
+                # 特征向量尚未计算完成，退回为重新计算特征向量的以图搜图
+                result = self.imgSearchService.search_by_img(self.imagePath, self.cosineSimilarity, self.imgCount)
+            self.similar_img_model_multi_model_list, self.similar_img_model_all_text_list = result
+            logger.info("[SearchByLibraryImgThread]已完成")
+            self.finished.emit()
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            self.error.emit("模型执行异常")
@@ -16,7 +16,7 @@ class SearchByTextAndImgThread(QThread):
     finished = pyqtSignal()
     error = pyqtSignal(str)
 
-    def __init__(self, image_path: str, text: str, cosine_similarity: float, img_count: int):
+    def __init__(self, image_path: str, text: str, cosine_similarity: float | None, img_count: int):
         super().__init__()
         self.imgSearchService = ImgSearchService.get_instance()
         self.imagePath = image_path
@@ -15,7 +15,7 @@ class SearchByTextThread(QThread):
     finished = pyqtSignal()
     error = pyqtSignal(str)
 
-    def __init__(self, text: str, cosine_similarity: float, img_count: int):
+    def __init__(self, text: str, cosine_similarity: float | None, img_count: int):
         super().__init__()
         self.imgSearchService = ImgSearchService.get_instance()
         self.text = text
@@ -0,0 +1,225 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+image_job_service.py
+"""
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+
+from PIL import Image
+
+from src.app.db.db_backend import DBBackend
+from src.app.db.mapper.image_info_mapper import ImageInfoMapper
+from src.app.db.mapper.image_job_mapper import ImageJobMapper
+from src.app.db.models import ImageInfoDO
+from src.app.db.models.db_backend_enum import DBBackendEnum
+from src.app.db.models.image_job_do import ImageJobStageEnum
+from src.app.log.logger import logger
+from src.app.utils.string_util import StringUtil
+
+
+class ImageJobService:
+    """ 从任务表领取任务并处理。任意数量的工作进程（可以位于不同机器）可以同时连接同一个数据库，
+    通过租约分摊任务；工作进程崩溃后，租约到期的任务会被其他工作进程重新领取。
+    """
+    # 每次领取的任务数量
+    BATCH_SIZE = 32
+    # 租约秒数，心跳间隔为租约的三分之一
+    LEASE_SECONDS = 300
+    # 最多重试次数，超过后任务标记为失败
+    MAX_RETRIES = 3
+    # 没有任务时等待的秒数
+    IDLE_SECONDS = 10
+    # 读取、解码图片的线程数
+    READ_WORKERS = 8
+    # OCR工作进程数，小于等于1时在当前进程中逐张识别
+    OCR_WORKERS = 8
+    # 每个OCR工作进程内的计算线程数
+    OCR_CPU_THREADS = 4
+
+    def __init__(self, stages: list[ImageJobStageEnum], worker_id: str | None = None):
+        self.stages = stages
+        self.workerId = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        db_backend = DBBackend.get_instance()
+        if db_backend.backend != DBBackendEnum.POSTGRES:
+            # 领取任务依赖PostgreSQL的FOR UPDATE SKIP LOCKED
+            raise ValueError("任务队列只支持PostgreSQL，DB_BACKEND=sqlite时请使用run_ingest.py入库")
+        self.Session = db_backend.Session
+        # 模型只在处理对应阶段时加载，只做OCR的机器无需GPU
+        self.chineseClip = None
+        self.qwenEmbedding = None
+        self.ocrUtil = None
+        self.ocrPool = None
+        self.stopEvent = Event()
+
+    def run(self, exit_when_idle: bool = False):
+        """ 循环领取并处理任务。
+
+        Args:
+            exit_when_idle: 为True时所有阶段都没有待处理任务后退出，否则持续等待新任务
+        """
+        logger.info(f"工作进程{self.workerId}启动，处理阶段：{[stage.value for stage in self.stages]}")
+        heartbeat_thread = Thread(target=self.__heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat_thread.start()
+        try:
+            with self.Session() as session:
+                image_job_mapper = ImageJobMapper(session)
+                image_info_mapper = ImageInfoMapper(session)
+                self.__enqueue(image_job_mapper)
+                while True:
+                    if self.__process_any(image_job_mapper, image_info_mapper):
+                        continue
+                    # 所有阶段都没有任务时，为新入库的图片以及前置阶段刚完成的图片创建任务
+                    if self.__enqueue(image_job_mapper) > 0:
+                        continue
+                    if exit_when_idle:
+                        break
+                    self.stopEvent.wait(ImageJobService.IDLE_SECONDS)
+        finally:
+            self.stopEvent.set()
+            heartbeat_thread.join()
+            with self.Session() as session:
+                released_count = ImageJobMapper(session).release(self.workerId)
+            if self.ocrPool:
+                self.ocrPool.shutdown()
+            logger.info(f"工作进程{self.workerId}退出，归还任务{released_count}个")
+
+    def __enqueue(self, image_job_mapper: ImageJobMapper) -> int:
+        image_job_mapper.delete_orphans()
+        image_job_mapper.expire_abandoned(ImageJobService.MAX_RETRIES)
+        enqueued_count = 0
+        for stage in self.stages:
+            enqueued_count += image_job_mapper.enqueue_missing(stage)
+        if enqueued_count > 0:
+            logger.info(f"新建任务{enqueued_count}个")
+        return enqueued_count
+
+    def __process_any(self, image_job_mapper: ImageJobMapper, image_info_mapper: ImageInfoMapper) -> bool:
+        for stage in self.stages:
+            job_list = image_job_mapper.claim(stage, self.workerId, ImageJobService.BATCH_SIZE,
+                                              ImageJobService.LEASE_SECONDS, ImageJobService.MAX_RETRIES)
+            if not job_list:
+                continue
+            logger.info(f"领取{stage.value}任务{len(job_list)}个")
+            # 内容相同（sha256相同）的图片已有结果时直接复制，无需重新计算
+            copied_count = image_info_mapper.copy_by_file_sha256(stage.value, [image_id for _, image_id in job_list])
+            if copied_count > 0:
+                logger.info(f"复用相同内容图片的结果：{copied_count}条")
+            image_info_dict = {image_info_do.id: image_info_do for image_info_do in
+                               image_info_mapper.query_by_id_list([image_id for _, image_id in job_list])}
+            # 图片记录已被删除，或该阶段已被其他流程（例如run_ingest.py）完成的任务，直接完成
+            done_job_ids = [job_id for job_id, image_id in job_list
+                            if image_id not in image_info_dict or getattr(image_info_dict[image_id], stage.value) is not None]
+            todo_job_list = [(job_id, image_info_dict[image_id]) for job_id, image_id in job_list if job_id not in done_job_ids]
+            failed_job_ids = []
+            try:
+                if todo_job_list:
+                    failed_job_ids = self.__process(stage, image_info_mapper, todo_job_list)
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                image_job_mapper.session.rollback()
+                image_job_mapper.fail([job_id for job_id, _ in todo_job_list], self.workerId, repr(e), ImageJobService.MAX_RETRIES)
+                image_job_mapper.complete(done_job_ids, self.workerId)
+                return True
+            image_job_mapper.fail(failed_job_ids, self.workerId, "处理异常", ImageJobService.MAX_RETRIES)
+            image_job_mapper.complete(done_job_ids + [job_id for job_id, _ in todo_job_list if job_id not in failed_job_ids],
+                                      self.workerId)
+            return True
+        return False
+
+    def __process(self, stage: ImageJobStageEnum, image_info_mapper: ImageInfoMapper,
+                  job_list: list[tuple[int, ImageInfoDO]]) -> list[int]:
+        """ 处理一批任务并写库。
+
+        Returns:
+            处理失败的任务主键
+        """
+        if stage == ImageJobStageEnum.IMAGE_VECTOR:
+            return self.__process_image_vector(image_info_mapper, job_list)
+        if stage == ImageJobStageEnum.OCR_TEXT:
+            return self.__process_ocr_text(image_info_mapper, job_list)
+        return self.__process_all_text_vector(image_info_mapper, job_list)
+
+    def __process_image_vector(self, image_info_mapper: ImageInfoMapper, job_list: list[tuple[int, ImageInfoDO]]) -> list[int]:
+        if self.chineseClip is None:
+            from src.app.ai.chinese_clip import ChineseClip
+            self.chineseClip = ChineseClip.get_instance()
+        with ThreadPoolExecutor(max_workers=ImageJobService.READ_WORKERS) as executor:
+            images = list(executor.map(ImageJobService.__read_image, [image_info_do.file_path for _, image_info_do in job_list]))
+        failed_job_ids = [job_id for (job_id, _), image in zip(job_list, images) if image is None]
+        read_job_list = [(job_id, image_info_do, image) for (job_id, image_info_do), image in zip(job_list, images) if image is not None]
+        if read_job_list:
+            image_vectors = self.chineseClip.embed_images_to_vec([image for _, _, image in read_job_list])
+            image_info_mapper.update_image_vector_batch_by_id([(image_info_do.id, image_vector) for (_, image_info_do, _), image_vector
+                                                               in zip(read_job_list, image_vectors)])
+        return failed_job_ids
+
+    def __process_ocr_text(self, image_info_mapper: ImageInfoMapper, job_list: list[tuple[int, ImageInfoDO]]) -> list[int]:
+        file_path_list = [image_info_do.file_path for _, image_info_do in job_list]
+        failed_job_ids = []
+        id_text_list = []
+        for (job_id, image_info_do), ocr_texts in zip(job_list, self.__recognize_files(file_path_list)):
+            if ocr_texts is None:
+                logger.error(f"处理异常，跳过：{image_info_do.file_path}")
+                failed_job_ids.append(job_id)
+                continue
+            id_text_list.append((image_info_do.id, ",".join(ocr_texts)))
+        image_info_mapper.update_ocr_text_batch_by_id(id_text_list)
+        return failed_job_ids
+
+    def __process_all_text_vector(self, image_info_mapper: ImageInfoMapper, job_list: list[tuple[int, ImageInfoDO]]) -> list[int]:
+        if self.qwenEmbedding is None:
+            from src.app.ai.qwen_embedding import QwenEmbedding
+            self.qwenEmbedding = QwenEmbedding.get_instance()
+        # OCR尚未完成的图片稍后重试
+        failed_job_ids = [job_id for job_id, image_info_do in job_list if image_info_do.ocr_text is None]
+        job_list = [(job_id, image_info_do) for job_id, image_info_do in job_list if image_info_do.ocr_text is not None]
+        if job_list:
+            all_text_list = [StringUtil.concat(image_info_do.tag_text, ",", image_info_do.ocr_text) for _, image_info_do in job_list]
+            all_text_vectors = self.qwenEmbedding.embed_to_vectors(all_text_list)
+            image_info_mapper.update_all_text_vector_batch_by_id([(image_info_do.id, all_text_vector) for (_, image_info_do), all_text_vector
+                                                                  in zip(job_list, all_text_vectors)])
+        return failed_job_ids
+
+    def __recognize_files(self, file_path_list: list[str]) -> list[list[str] | None]:
+        if self.ocrPool is None and self.ocrUtil is None:
+            from src.app.ai.paddle_ocr_util import PaddleOCRUtil, PaddleOCRPool
+            if ImageJobService.OCR_WORKERS > 1:
+                self.ocrPool = PaddleOCRPool(ImageJobService.OCR_WORKERS, ImageJobService.OCR_CPU_THREADS)
+            else:
+                self.ocrUtil = PaddleOCRUtil.get_instance()
+        if self.ocrPool:
+            return self.ocrPool.recognize_files(file_path_list)
+        results = []
+        for file_path in file_path_list:
+            try:
+                with Image.open(file_path) as image:
+                    results.append(self.ocrUtil.recognize(image))
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                results.append(None)
+        return results
+
+    def __heartbeat(self):
+        # 心跳使用独立的session，不与处理任务的session共用
+        with self.Session() as session:
+            image_job_mapper = ImageJobMapper(session)
+            while not self.stopEvent.wait(ImageJobService.LEASE_SECONDS / 3):
+                try:
+                    image_job_mapper.heartbeat(self.workerId, ImageJobService.LEASE_SECONDS)
+                except Exception as e:
+                    logger.error(e, exc_info=True)
+                    session.rollback()
+
+    @staticmethod
+    def __read_image(file_path: str) -> Image.Image | None:
+        try:
+            with Image.open(file_path) as image:
+                return image.convert("RGB")
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            logger.error(f"处理异常，跳过：{file_path}")
+            return None
@@ -5,25 +5,40 @@ For full terms, see the LICENSE file.
 img_search_service.py
 """
 import os
-from threading import Lock
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+from typing import Callable
 
 from PIL import Image
 from numpy import ndarray
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 from src.app.ai.chinese_clip import ChineseClip
+from src.app.ai.embedding_cache import EmbeddingCache
 from src.app.ai.paddle_ocr_util import PaddleOCRUtil
 from src.app.ai.qwen_embedding import QwenEmbedding
 from src.app.ai.stable_diffusion import StableDiffusion
-from src.app.db.mapper.image_info_mapper import ImageInfoMapper
+from src.app.db.db_backend import DBBackend
 from src.app.db.models.similar_img_models import SimilarImgModel
+from src.app.log.logger import logger
+from src.app.utils.sha256_util import Sha256Util
 from src.app.utils.string_util import StringUtil
+from src.app.vector.local_ivf_index import LocalIvfIndex
+from src.app.vector.local_vector_index import LocalVectorIndex
+from src.app.vector.vector_search_backend_enum import VectorSearchBackendEnum
 
 
 class ImgSearchService:
     _instance = None
     _lock = Lock()
+    # 查询编码线程数，每次检索占用两个线程，混合检索占用三个线程
+    ENCODE_WORKERS = 4
+    # 混合检索时每路检索取出的结果数量为最终结果数量的倍数，一路中排名靠后的结果可能在融合后排名靠前
+    HYBRID_FETCH_FACTOR = 3
+    # 倒数排名融合的平滑常数，越大各路中排名靠前的结果优势越小
+    RRF_K = 60
+    # 混合检索时各路检索的权重：多模态特征向量、文本特征向量、OCR全文检索
+    HYBRID_WEIGHTS = {"image_vector": 1.0, "all_text_vector": 1.0, "ocr_text": 1.0}
 
     @classmethod
     def get_instance(cls):
@@ -39,96 +54,217 @@ class ImgSearchService:
         self.ocrUtil = PaddleOCRUtil.get_instance()
         self.qwenEmbedding = QwenEmbedding.get_instance()
         self.sd = StableDiffusion.get_instance()
-        self.engine = create_engine(f"postgresql://"
-                                    f"{os.getenv('POSTGRESQL_USER')}:{os.getenv('POSTGRESQL_PASSWORD')}"
-                                    f"@{os.getenv('POSTGRESQL_HOST')}:{os.getenv('POSTGRESQL_PORT')}/{os.getenv('POSTGRESQL_DB')}")
-        self.Session = sessionmaker(bind=self.engine)
+        self.embeddingCache = EmbeddingCache.get_instance()
+        self.vectorSearchBackend = VectorSearchBackendEnum(os.getenv("VECTOR_SEARCH_BACKEND", VectorSearchBackendEnum.POSTGRES.value))
+        if self.vectorSearchBackend == VectorSearchBackendEnum.LOCAL:
+            # 使用本地向量快照检索，无需连接数据库
+            self.localVectorIndex = LocalVectorIndex(os.getenv("VECTOR_SNAPSHOT_PATH", "resources/vector_snapshot"))
+            self.dbBackend = None
+            self.Session = None
+        elif self.vectorSearchBackend == VectorSearchBackendEnum.LOCAL_IVF:
+            nprobe = int(os.getenv("LOCAL_IVF_NPROBE")) if os.getenv("LOCAL_IVF_NPROBE") else None
+            self.localVectorIndex = LocalIvfIndex(os.getenv("LOCAL_IVF_INDEX_PATH", "resources/ivf_index"), nprobe)
+            self.dbBackend = None
+            self.Session = None
+            # 定期将数据库中的新增、删除同步到本地索引，未设置时不同步，检索不依赖数据库
+            sync_interval = float(os.getenv("LOCAL_IVF_SYNC_INTERVAL", "0"))
+            if sync_interval > 0:
+                Thread(target=self.__sync_local_index, args=(sync_interval,), name="local-ivf-sync", daemon=True).start()
+        else:
+            self.localVectorIndex = None
+            self.dbBackend = DBBackend.get_instance()
+            self.Session = self.dbBackend.Session
+        # 查询编码线程池，每次检索的两个编码分支同时执行
+        self.encodeExecutor = ThreadPoolExecutor(max_workers=ImgSearchService.ENCODE_WORKERS, thread_name_prefix="query-encode")
 
-    def search_by_img(self, img_path: str, cosine_similarity: float, img_count: int):
+    def search_by_library_img(self, cosine_similarity: float | None, img_count: int,
+                              file_sha256: str | None = None, image_id: int | None = None):
+        """ 以图库中的图片检索相似图片，直接使用库中已保存的特征向量，无需重新解码图片和计算特征向量。
+
+        Args:
+            cosine_similarity: 相似度阈值，为None时不过滤
+            img_count: 每组最多返回的图片数量
+            file_sha256: 图片的sha256
+            image_id: 图片记录的主键，与file_sha256至少提供一个
+
+        Returns:
+            (按图片特征向量检索的结果, 按文本特征向量检索的结果)，图库中没有该图片或其特征向量尚未计算完成时返回None
+        """
+        if self.localVectorIndex:
+            vectors = self.localVectorIndex.query_vectors(image_id, file_sha256)
+            if vectors is None:
+                return None
+            return (self.__search(vectors[0], cosine_similarity, img_count, "image_vector"),
+                    self.__search(vectors[1], cosine_similarity, img_count, "all_text_vector"))
+        with self.Session() as session:
+            image_info_mapper = self.dbBackend.create_image_info_mapper(session)
+            vectors = image_info_mapper.query_vectors(image_id, file_sha256)
+            if vectors is None:
+                return None
+            # 两个查询向量都已就绪，两次检索合并为一条SQL
+            image_info_do_list, all_text_image_info_do_list \
+                = image_info_mapper.search_by_image_and_all_text_vector(vectors[0], vectors[1], cosine_similarity, img_count)
+        return (ImgSearchService.__to_similar_img_model_list(image_info_do_list),
+                ImgSearchService.__to_similar_img_model_list(all_text_image_info_do_list))
+
+    def search_by_img(self, img_path: str, cosine_similarity: float | None, img_count: int):
+        # 图片已在图库中时直接使用库中的特征向量，计算sha256远快于解码图片和模型推理
+        library_result = self.search_by_library_img(cosine_similarity, img_count, file_sha256=Sha256Util.sha256_file(img_path))
+        if library_result is not None:
+            logger.info(f"图片已在图库中，使用已保存的特征向量检索：{img_path}")
+            return library_result
+        # 图片只解码一次，两个分支共用
         with Image.open(img_path) as image:
-            # 计算图片的特征向量
-            image_feature = self.chineseClip.embed_image_to_vec(image)
+            rgb_image = image.convert("RGB")
+
+        def embed_all_text() -> ndarray:
             # 从图片中识别文字OCR
-            ocr_texts = ",".join(self.ocrUtil.recognize(image))
+            ocr_texts = ",".join(self.ocrUtil.recognize(rgb_image))
             # 计算所有文本的特征向量
             all_text = ocr_texts + ","
-            all_text_vector = self.qwenEmbedding.embed_to_vector(all_text)
-        with self.Session() as session:
-            image_info_mapper = ImageInfoMapper(session)
-            # 使用图片特征向量进行检索
-            image_info_do_list = image_info_mapper.search_by_image_vector(image_feature, cosine_similarity, img_count)
-            similar_img_model_multi_model_list = []
-            for image_info_do in image_info_do_list:
-                similar_img_model = SimilarImgModel(image_info_do.file_path, image_info_do.file_name, image_info_do.cosine_distance,
-                                                    image_info_do.file_sha256)
-                similar_img_model_multi_model_list.append(similar_img_model)
-
-            # 使用所有文本的特征向量进行检索
-            image_info_do_list = image_info_mapper.search_by_all_text_vector(all_text_vector, cosine_similarity, img_count)
-            similar_img_model_all_text_list = []
-            for image_info_do in image_info_do_list:
-                similar_img_model = SimilarImgModel(image_info_do.file_path, image_info_do.file_name, image_info_do.cosine_distance,
-                                                    image_info_do.file_sha256)
-                similar_img_model_all_text_list.append(similar_img_model)
-
-            return similar_img_model_multi_model_list, similar_img_model_all_text_list
-
-    def search_by_text(self, text: str, cosine_similarity: float, img_count: int):
-        # 计算文本由多模态模型计算的特征向量
-        text_feature_chinese_clip = self.chineseClip.embed_text_to_vec(text)
-        # 计算文本由文本模型计算的特征向量
-        text_feature_qwen = self.qwenEmbedding.embed_to_vector(text)
+            return self.__embed_text_by_qwen(all_text)
 
-        with self.Session() as session:
-            image_info_mapper = ImageInfoMapper(session)
-            # 使用图片特征向量进行检索
-            image_info_do_list = image_info_mapper.search_by_image_vector(text_feature_chinese_clip, cosine_similarity, img_count)
-            similar_img_model_multi_model_list = []
-            for image_info_do in image_info_do_list:
-                similar_img_model = SimilarImgModel(image_info_do.file_path, image_info_do.file_name, image_info_do.cosine_distance,
-                                                    image_info_do.file_sha256)
-                similar_img_model_multi_model_list.append(similar_img_model)
-
-            # 使用所有文本的特征向量进行检索
-            image_info_do_list = image_info_mapper.search_by_all_text_vector(text_feature_qwen, cosine_similarity, img_count)
-            similar_img_model_all_text_list = []
-            for image_info_do in image_info_do_list:
-                similar_img_model = SimilarImgModel(image_info_do.file_path, image_info_do.file_name, image_info_do.cosine_distance,
-                                                    image_info_do.file_sha256)
-                similar_img_model_all_text_list.append(similar_img_model)
-
-            return similar_img_model_multi_model_list, similar_img_model_all_text_list
-
-    def search_by_text_and_img(self, img_file_path: str, text: str, cosine_similarity: float, img_count: int):
-        # 生成图文融合的新图
-        mixed_img_file_path = self.sd.generate_image(text, img_file_path)
-        # 计算融合图的特征向量
-        with Image.open(mixed_img_file_path) as mixed_image:
-            mixed_image_vector: ndarray = self.chineseClip.embed_image_to_vec(mixed_image)
-        # 计算全部文本的特征向量，注意必须把tag_text放在前面防止被模型512token限制截断
-        with Image.open(img_file_path) as image:
-            # 从图片中识别文字OCR
-            ocr_texts = ",".join(self.ocrUtil.recognize(image))
-            # 计算特征向量
+        # 计算图片的特征向量后立即检索，无需等待OCR
+        return self.__encode_and_search(lambda: self.chineseClip.embed_image_to_vec(rgb_image), embed_all_text,
+                                        cosine_similarity, img_count)
+
+    def search_by_text(self, text: str, cosine_similarity: float | None, img_count: int):
+        # 分别由多模态模型和文本模型计算文本的特征向量
+        return self.__encode_and_search(lambda: self.__embed_text_by_clip(text),
+                                        lambda: self.__embed_text_by_qwen(text),
+                                        cosine_similarity, img_count)
+
+    def search_by_text_and_img(self, img_file_path: str, text: str, cosine_similarity: float | None, img_count: int):
+        mixed_img_file_path = None
+
+        def embed_mixed_image() -> ndarray:
+            nonlocal mixed_img_file_path
+            # 生成图文融合的新图
+            mixed_img_file_path = self.sd.generate_image(text, img_file_path)
+            # 计算融合图的特征向量
+            with Image.open(mixed_img_file_path) as mixed_image:
+                return self.chineseClip.embed_image_to_vec(mixed_image)
+
+        def embed_all_text() -> ndarray:
+            # 计算全部文本的特征向量，注意必须把tag_text放在前面防止被模型512token限制截断
+            with Image.open(img_file_path) as image:
+                # 从图片中识别文字OCR
+                ocr_texts = ",".join(self.ocrUtil.recognize(image))
             all_text = StringUtil.concat(text, ",", ocr_texts)
-            all_text_vector: ndarray = self.qwenEmbedding.embed_to_vector(all_text)
+            return self.__embed_text_by_qwen(all_text)
 
-        with self.Session() as session:
-            image_info_mapper = ImageInfoMapper(session)
-            # 使用图文混合多模态特征向量进行检索
-            image_info_do_list = image_info_mapper.search_by_image_vector(mixed_image_vector, cosine_similarity, img_count)
-            similar_img_model_multi_model_list = []
-            for image_info_do in image_info_do_list:
-                similar_img_model = SimilarImgModel(image_info_do.file_path, image_info_do.file_name, image_info_do.cosine_distance,
-                                                    image_info_do.file_sha256)
-                similar_img_model_multi_model_list.append(similar_img_model)
-
-            # 使用文本信息特征向量进行检索
-            image_info_do_list = image_info_mapper.search_by_all_text_vector(all_text_vector, cosine_similarity, img_count)
-            similar_img_model_all_text_list = []
-            for image_info_do in image_info_do_list:
-                similar_img_model = SimilarImgModel(image_info_do.file_path, image_info_do.file_name, image_info_do.cosine_distance,
-                                                    image_info_do.file_sha256)
-                similar_img_model_all_text_list.append(similar_img_model)
-
-            return similar_img_model_multi_model_list, similar_img_model_all_text_list, mixed_img_file_path
+        # OCR和文本特征向量在生成融合图的同时计算
+        similar_img_model_multi_model_list, similar_img_model_all_text_list \
+            = self.__encode_and_search(embed_mixed_image, embed_all_text, cosine_similarity, img_count)
+        return similar_img_model_multi_model_list, similar_img_model_all_text_list, mixed_img_file_path
+
+    def search_hybrid(self, text: str, cosine_similarity: float | None, img_count: int) -> list[SimilarImgModel]:
+        """ 混合检索：多模态特征向量、文本特征向量和OCR全文检索三路同时执行，每路多取出若干倍的结果，
+        再按倒数排名融合（RRF）合并为一个去重后的列表。
+
+        Args:
+            text: 查询文本
+            cosine_similarity: 向量检索的相似度阈值，为None时不过滤
+            img_count: 最多返回的图片数量
+
+        Returns:
+            按融合得分降序排列的结果
+        """
+        fetch_count = img_count * ImgSearchService.HYBRID_FETCH_FACTOR
+        futures = {
+            "image_vector": self.encodeExecutor.submit(
+                lambda: self.__search(self.__embed_text_by_clip(text), cosine_similarity, fetch_count, "image_vector")),
+            "all_text_vector": self.encodeExecutor.submit(
+                lambda: self.__search(self.__embed_text_by_qwen(text), cosine_similarity, fetch_count, "all_text_vector")),
+            "ocr_text": self.encodeExecutor.submit(self.__search_by_ocr_text, text, fetch_count),
+        }
+        return ImgSearchService.__fuse_by_rrf({name: future.result() for name, future in futures.items()}, img_count)
+
+    def __embed_text_by_clip(self, text: str) -> ndarray:
+        # 重复的查询文本直接使用缓存的特征向量
+        return self.embeddingCache.get_or_compute(self.chineseClip.modelName, self.chineseClip.modelVersion, text,
+                                                  self.chineseClip.embed_text_to_vec)
+
+    def __embed_text_by_qwen(self, text: str) -> ndarray:
+        return self.embeddingCache.get_or_compute(self.qwenEmbedding.modelName, self.qwenEmbedding.modelVersion, text,
+                                                  self.qwenEmbedding.embed_to_vector)
+
+    def __encode_and_search(self, image_vector_func: Callable[[], ndarray], all_text_vector_func: Callable[[], ndarray],
+                            cosine_similarity: float | None, img_count: int):
+        """ 两个互不依赖的编码分支同时执行，每个分支得到查询向量后立即使用独立的数据库连接检索。
+
+        Args:
+            image_vector_func: 计算多模态（图片）特征向量
+            all_text_vector_func: 计算文本特征向量
+            cosine_similarity: 相似度阈值，为None时不过滤
+            img_count: 每组最多返回的图片数量
+
+        Returns:
+            (按图片特征向量检索的结果, 按文本特征向量检索的结果)
+        """
+        image_future = self.encodeExecutor.submit(
+            lambda: self.__search(image_vector_func(), cosine_similarity, img_count, "image_vector"))
+        all_text_future = self.encodeExecutor.submit(
+            lambda: self.__search(all_text_vector_func(), cosine_similarity, img_count, "all_text_vector"))
+        return image_future.result(), all_text_future.result()
+
+    def __search(self, vector: ndarray, cosine_similarity: float | None, img_count: int, column: str) -> list[SimilarImgModel]:
+        if self.localVectorIndex:
+            image_info_do_list = self.localVectorIndex.search(column, vector, cosine_similarity, img_count)
+        else:
+            with self.Session() as session:
+                image_info_mapper = self.dbBackend.create_image_info_mapper(session)
+                if column == "image_vector":
+                    image_info_do_list = image_info_mapper.search_by_image_vector(vector, cosine_similarity, img_count)
+                else:
+                    image_info_do_list = image_info_mapper.search_by_all_text_vector(vector, cosine_similarity, img_count)
+        return ImgSearchService.__to_similar_img_model_list(image_info_do_list)
+
+    def __search_by_ocr_text(self, text: str, img_count: int) -> list[SimilarImgModel]:
+        if self.dbBackend is None:
+            # 本地向量索引中没有OCR文本
+            return []
+        try:
+            with self.Session() as session:
+                image_info_do_list = self.dbBackend.create_image_info_mapper(session).search_by_ocr_text(text, img_count)
+        except Exception as e:
+            # 数据库中未配置全文检索时，只融合向量检索的结果
+            logger.warning(f"OCR全文检索失败：{e}")
+            return []
+        return ImgSearchService.__to_similar_img_model_list(image_info_do_list)
+
+    @staticmethod
+    def __fuse_by_rrf(result_dict: dict[str, list[SimilarImgModel]], img_count: int) -> list[SimilarImgModel]:
+        """ 倒数排名融合：结果在每一路中的得分为权重 / (RRF_K + 排名)，同一文件在各路中的得分相加。
+        只使用排名而不使用余弦距离，不同模型的距离不在同一尺度上，全文检索也没有距离。
+        融合后的结果不带余弦距离，展示时使用融合得分。
+        """
+        fused_dict: dict[str, SimilarImgModel] = {}
+        for name, similar_img_model_list in result_dict.items():
+            weight = ImgSearchService.HYBRID_WEIGHTS[name]
+            for rank, similar_img_model in enumerate(similar_img_model_list, start=1):
+                fused = fused_dict.get(similar_img_model.filePath)
+                if fused is None:
+                    fused = SimilarImgModel(similar_img_model.filePath, similar_img_model.fileName, None,
+                                            similar_img_model.fileSha256, 0.0)
+                    fused_dict[similar_img_model.filePath] = fused
+                fused.score += weight / (ImgSearchService.RRF_K + rank)
+        return sorted(fused_dict.values(), key=lambda fused: fused.score, reverse=True)[:img_count]
+
+    def __sync_local_index(self, sync_interval: float):
+        db_backend = DBBackend.get_instance()
+        while True:
+            time.sleep(sync_interval)
+            try:
+                with db_backend.Session() as session:
+                    added_count, deleted_count = self.localVectorIndex.sync_from_db(db_backend.create_image_info_mapper(session))
+                if added_count or deleted_count:
+                    logger.info(f"本地向量索引已同步：新增{added_count}条，删除{deleted_count}条")
+            except Exception as e:
+                logger.error(e, exc_info=True)
+
+    @staticmethod
+    def __to_similar_img_model_list(image_info_do_list) -> list[SimilarImgModel]:
+        return [SimilarImgModel(image_info_do.file_path, image_info_do.file_name, image_info_do.cosine_distance,
+                                image_info_do.file_sha256)
+                for image_info_do in image_info_do_list]
@@ -0,0 +1,270 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+ingest_service.py
+"""
+import io
+import os
+from threading import Lock
+
+from PIL import Image
+
+from src.app.ai.chinese_clip import ChineseClip
+from src.app.ai.paddle_ocr_util import PaddleOCRUtil, PaddleOCRPool
+from src.app.ai.qwen_embedding import QwenEmbedding
+from src.app.db.db_backend import DBBackend
+from src.app.db.mapper.image_info_store import ImageInfoStore
+from src.app.db.models.image_file_status import ImageFileStatus
+from src.app.log.logger import logger
+from src.app.utils.file_util import FileUtil, FileInfo
+from src.app.utils.image_util import ImageUtil
+from src.app.utils.sha256_util import Sha256Util
+from src.app.utils.staged_pipeline import StagedPipeline
+from src.app.utils.string_util import StringUtil
+
+
+class IngestItem:
+    """单个文件在入库流程中的中间结果。文件只读取、解码一次，解码后的图片供所有模型共用。"""
+
+    def __init__(self, file_info: FileInfo, file_sha256: str, image: Image.Image | None, file_status: ImageFileStatus | None):
+        self.fileInfo: FileInfo = file_info
+        self.fileSha256: str = file_sha256
+        self.image: Image.Image | None = image
+        # 没有解码后的图片时表示文件内容未变化，只需要更新文件大小和修改时间
+        self.touchOnly: bool = image is None
+        # 数据库中该路径已有记录的主键
+        self.existingId: int | None = file_status.id if file_status else None
+        # 已有记录的文件内容未变化时原地补全缺少的列，保留主键和人工标签；内容变化时在同一事务中删除后重新插入
+        self.sameContent: bool = file_status is not None and file_status.fileSha256 == file_sha256
+        self.tagText: str | None = file_status.tagText if self.sameContent else None
+        # 需要写入的模型结果列
+        self.missingColumns: list[str] = ["image_vector", "ocr_text", "all_text_vector"]
+        if self.sameContent:
+            self.missingColumns = [column for column, has_column in (("image_vector", file_status.hasImageVector),
+                                                                     ("ocr_text", file_status.hasOcrText),
+                                                                     ("all_text_vector", file_status.hasAllTextVector))
+                                   if not has_column]
+            # 重新识别OCR文本后，文本特征向量也需要重新计算
+            if "ocr_text" in self.missingColumns and "all_text_vector" not in self.missingColumns:
+                self.missingColumns.append("all_text_vector")
+        self.imageVector = None
+        self.ocrText: str | None = None
+        self.allTextVector = None
+
+
+class IngestService:
+    _instance = None
+    _lock = Lock()
+    # 每批送入模型的文件数量
+    BATCH_SIZE = 32
+    # 读取、解码文件的线程数，图库位于网络存储时可以适当调大
+    READ_WORKERS = 8
+    # 已解码、等待推理的图片数量上限
+    QUEUE_SIZE = 64
+    # OCR工作进程数，小于等于1时在当前进程中逐张识别
+    OCR_WORKERS = 8
+    # 每个OCR工作进程内的计算线程数
+    OCR_CPU_THREADS = 4
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance:
+            return cls._instance
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = IngestService()
+        return cls._instance
+
+    def __init__(self):
+        self.chineseClip = ChineseClip.get_instance()
+        if IngestService.OCR_WORKERS > 1:
+            self.ocrUtil = None
+            self.ocrPool = PaddleOCRPool(IngestService.OCR_WORKERS, IngestService.OCR_CPU_THREADS)
+        else:
+            self.ocrUtil = PaddleOCRUtil.get_instance()
+            self.ocrPool = None
+        self.qwenEmbedding = QwenEmbedding.get_instance()
+        self.dbBackend = DBBackend.get_instance()
+        self.Session = self.dbBackend.Session
+
+    def ingest(self, path: str):
+        """ 将指定目录（包括子目录）的所有图片一次性入库：基本信息、图片特征向量、OCR文本、文本特征向量。
+
+        Args:
+            path: 图库目录
+        """
+        # 遍历path文件夹中所有文件，并添加到文件列表
+        file_info_list = FileUtil.find_all_files_list(path)
+        self.ingest_file_info_list(file_info_list, os.path.abspath(path) + os.sep)
+
+    def ingest_file_info_list(self, file_info_list: list[FileInfo], path_prefix: str | None = None):
+        """ 将指定的文件入库，已完整入库且未变化的文件将被跳过。
+
+        Args:
+            file_info_list: 待入库的文件列表
+            path_prefix: 文件列表所在的目录，以路径分隔符结尾。不为None时按目录读取数据库中的文件状态，否则只读取列表中文件的状态
+        """
+        if not file_info_list:
+            return
+        with self.Session() as session:
+            image_info_mapper = self.dbBackend.create_image_info_mapper(session)
+            # 一次性读取数据库中文件的状态，读取线程无需访问数据库
+            if path_prefix is not None:
+                file_status_dict = image_info_mapper.query_file_status_dict(path_prefix)
+            else:
+                file_status_dict = image_info_mapper.query_file_status_dict(
+                    file_paths=[file_info.sourcePath for file_info in file_info_list])
+            # 读取解码、模型推理、写库三个阶段重叠执行。session只在写库线程中使用
+            pipeline = StagedPipeline(read_func=lambda file_info: IngestService.__read_file(file_status_dict, file_info),
+                                      infer_func=self.__infer,
+                                      write_func=lambda ingest_item_list: IngestService.__write(image_info_mapper, ingest_item_list),
+                                      read_workers=IngestService.READ_WORKERS,
+                                      queue_size=IngestService.QUEUE_SIZE,
+                                      batch_size=IngestService.BATCH_SIZE)
+            pipeline.run(file_info_list)
+
+    @staticmethod
+    def __read_file(file_status_dict: dict[str, ImageFileStatus], file_info: FileInfo) -> IngestItem | None:
+        file_path = file_info.sourcePath
+        logger.info(f"初始化：{file_path}")
+        file_status = file_status_dict.get(file_path)
+        # 数据库中已存在该文件、数据完整，且文件大小和修改时间未变化，则不读取文件直接跳过
+        if file_status and file_status.isComplete and file_status.is_same_file(file_info.size, file_info.mtime):
+            logger.info(f"图片已初始化过：{file_path}")
+            return None
+        try:
+            # 文件只读取一次，sha256和图片解码都使用同一份数据
+            with open(file_path, "rb") as f:
+                data = f.read()
+            file_sha256 = Sha256Util.sha256_bytes(data)
+            # 文件内容未变化且数据完整，只需要更新文件大小和修改时间
+            if file_status and file_status.isComplete and file_status.fileSha256 == file_sha256:
+                logger.info(f"图片已初始化过：{file_path}")
+                return IngestItem(file_info, file_sha256, None, file_status)
+
+            with Image.open(io.BytesIO(data)) as image:
+                # 读取图片的拍摄时间，如果不存在或者图片异常则使用修改时间。
+                photo_date = ImageUtil.get_photo_date_by_image(image)
+                rgb_image = image.convert("RGB")
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            logger.error(f"处理异常，跳过：{file_path}")
+            return None
+        if photo_date:
+            file_info.modifiedTime = photo_date
+            logger.info(f"使用文件拍摄时间：{file_info.modifiedTime}")
+        return IngestItem(file_info, file_sha256, rgb_image, file_status)
+
+    def __infer(self, ingest_item_list: list[IngestItem]) -> list[IngestItem]:
+        touched_item_list = [ingest_item for ingest_item in ingest_item_list if ingest_item.touchOnly]
+        ingest_item_list = [ingest_item for ingest_item in ingest_item_list if not ingest_item.touchOnly]
+        if not ingest_item_list:
+            return touched_item_list
+        # 同一批中内容相同的文件只计算一次；数据库中已有相同内容的记录时，直接复用其结果
+        unique_item_dict = {}
+        for ingest_item in ingest_item_list:
+            unique_item_dict.setdefault(ingest_item.fileSha256, ingest_item)
+        unique_item_list = list(unique_item_dict.values())
+        with self.Session() as session:
+            reusable_dict = self.dbBackend.create_image_info_mapper(session).query_reusable_by_file_sha256_list(list(unique_item_dict.keys()))
+        for ingest_item in unique_item_list:
+            reusable = reusable_dict.get(ingest_item.fileSha256)
+            if reusable:
+                logger.info(f"复用相同内容图片的结果：{ingest_item.fileInfo.sourcePath}")
+                ingest_item.imageVector = reusable.imageVector
+                ingest_item.ocrText = reusable.ocrText
+                ingest_item.allTextVector = reusable.allTextVector
+
+        # 计算图片特征向量
+        embed_item_list = [ingest_item for ingest_item in unique_item_list if ingest_item.imageVector is None]
+        if embed_item_list:
+            image_vectors = self.chineseClip.embed_images_to_vec([ingest_item.image for ingest_item in embed_item_list])
+            for ingest_item, image_vector in zip(embed_item_list, image_vectors):
+                ingest_item.imageVector = image_vector
+        # 从图片中识别文字OCR
+        ocr_item_list = [ingest_item for ingest_item in unique_item_list if ingest_item.ocrText is None]
+        for ingest_item, ocr_texts in zip(ocr_item_list, self.__recognize([ingest_item.image for ingest_item in ocr_item_list])):
+            if ocr_texts is None:
+                # 图片特征向量仍然写入，OCR文本和文本特征向量留空，由run_worker.py或run_init_ocr_text.py补全。
+                # 跳过整条记录会使该文件在每次同步时都被重新读取和推理
+                logger.error(f"OCR异常，OCR文本留空：{ingest_item.fileInfo.sourcePath}")
+                continue
+            ingest_item.ocrText = ",".join(ocr_texts)
+            # OCR文本是重新识别的，复用的文本特征向量不再适用
+            ingest_item.allTextVector = None
+        for ingest_item in ingest_item_list:
+            unique_item = unique_item_dict[ingest_item.fileSha256]
+            ingest_item.imageVector = unique_item.imageVector
+            ingest_item.ocrText = unique_item.ocrText
+            # 复用的文本特征向量来自没有人工标签的记录，有标签的记录需要按自己的标签重新计算
+            ingest_item.allTextVector = unique_item.allTextVector if ingest_item.tagText is None else None
+            # 推理完成后不再需要解码后的图片，尽早释放内存
+            ingest_item.image = None
+        # 计算所有文本的特征向量，文本相同的文件只计算一次
+        text_item_list = [ingest_item for ingest_item in ingest_item_list
+                          if ingest_item.ocrText is not None and ingest_item.allTextVector is None
+                          and "all_text_vector" in ingest_item.missingColumns]
+        if text_item_list:
+            all_text_dict = {}
+            for ingest_item in text_item_list:
+                all_text_dict.setdefault(StringUtil.concat(ingest_item.tagText, ",", ingest_item.ocrText), []).append(ingest_item)
+            all_text_vectors = self.qwenEmbedding.embed_to_vectors(list(all_text_dict.keys()))
+            for all_text_item_list, all_text_vector in zip(all_text_dict.values(), all_text_vectors):
+                for ingest_item in all_text_item_list:
+                    ingest_item.allTextVector = all_text_vector
+        return touched_item_list + ingest_item_list
+
+    def __recognize(self, images: list) -> list[list[str] | None]:
+        if self.ocrPool:
+            return self.ocrPool.recognize_batch(images)
+        results = []
+        for image in images:
+            try:
+                results.append(self.ocrUtil.recognize(image))
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                results.append(None)
+        return results
+
+    @staticmethod
+    def __write(image_info_mapper: ImageInfoStore, ingest_item_list: list[IngestItem]):
+        # 文件内容未变化的记录只更新文件大小和修改时间
+        image_info_mapper.update_batch_by_id([(ingest_item.existingId, {"file_size": ingest_item.fileInfo.size,
+                                                                         "file_mtime": ingest_item.fileInfo.mtime})
+                                              for ingest_item in ingest_item_list if ingest_item.touchOnly])
+        ingest_item_list = [ingest_item for ingest_item in ingest_item_list if not ingest_item.touchOnly]
+        # 文件内容未变化的不完整记录只补全缺少的列，按列的组合分组后批量更新
+        update_dict = {}
+        for ingest_item in ingest_item_list:
+            if ingest_item.sameContent:
+                result_dict = {"image_vector": ingest_item.imageVector,
+                               "ocr_text": ingest_item.ocrText,
+                               "all_text_vector": ingest_item.allTextVector}
+                values = {"file_size": ingest_item.fileInfo.size, "file_mtime": ingest_item.fileInfo.mtime}
+                # OCR异常时不写入空值，保留已有的文本特征向量
+                values.update({column: result_dict[column] for column in ingest_item.missingColumns
+                               if result_dict[column] is not None})
+                update_dict.setdefault(tuple(values.keys()), []).append((ingest_item.existingId, values))
+        for id_values_list in update_dict.values():
+            image_info_mapper.update_batch_by_id(id_values_list)
+        image_info_list = []
+        for ingest_item in ingest_item_list:
+            if ingest_item.sameContent:
+                continue
+            file_info = ingest_item.fileInfo
+            image_info_list.append({"file_gmt_modified": file_info.modifiedTime,
+                                    "file_path": file_info.sourcePath,
+                                    "file_name": file_info.get_full_name(),
+                                    "file_sha256": ingest_item.fileSha256,
+                                    "file_size": file_info.size,
+                                    "file_mtime": file_info.mtime,
+                                    "ocr_text": ingest_item.ocrText,
+                                    "image_vector": ingest_item.imageVector,
+                                    "all_text_vector": ingest_item.allTextVector})
+        # 文件内容已变化的记录与新记录在同一个事务中替换，整批只提交一次
+        delete_ids = [ingest_item.existingId for ingest_item in ingest_item_list
+                      if ingest_item.existingId is not None and not ingest_item.sameContent]
+        image_info_mapper.insert_batch(image_info_list, delete_ids)
+        for ingest_item in ingest_item_list:
+            logger.info(f"写表成功:{ingest_item.fileInfo.sourcePath}")
@@ -0,0 +1,207 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+watch_service.py
+"""
+import os
+import time
+from threading import Lock
+
+from src.app.log.logger import logger
+from src.app.service.ingest_service import IngestService
+from src.app.utils.file_sync_util import FileSyncUtil
+from src.app.utils.file_util import FileUtil
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class WatchService:
+    """ 持续监听图库目录，只将发生变化的文件送入入库流程。
+
+    - 监听模式：使用watchdog接收文件系统事件，同一路径在DEBOUNCE_SECONDS内的多次事件合并为一次处理；
+    - 轮询模式：每隔POLL_INTERVAL遍历一次目录，与数据库快照比较。适用于网络存储等收不到文件系统事件的目录，
+      未安装watchdog时也使用该模式。
+
+    启动时先与数据库同步一次，补上监听停止期间发生的变化。
+    """
+    # 同一路径最后一次事件之后等待的秒数，避免处理写入到一半的文件
+    DEBOUNCE_SECONDS = 2.0
+    # 轮询模式下两次遍历目录的间隔秒数
+    POLL_INTERVAL = 30.0
+    # 监听模式下检查待处理事件的间隔秒数
+    FLUSH_INTERVAL = 0.5
+    # 下载、编辑过程中的临时文件，不处理
+    IGNORED_SUFFIXES = (".tmp", ".part", ".crdownload", ".download", ".swp")
+
+    def __init__(self, paths: list[str], use_polling: bool = False):
+        self.paths = [os.path.abspath(path) for path in paths]
+        if not use_polling and Observer is None:
+            logger.warning("未安装watchdog，使用轮询模式监听目录")
+            use_polling = True
+        self.usePolling = use_polling
+        self.ingestService = IngestService.get_instance()
+        self.dbBackend = self.ingestService.dbBackend
+        self.Session = self.ingestService.Session
+        self.lock = Lock()
+        # 路径 -> 最后一次事件的时间
+        self.pendingPaths: dict[str, float] = {}
+        # (原路径, 新路径) -> 最后一次事件的时间
+        self.pendingMoves: dict[tuple[str, str], float] = {}
+
+    def run(self):
+        for path in self.paths:
+            self.__sync(path, include_incomplete=True)
+        if self.usePolling:
+            self.__run_polling()
+        else:
+            self.__run_watching()
+
+    def record_path(self, path: str):
+        if WatchService.__is_ignored(path):
+            return
+        with self.lock:
+            self.pendingPaths[path] = time.monotonic()
+
+    def record_move(self, src_path: str, dest_path: str):
+        # 临时文件改名为正式文件时按新增处理，正式文件改名为临时文件时按删除处理
+        if WatchService.__is_ignored(src_path):
+            self.record_path(dest_path)
+            return
+        if WatchService.__is_ignored(dest_path):
+            self.record_path(src_path)
+            return
+        with self.lock:
+            self.pendingMoves[(src_path, dest_path)] = time.monotonic()
+
+    def __run_polling(self):
+        logger.info(f"轮询模式，每{WatchService.POLL_INTERVAL}秒检查一次：{self.paths}")
+        while True:
+            time.sleep(WatchService.POLL_INTERVAL)
+            for path in self.paths:
+                try:
+                    self.__sync(path)
+                except Exception as e:
+                    logger.error(e, exc_info=True)
+
+    def __run_watching(self):
+        observer = Observer()
+        event_handler = _WatchEventHandler(self)
+        for path in self.paths:
+            observer.schedule(event_handler, path, recursive=True)
+        observer.start()
+        logger.info(f"监听模式：{self.paths}")
+        try:
+            while True:
+                time.sleep(WatchService.FLUSH_INTERVAL)
+                try:
+                    self.__flush()
+                except Exception as e:
+                    logger.error(e, exc_info=True)
+        finally:
+            observer.stop()
+            observer.join()
+
+    def __flush(self):
+        # 取出已经超过防抖时间的事件，仍在频繁变化的路径留到下次处理
+        deadline = time.monotonic() - WatchService.DEBOUNCE_SECONDS
+        with self.lock:
+            ready_moves = [move for move, event_time in self.pendingMoves.items() if event_time <= deadline]
+            for move in ready_moves:
+                del self.pendingMoves[move]
+            ready_paths = {path for path, event_time in self.pendingPaths.items() if event_time <= deadline}
+            for path in ready_paths:
+                del self.pendingPaths[path]
+        if not ready_moves and not ready_paths:
+            return
+
+        file_info_dict = {}
+        with self.Session() as session:
+            image_info_mapper = self.dbBackend.create_image_info_mapper(session)
+            for src_path, dest_path in ready_moves:
+                if not os.path.exists(src_path) and os.path.exists(dest_path):
+                    # 文件内容不变，只修改记录中的路径
+                    moved_count = image_info_mapper.move_file_path(src_path, dest_path, os.sep)
+                    logger.info(f"移动文件：{src_path} -> {dest_path}，修改记录{moved_count}条")
+                else:
+                    ready_paths.add(src_path)
+                # 新路径仍然送入入库流程，未变化的文件会被跳过，未入库的文件（例如移动前尚未处理）会被补上
+                ready_paths.add(dest_path)
+
+            deleted_path_list = []
+            for path in sorted(ready_paths):
+                if os.path.isdir(path):
+                    for file_info in FileUtil.find_all_files_list(path):
+                        file_info_dict[file_info.sourcePath] = file_info
+                    continue
+                try:
+                    file_info_dict[path] = FileUtil.get_file_info(path)
+                except OSError:
+                    deleted_path_list.append(path)
+            if deleted_path_list:
+                logger.info(f"删除记录：{deleted_path_list}")
+                image_info_mapper.delete_batch_by_file_path(deleted_path_list, os.sep)
+
+        file_info_list = [file_info for file_info in file_info_dict.values() if not WatchService.__is_ignored(file_info.sourcePath)]
+        self.ingestService.ingest_file_info_list(file_info_list)
+
+    def __sync(self, path: str, include_incomplete: bool = False):
+        """ 遍历目录并与数据库快照比较：删除已不存在的文件的记录，将新增、变化的文件送入入库流程。
+
+        Args:
+            path: 图库目录
+            include_incomplete: 是否同时补全未变化、但未完整入库的文件。只在启动时补全一次，
+                OCR持续失败的文件不会在每次轮询时被重新推理，缺少的结果由run_worker.py等补全
+        """
+        file_info_list = FileUtil.find_all_files_list(path)
+        with self.Session() as session:
+            image_info_mapper = self.dbBackend.create_image_info_mapper(session)
+            file_status_dict = image_info_mapper.query_file_status_dict(path + os.sep)
+            sync_result = FileSyncUtil.diff(file_info_list, file_status_dict)
+            if sync_result.vanishedIdList:
+                logger.info(f"删除已不存在的文件的记录：{len(sync_result.vanishedIdList)}条")
+                image_info_mapper.delete_batch_by_id(sync_result.vanishedIdList)
+        incomplete_file_info_list = [file_info for file_info in file_info_list
+                                     if include_incomplete and file_info.sourcePath in file_status_dict
+                                     and not file_status_dict[file_info.sourcePath].isComplete
+                                     and file_status_dict[file_info.sourcePath].is_same_file(file_info.size, file_info.mtime)]
+        file_info_list = [file_info for file_info in
+                          sync_result.addedFileInfoList + sync_result.changedFileInfoList + incomplete_file_info_list
+                          if not WatchService.__is_ignored(file_info.sourcePath)]
+        self.ingestService.ingest_file_info_list(file_info_list)
+
+    @staticmethod
+    def __is_ignored(path: str) -> bool:
+        file_name = os.path.basename(path)
+        return file_name.startswith(".") or file_name.lower().endswith(WatchService.IGNORED_SUFFIXES)
+
+
+class _WatchEventHandler(FileSystemEventHandler):
+    """ 只记录事件，实际处理由WatchService在防抖时间后统一执行。"""
+
+    def __init__(self, watch_service: WatchService):
+        super().__init__()
+        self.watchService = watch_service
+
+    def on_created(self, event):
+        self.watchService.record_path(event.src_path)
+
+    def on_modified(self, event):
+        # 目录的修改事件只表示目录下的文件有变化，文件本身的事件会单独收到
+        if event.is_directory:
+            return
+        self.watchService.record_path(event.src_path)
+
+    def on_closed(self, event):
+        self.watchService.record_path(event.src_path)
+
+    def on_deleted(self, event):
+        self.watchService.record_path(event.src_path)
+
+    def on_moved(self, event):
+        self.watchService.record_move(event.src_path, event.dest_path)
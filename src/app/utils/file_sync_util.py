@@ -0,0 +1,46 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+file_sync_util.py
+"""
+from src.app.db.models.image_file_status import ImageFileStatus
+from src.app.utils.file_util import FileInfo
+
+
+class FileSyncResult:
+
+    def __init__(self):
+        # 数据库中不存在的文件
+        self.addedFileInfoList: list[FileInfo] = []
+        # 数据库中已存在，但文件大小或修改时间发生变化的文件
+        self.changedFileInfoList: list[FileInfo] = []
+        # 数据库中已存在，但文件已不存在的记录主键
+        self.vanishedIdList: list[int] = []
+
+
+class FileSyncUtil:
+    @staticmethod
+    def diff(file_info_list: list[FileInfo], file_status_dict: dict[str, ImageFileStatus]) -> FileSyncResult:
+        """ 比较目录遍历结果与数据库快照，只根据(路径, 文件大小, 修改时间)判断，不读取文件内容。
+
+        Args:
+            file_info_list: 目录遍历得到的文件列表
+            file_status_dict: 数据库中同一目录下的文件状态快照
+
+        Returns:
+            新增、变化的文件，以及已消失的文件对应的记录主键
+        """
+        result = FileSyncResult()
+        file_path_set = set()
+        for file_info in file_info_list:
+            file_path_set.add(file_info.sourcePath)
+            file_status = file_status_dict.get(file_info.sourcePath)
+            if file_status is None:
+                result.addedFileInfoList.append(file_info)
+            elif not file_status.is_same_file(file_info.size, file_info.mtime):
+                result.changedFileInfoList.append(file_info)
+        for file_path, file_status in file_status_dict.items():
+            if file_path not in file_path_set:
+                result.vanishedIdList.append(file_status.id)
+        return result
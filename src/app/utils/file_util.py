@@ -17,18 +17,26 @@ class FileUtil:
         file_info_list = []
         for file_dir, dirs, file_names in os.walk(path):
             for file_name in file_names:
-                file_info = FileInfo()
                 source_path = os.path.abspath(os.path.join(file_dir, file_name))
                 logger.info("遍历文件：%s", source_path)
-                name, ext = os.path.splitext(file_name)
-                file_info.sourcePath = source_path
-                file_info.name = name
-                file_info.ext = ext.lstrip(".")
-                file_info.createTime = datetime.fromtimestamp(os.path.getctime(source_path))
-                file_info.modifiedTime = datetime.fromtimestamp(os.path.getmtime(source_path))
-                file_info_list.append(file_info)
+                file_info_list.append(FileUtil.get_file_info(source_path))
         return file_info_list
 
+    @staticmethod
+    def get_file_info(path: str):
+        file_info = FileInfo()
+        source_path = os.path.abspath(path)
+        name, ext = os.path.splitext(os.path.basename(source_path))
+        file_info.sourcePath = source_path
+        file_info.name = name
+        file_info.ext = ext.lstrip(".")
+        stat_result = os.stat(source_path)
+        file_info.createTime = datetime.fromtimestamp(stat_result.st_ctime)
+        file_info.modifiedTime = datetime.fromtimestamp(stat_result.st_mtime)
+        file_info.size = stat_result.st_size
+        file_info.mtime = stat_result.st_mtime
+        return file_info
+
     @staticmethod
     def find_all_files_dict(path: str) -> list:
         file_info_list = []
@@ -53,6 +61,9 @@ class FileInfo:
         self.ext = None
         self.createTime = None
         self.modifiedTime = None
+        # 文件大小（字节）和文件系统中的修改时间（时间戳）。modifiedTime可能被替换为拍摄时间，而mtime始终是文件系统中的值
+        self.size = None
+        self.mtime = None
         self.sha256 = None
         self.status = FileStatusEnum.NORMAL
 
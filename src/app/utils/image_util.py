@@ -16,7 +16,23 @@ class ImageUtil:
     @staticmethod
     def get_photo_date(image_path) -> datetime | None:
         try:
-            image = Image.open(image_path)
+            with Image.open(image_path) as image:
+                return ImageUtil.get_photo_date_by_image(image)
+        except Exception as e:
+            logger.error(e, exc_info=True)
+        return None
+
+    @staticmethod
+    def get_photo_date_by_image(image: Image.Image) -> datetime | None:
+        """ 从已打开的图片中读取拍摄时间，不会再次读取文件。
+
+        Args:
+            image: 已打开的PIL图片
+
+        Returns:
+            如果图片EXIF中存在合法的拍摄时间，返回拍摄时间，否则返回None
+        """
+        try:
             info = image.getexif()
             if info is not None:
                 for tag, value in info.items():
@@ -5,17 +5,64 @@ For full terms, see the LICENSE file.
 sha256_util.py
 """
 import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator
+
+from src.app.log.logger import logger
 
 
 class Sha256Util:
+    # 读取文件时的缓冲区大小
+    BUFFER_SIZE = 1024 * 1024
+
     @staticmethod
     def sha256_file(file_path: str) -> str:
         hash_obj = hashlib.new('sha256')
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_obj.update(chunk)
+        # 使用大缓冲区并复用，减少Python循环次数和内存分配。hashlib计算时会释放GIL
+        buffer = bytearray(Sha256Util.BUFFER_SIZE)
+        view = memoryview(buffer)
+        with open(file_path, 'rb', buffering=0) as f:
+            while size := f.readinto(buffer):
+                hash_obj.update(view[:size])
         return hash_obj.hexdigest()
 
+    @staticmethod
+    def sha256_files(file_paths: Iterable[str], max_workers: int = 8) -> Iterator[tuple[str, str | None]]:
+        """ 使用线程池并发计算多个文件的sha256。
+
+        Args:
+            file_paths: 文件路径
+            max_workers: 并发线程数。本地SSD上受CPU限制，网络存储上受延迟限制，可以适当调大
+
+        Returns:
+            按计算完成的先后顺序逐个返回(文件路径, sha256)，计算失败时sha256为None
+        """
+        file_path_iter = iter(file_paths)
+        # 同时提交的任务数量有上限，避免文件数量很多时一次性创建全部任务
+        max_pending = max_workers * 4
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sha256") as executor:
+            pending = {}
+            while True:
+                for file_path in file_path_iter:
+                    pending[executor.submit(Sha256Util.sha256_file, file_path)] = file_path
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = pending.pop(future)
+                    try:
+                        file_sha256 = future.result()
+                    except Exception as e:
+                        logger.error(e, exc_info=True)
+                        file_sha256 = None
+                    yield file_path, file_sha256
+
+    @staticmethod
+    def sha256_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
     @staticmethod
     def sha256_string(input_str: str) -> str:
         sha256_hash = hashlib.sha256()
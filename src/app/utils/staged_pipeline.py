@@ -0,0 +1,123 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+staged_pipeline.py
+"""
+import queue
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Thread, BoundedSemaphore
+from typing import Callable, Iterable
+
+from src.app.log.logger import logger
+
+
+class StagedPipeline:
+    """ 读取/解码 -> 模型推理 -> 写库 三段式流水线。
+
+    - 读取阶段：线程池并发读取、解码文件，适合慢速磁盘或网络存储；
+    - 推理阶段：在调用run的线程中按批执行，保证模型始终在同一线程中使用；
+    - 写库阶段：独立线程异步写库，不阻塞推理。
+
+    阶段之间使用有界队列连接，下游处理不过来时上游会阻塞等待，内存中同时存在的数据量有固定上限。
+    """
+    _END = object()
+
+    def __init__(self, read_func: Callable, infer_func: Callable[[list], list], write_func: Callable[[list], None],
+                 read_workers: int = 8, queue_size: int = 64, batch_size: int = 32, batch_timeout: float = 0.5):
+        """
+        Args:
+            read_func: 读取函数，入参为单个待处理对象，返回None表示跳过
+            infer_func: 推理函数，入参为读取结果列表，返回需要写库的结果列表
+            write_func: 写库函数，入参为推理结果列表
+            read_workers: 读取线程数
+            queue_size: 读取结果队列的容量
+            batch_size: 每批推理的最大数量
+            batch_timeout: 读取结果不足一批时，最多等待的秒数，超时后直接推理已有的数据
+        """
+        self.readFunc = read_func
+        self.inferFunc = infer_func
+        self.writeFunc = write_func
+        self.readWorkers = read_workers
+        self.batchSize = batch_size
+        self.batchTimeout = batch_timeout
+        self.readQueue = queue.Queue(maxsize=queue_size)
+        # 写库队列只缓存少量批次，写库慢时推理阶段随之减速
+        self.writeQueue = queue.Queue(maxsize=2)
+        # 正在读取中的数量上限，避免一次性提交全部任务
+        self.readingSemaphore = BoundedSemaphore(read_workers * 2)
+
+    def run(self, items: Iterable):
+        feeder = Thread(target=self.__feed, args=(items,), name="pipeline-reader", daemon=True)
+        writer = Thread(target=self.__write, name="pipeline-writer", daemon=True)
+        feeder.start()
+        writer.start()
+        try:
+            self.__infer()
+        finally:
+            self.writeQueue.put(StagedPipeline._END)
+            writer.join()
+        feeder.join()
+
+    def __feed(self, items: Iterable):
+        futures = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.readWorkers, thread_name_prefix="pipeline-read") as executor:
+                for item in items:
+                    self.readingSemaphore.acquire()
+                    futures.append(executor.submit(self.__read, item))
+                    # 只保留未完成的任务，避免列表无限增长
+                    futures = [future for future in futures if not future.done()]
+                wait(futures)
+        except Exception as e:
+            logger.error(e, exc_info=True)
+        finally:
+            self.readQueue.put(StagedPipeline._END)
+
+    def __read(self, item):
+        try:
+            result = self.readFunc(item)
+            if result is not None:
+                self.readQueue.put(result)
+        except Exception as e:
+            logger.error(e, exc_info=True)
+        finally:
+            self.readingSemaphore.release()
+
+    def __infer(self):
+        batch = []
+        while True:
+            try:
+                result = self.readQueue.get(timeout=self.batchTimeout if batch else None)
+            except queue.Empty:
+                # 读取速度跟不上时，不等待凑满一批
+                self.__infer_batch(batch)
+                batch = []
+                continue
+            if result is StagedPipeline._END:
+                break
+            batch.append(result)
+            if len(batch) >= self.batchSize:
+                self.__infer_batch(batch)
+                batch = []
+        if batch:
+            self.__infer_batch(batch)
+
+    def __infer_batch(self, batch: list):
+        try:
+            write_batch = self.inferFunc(batch)
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            return
+        if write_batch:
+            self.writeQueue.put(write_batch)
+
+    def __write(self):
+        while True:
+            write_batch = self.writeQueue.get()
+            if write_batch is StagedPipeline._END:
+                break
+            try:
+                self.writeFunc(write_batch)
+            except Exception as e:
+                logger.error(e, exc_info=True)
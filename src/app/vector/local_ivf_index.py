@@ -0,0 +1,512 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+local_ivf_index.py
+"""
+import json
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+from threading import Lock
+from typing import Iterable
+
+import numpy as np
+
+from src.app.db.models.image_info_result import ImageInfoResult
+from src.app.log.logger import logger
+
+
+class LocalIvfIndex:
+    """ 本地IVF-Flat近似向量索引，图片特征向量和文本特征向量各一个。
+
+    索引是一个目录：
+    - meta.json：格式版本、向量维度、精度、建立时间，以及已同步到的数据库记录修改时间；
+    - items.db：SQLite文件，保存每条记录的sha256、文件路径和文件名，以及增量写入的向量和已删除的记录；
+    - {列名}_centroids.npy：k-means聚类中心；
+    - {列名}_vectors.npy：按聚类排列的归一化向量，同一聚类的向量连续存放，以内存映射方式读取；
+    - {列名}_ids.npy、{列名}_offsets.npy：每行向量的记录主键，以及每个聚类在向量文件中的起止位置。
+
+    检索时先找出与查询向量最接近的nprobe个聚类，只计算这些聚类中的向量，nprobe越大召回率越高、速度越慢。
+    建立索引后新增的向量保存在增量区，检索时精确计算；删除或修改的记录在基础索引中标记为已删除。
+    增量区变大后执行compact合并到基础索引，数据分布明显变化后重新build。
+    """
+    FORMAT_VERSION = 1
+    VECTOR_COLUMNS = ("image_vector", "all_text_vector")
+    # 检索时默认访问的聚类数量
+    DEFAULT_NPROBE = 16
+    # k-means迭代次数，以及每个聚类参与训练的样本数
+    KMEANS_ITERATIONS = 10
+    KMEANS_SAMPLES_PER_LIST = 64
+    # 分块计算时每块的行数
+    BLOCK_ROWS = 4096
+    # SQLite单条语句中IN列表的最大长度
+    _MAX_ROWS_PER_STATEMENT = 500
+
+    def __init__(self, path: str, nprobe: int | None = None):
+        self.path = path
+        self.nprobe = nprobe or LocalIvfIndex.DEFAULT_NPROBE
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta: dict = json.load(f)
+        if self.meta["format_version"] != LocalIvfIndex.FORMAT_VERSION:
+            raise ValueError(f"不支持的索引格式：{self.meta['format_version']}")
+        self.dim = self.meta["dim"]
+        # 修改时间晚于此时间的记录尚未同步到索引，建立索引时数据库为空或索引由旧版本建立时为None
+        self.syncedGmtModified: datetime | None = (datetime.fromisoformat(self.meta["synced_gmt_modified"])
+                                                   if self.meta.get("synced_gmt_modified") else None)
+        self.centroids: dict[str, np.ndarray] = {}
+        self.vectors: dict[str, np.ndarray] = {}
+        self.ids: dict[str, np.ndarray] = {}
+        self.offsets: dict[str, np.ndarray] = {}
+        for column in LocalIvfIndex.VECTOR_COLUMNS:
+            self.centroids[column] = np.load(os.path.join(path, f"{column}_centroids.npy"))
+            self.vectors[column] = np.load(os.path.join(path, f"{column}_vectors.npy"), mmap_mode="r")
+            self.ids[column] = np.load(os.path.join(path, f"{column}_ids.npy"), mmap_mode="r")
+            self.offsets[column] = np.load(os.path.join(path, f"{column}_offsets.npy"))
+        # 按主键查询基础索引中的向量时使用，首次使用时建立
+        self.sortedIdOrders: dict[str, np.ndarray] = {}
+        # 所有修改都在self.lock内执行，检索时只读取修改后整体替换的数组
+        self.lock = Lock()
+        self.connection = sqlite3.connect(os.path.join(path, "items.db"), check_same_thread=False)
+        self.deltaIds: dict[str, np.ndarray] = {}
+        self.deltaMatrices: dict[str, np.ndarray] = {}
+        self.tombstones: dict[str, np.ndarray] = {}
+        for column in LocalIvfIndex.VECTOR_COLUMNS:
+            self.__reload_delta(column)
+        logger.info(f"已加载本地向量索引：{path}，" + "，".join(
+            f"{column}：{len(self.ids[column])}条，聚类{len(self.centroids[column])}个，增量{len(self.deltaIds[column])}条"
+            for column in LocalIvfIndex.VECTOR_COLUMNS))
+
+    def search(self, column: str, vector, cosine_similarity: float | None, limit: int,
+               nprobe: int | None = None) -> list[ImageInfoResult]:
+        """ 近似检索最相似的记录。
+
+        Args:
+            column: image_vector或all_text_vector
+            vector: 查询向量
+            cosine_similarity: 相似度阈值，为None时不过滤
+            limit: 最多返回的记录数量
+            nprobe: 本次检索访问的聚类数量，为None时使用默认值
+
+        Returns:
+            按余弦距离升序排列的结果
+        """
+        query = LocalIvfIndex.__normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        with self.lock:
+            delta_ids = self.deltaIds[column]
+            delta_matrix = self.deltaMatrices[column]
+            tombstones = self.tombstones[column]
+        candidate_ids = []
+        candidate_scores = []
+        centroids = self.centroids[column]
+        if len(centroids) > 0:
+            nprobe = min(nprobe or self.nprobe, len(centroids))
+            lists = np.sort(np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe])
+            offsets = self.offsets[column]
+            for list_no in lists:
+                start, end = offsets[list_no], offsets[list_no + 1]
+                if end > start:
+                    candidate_ids.append(np.asarray(self.ids[column][start:end]))
+                    candidate_scores.append(np.asarray(self.vectors[column][start:end], dtype=np.float32) @ query)
+        if candidate_ids and len(tombstones) > 0:
+            for i in range(len(candidate_ids)):
+                alive = ~np.isin(candidate_ids[i], tombstones)
+                candidate_ids[i] = candidate_ids[i][alive]
+                candidate_scores[i] = candidate_scores[i][alive]
+        if len(delta_ids) > 0:
+            candidate_ids.append(delta_ids)
+            candidate_scores.append(delta_matrix @ query)
+        if not candidate_ids:
+            return []
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        ids, scores = ids[order], scores[order]
+        if cosine_similarity is not None:
+            keep = 1 - scores < 1 - cosine_similarity
+            ids, scores = ids[keep], scores[keep]
+        item_dict = self.__query_items([int(id) for id in ids])
+        return [ImageInfoResult(id=int(id), file_sha256=item_dict[int(id)][0], file_path=item_dict[int(id)][1],
+                                file_name=item_dict[int(id)][2], cosine_distance=float(1 - score))
+                for id, score in zip(ids, scores) if int(id) in item_dict]
+
+    def query_vectors(self, id: int | None = None, file_sha256: str | None = None) -> tuple | None:
+        """ 按主键或文件sha256查询索引中的图片特征向量和文本特征向量。
+
+        Returns:
+            (图片特征向量, 文本特征向量)，记录不存在或向量不完整时返回None
+        """
+        if id is not None:
+            id_list = [id]
+        else:
+            with self.lock:
+                id_list = [row[0] for row in self.connection.execute(
+                    "SELECT id FROM items WHERE file_sha256 = ? ORDER BY id", (file_sha256,))]
+        for id in id_list:
+            vectors = tuple(self.__query_vector(column, id) for column in LocalIvfIndex.VECTOR_COLUMNS)
+            if all(vector is not None for vector in vectors):
+                return vectors
+        return None
+
+    def add_batch(self, rows: Iterable[tuple]):
+        """ 增量写入记录，已存在的记录会被替换。
+
+        Args:
+            rows: (主键, sha256, 文件路径, 文件名, 图片特征向量, 文本特征向量)，向量为None时该列保持不变
+        """
+        with self.lock:
+            changed_columns = set()
+            for id, file_sha256, file_path, file_name, *vectors in rows:
+                self.connection.execute("INSERT OR REPLACE INTO items (id, file_sha256, file_path, file_name) VALUES (?, ?, ?, ?)",
+                                        (id, file_sha256, file_path, file_name))
+                for column, vector in zip(LocalIvfIndex.VECTOR_COLUMNS, vectors):
+                    if vector is None:
+                        continue
+                    vector = LocalIvfIndex.__normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+                    # 基础索引中的旧向量标记为已删除，新向量写入增量区
+                    self.connection.execute("INSERT OR IGNORE INTO tombstones (id, column_name) VALUES (?, ?)", (id, column))
+                    self.connection.execute("INSERT OR REPLACE INTO delta_vectors (id, column_name, vector) VALUES (?, ?, ?)",
+                                            (id, column, vector.tobytes()))
+                    changed_columns.add(column)
+            self.connection.commit()
+            for column in changed_columns:
+                self.__reload_delta(column)
+
+    def delete_batch(self, ids: list[int], columns: Iterable[str] = VECTOR_COLUMNS):
+        """ 删除记录在指定列上的向量。所有列的向量都被删除时，同时删除记录的文件信息。"""
+        if not ids:
+            return
+        columns = list(columns)
+        with self.lock:
+            for column in columns:
+                self.connection.executemany("INSERT OR IGNORE INTO tombstones (id, column_name) VALUES (?, ?)",
+                                            [(id, column) for id in ids])
+                self.connection.executemany("DELETE FROM delta_vectors WHERE id = ? AND column_name = ?",
+                                            [(id, column) for id in ids])
+            if set(columns) == set(LocalIvfIndex.VECTOR_COLUMNS):
+                self.connection.executemany("DELETE FROM items WHERE id = ?", [(id,) for id in ids])
+            self.connection.commit()
+            for column in columns:
+                self.__reload_delta(column)
+
+    def sync_from_db(self, image_info_mapper) -> tuple[int, int]:
+        """ 与数据库比较，将新增、向量新计算完成的记录写入增量区，删除数据库中已不存在或向量已被清空的记录。
+        原地修改的记录（移动路径、打标后重新计算文本特征向量等）按修改时间发现，重新写入增量区。
+
+        Args:
+            image_info_mapper: ImageInfoMapper
+
+        Returns:
+            (写入的记录数量, 删除的记录数量)
+        """
+        db_ids = []
+        db_flags = []
+        changed_ids = []
+        synced_gmt_modified = self.syncedGmtModified
+        for id, gmt_modified, *flags in image_info_mapper.scan_columns(["id", "gmt_modified"], list(LocalIvfIndex.VECTOR_COLUMNS)):
+            db_ids.append(id)
+            db_flags.append(flags)
+            if gmt_modified is None:
+                continue
+            if self.syncedGmtModified is not None and gmt_modified > self.syncedGmtModified:
+                changed_ids.append(id)
+            if synced_gmt_modified is None or gmt_modified > synced_gmt_modified:
+                synced_gmt_modified = gmt_modified
+        db_ids = np.array(db_ids, dtype=np.int64)
+        db_flags = np.array(db_flags, dtype=bool).reshape(len(db_ids), len(LocalIvfIndex.VECTOR_COLUMNS))
+        present_ids = {}
+        for column in LocalIvfIndex.VECTOR_COLUMNS:
+            with self.lock:
+                base_ids = np.asarray(self.ids[column])
+                present_ids[column] = np.union1d(base_ids[~np.isin(base_ids, self.tombstones[column])], self.deltaIds[column])
+        # 数据库中已不存在的记录
+        removed_ids = np.setdiff1d(np.union1d(*present_ids.values()), db_ids)
+        self.delete_batch(removed_ids.tolist())
+        deleted_count = len(removed_ids)
+        add_ids = set()
+        for i, column in enumerate(LocalIvfIndex.VECTOR_COLUMNS):
+            # 数据库中该列已被清空的记录，例如强制刷新
+            cleared_ids = np.intersect1d(np.setdiff1d(present_ids[column], db_ids[db_flags[:, i]]), db_ids)
+            self.delete_batch(cleared_ids.tolist(), [column])
+            deleted_count += len(cleared_ids)
+            add_ids.update(np.setdiff1d(db_ids[db_flags[:, i]], present_ids[column]).tolist())
+        # 已在索引中、上次同步后被原地修改的记录重新写入，旧向量被标记为已删除
+        add_ids.update(np.intersect1d(changed_ids, np.union1d(*present_ids.values())).tolist())
+        add_ids = sorted(add_ids)
+        for start in range(0, len(add_ids), LocalIvfIndex._MAX_ROWS_PER_STATEMENT):
+            image_info_do_list = image_info_mapper.query_by_id_list(add_ids[start:start + LocalIvfIndex._MAX_ROWS_PER_STATEMENT])
+            self.add_batch([(image_info_do.id, image_info_do.file_sha256, image_info_do.file_path, image_info_do.file_name,
+                             image_info_do.image_vector, image_info_do.all_text_vector)
+                            for image_info_do in image_info_do_list])
+        if synced_gmt_modified != self.syncedGmtModified:
+            if "synced_gmt_modified" not in self.meta:
+                logger.warning("索引由旧版本建立，此前原地修改的记录未同步，需要重新build")
+            self.syncedGmtModified = synced_gmt_modified
+            self.meta["synced_gmt_modified"] = synced_gmt_modified.isoformat()
+            LocalIvfIndex.__save_meta(self.path, self.meta)
+        return len(add_ids), deleted_count
+
+    def close(self):
+        self.connection.close()
+
+    def __query_vector(self, column: str, id: int) -> np.ndarray | None:
+        with self.lock:
+            delta_ids = self.deltaIds[column]
+            delta_matrix = self.deltaMatrices[column]
+            tombstones = self.tombstones[column]
+        delta_rows = np.flatnonzero(delta_ids == id)
+        if len(delta_rows) > 0:
+            return delta_matrix[delta_rows[0]].copy()
+        if np.isin(id, tombstones):
+            return None
+        ids = self.ids[column]
+        if column not in self.sortedIdOrders:
+            self.sortedIdOrders[column] = np.argsort(ids)
+        order = self.sortedIdOrders[column]
+        position = np.searchsorted(ids[order], id) if len(order) > 0 else 0
+        if position >= len(order) or ids[order[position]] != id:
+            return None
+        return np.asarray(self.vectors[column][order[position]], dtype=np.float32)
+
+    def __query_items(self, ids: list[int]) -> dict[int, tuple[str, str, str]]:
+        item_dict = {}
+        with self.lock:
+            for start in range(0, len(ids), LocalIvfIndex._MAX_ROWS_PER_STATEMENT):
+                chunk = ids[start:start + LocalIvfIndex._MAX_ROWS_PER_STATEMENT]
+                for id, file_sha256, file_path, file_name in self.connection.execute(
+                        f"SELECT id, file_sha256, file_path, file_name FROM items WHERE id IN ({', '.join('?' * len(chunk))})", chunk):
+                    item_dict[id] = (file_sha256, file_path, file_name)
+        return item_dict
+
+    def __reload_delta(self, column: str):
+        delta_rows = self.connection.execute("SELECT id, vector FROM delta_vectors WHERE column_name = ? ORDER BY id",
+                                             (column,)).fetchall()
+        self.deltaIds[column] = np.array([id for id, _ in delta_rows], dtype=np.int64)
+        self.deltaMatrices[column] = (np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in delta_rows])
+                                      if delta_rows else np.empty((0, self.dim), dtype=np.float32))
+        self.tombstones[column] = np.array(sorted(row[0] for row in self.connection.execute(
+            "SELECT id FROM tombstones WHERE column_name = ?", (column,))), dtype=np.int64)
+
+    @staticmethod
+    def build(path: str, rows: Iterable[tuple], count: int, dim: int, nlist: int | None = None, dtype: str = "float16",
+              synced_gmt_modified: datetime | None = None) -> int:
+        """ 从头建立索引。先写入临时目录，全部完成后再替换原索引。
+
+        Args:
+            path: 索引目录
+            rows: (主键, sha256, 文件路径, 文件名, 图片特征向量, 文本特征向量)，向量可以为None
+            count: 记录数量上限，用于预先分配临时文件
+            dim: 向量维度
+            nlist: 聚类数量，为None时按向量数量自动计算
+            dtype: 向量精度
+            synced_gmt_modified: rows读取时数据库中记录的最晚修改时间，之后sync_from_db只需同步修改时间更晚的记录
+
+        Returns:
+            写入的记录数量
+        """
+        temp_path = path + ".tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        connection = LocalIvfIndex.__create_items_db(os.path.join(temp_path, "items.db"))
+        raw_matrices = {column: np.lib.format.open_memmap(os.path.join(temp_path, f"raw_{column}.npy"), mode="w+",
+                                                          dtype=dtype, shape=(count, dim))
+                        for column in LocalIvfIndex.VECTOR_COLUMNS}
+        valids = {column: np.zeros(count, dtype=bool) for column in LocalIvfIndex.VECTOR_COLUMNS}
+        ids = np.zeros(count, dtype=np.int64)
+        written_count = 0
+        item_list = []
+        for id, file_sha256, file_path, file_name, *vectors in rows:
+            if written_count >= count:
+                break
+            ids[written_count] = id
+            for column, vector in zip(LocalIvfIndex.VECTOR_COLUMNS, vectors):
+                if vector is not None:
+                    raw_matrices[column][written_count] = LocalIvfIndex.__normalize(
+                        np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+                    valids[column][written_count] = True
+            item_list.append((id, file_sha256, file_path, file_name))
+            if len(item_list) >= LocalIvfIndex._MAX_ROWS_PER_STATEMENT:
+                connection.executemany("INSERT INTO items (id, file_sha256, file_path, file_name) VALUES (?, ?, ?, ?)", item_list)
+                item_list = []
+            written_count += 1
+        connection.executemany("INSERT INTO items (id, file_sha256, file_path, file_name) VALUES (?, ?, ?, ?)", item_list)
+        connection.commit()
+        connection.close()
+
+        for column in LocalIvfIndex.VECTOR_COLUMNS:
+            valid_rows = np.flatnonzero(valids[column][:written_count])
+            column_nlist = nlist or LocalIvfIndex.__default_nlist(len(valid_rows))
+            logger.info(f"训练聚类中心：{column}，向量{len(valid_rows)}条，聚类{column_nlist}个")
+            centroids = LocalIvfIndex.__train_centroids(raw_matrices[column], valid_rows, column_nlist)
+            assignments = LocalIvfIndex.__assign(raw_matrices[column], valid_rows, centroids)
+            LocalIvfIndex.__write_lists(temp_path, column, raw_matrices[column], ids[valid_rows], valid_rows, assignments, centroids)
+        del raw_matrices
+        for column in LocalIvfIndex.VECTOR_COLUMNS:
+            os.remove(os.path.join(temp_path, f"raw_{column}.npy"))
+        LocalIvfIndex.__write_meta(temp_path, dim, dtype, synced_gmt_modified)
+        LocalIvfIndex.__replace_dir(temp_path, path)
+        return written_count
+
+    @staticmethod
+    def compact(path: str):
+        """ 将增量区合并到基础索引，并清除已删除的向量。聚类中心保持不变，增量向量分配到最近的聚类；
+        建立索引时没有向量的列按合并后的向量重新训练聚类中心。
+        索引文件会被替换，执行前需要关闭正在使用该索引的进程。
+        """
+        index = LocalIvfIndex(path)
+        temp_path = path + ".tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        connection = sqlite3.connect(os.path.join(temp_path, "items.db"))
+        index.connection.backup(connection)
+        for column in LocalIvfIndex.VECTOR_COLUMNS:
+            base_ids = np.asarray(index.ids[column])
+            alive_rows = np.flatnonzero(~np.isin(base_ids, index.tombstones[column]))
+            delta_matrix = index.deltaMatrices[column]
+            # 基础向量和增量向量拼接后统一按聚类排列
+            matrix = _ConcatRows(index.vectors[column], alive_rows, delta_matrix)
+            rows = np.arange(len(alive_rows) + len(delta_matrix))
+            centroids = index.centroids[column]
+            if len(centroids) == 0 and len(rows) > 0:
+                # 建立索引时该列没有向量，检索时不会读取基础索引，需要先训练聚类中心
+                centroids = LocalIvfIndex.__train_centroids(matrix, rows, LocalIvfIndex.__default_nlist(len(rows)))
+                assignments = LocalIvfIndex.__assign(matrix, rows, centroids)
+            else:
+                base_assignments = np.searchsorted(index.offsets[column], alive_rows, side="right") - 1
+                delta_assignments = LocalIvfIndex.__assign(delta_matrix, np.arange(len(delta_matrix)), centroids)
+                assignments = np.concatenate([base_assignments, delta_assignments])
+            LocalIvfIndex.__write_lists(temp_path, column, matrix,
+                                        np.concatenate([base_ids[alive_rows], index.deltaIds[column]]),
+                                        rows, assignments, centroids)
+            logger.info(f"合并完成：{column}，基础{len(alive_rows)}条，增量{len(delta_matrix)}条")
+        # 释放对原索引文件的引用，Windows下内存映射中的文件无法移动
+        matrix = base_ids = None
+        connection.execute("DELETE FROM delta_vectors")
+        connection.execute("DELETE FROM tombstones")
+        connection.commit()
+        connection.execute("VACUUM")
+        connection.close()
+        LocalIvfIndex.__write_meta(temp_path, index.dim, index.meta["dtype"], index.syncedGmtModified)
+        index.close()
+        del index
+        LocalIvfIndex.__replace_dir(temp_path, path)
+
+    @staticmethod
+    def __create_items_db(db_path: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(db_path)
+        connection.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, file_sha256 TEXT, file_path TEXT, file_name TEXT)")
+        connection.execute("CREATE INDEX items_file_sha256_index ON items (file_sha256)")
+        connection.execute("CREATE TABLE delta_vectors (id INTEGER NOT NULL, column_name TEXT NOT NULL, vector BLOB NOT NULL, "
+                           "PRIMARY KEY (id, column_name))")
+        connection.execute("CREATE TABLE tombstones (id INTEGER NOT NULL, column_name TEXT NOT NULL, PRIMARY KEY (id, column_name))")
+        return connection
+
+    @staticmethod
+    def __default_nlist(vector_count: int) -> int:
+        # 与pgvector对IVFFlat的建议一致：100万以内为数量/1000，以上为数量的平方根
+        if vector_count == 0:
+            return 0
+        if vector_count <= 1000000:
+            return max(1, vector_count // 1000)
+        return int(np.sqrt(vector_count))
+
+    @staticmethod
+    def __train_centroids(matrix: np.ndarray, valid_rows: np.ndarray, nlist: int) -> np.ndarray:
+        """ 在抽样的向量上执行球面k-means（按内积分配，聚类中心归一化）。"""
+        if nlist == 0:
+            return np.empty((0, matrix.shape[1]), dtype=np.float32)
+        rng = np.random.default_rng(0)
+        sample_size = min(len(valid_rows), nlist * LocalIvfIndex.KMEANS_SAMPLES_PER_LIST)
+        sample_rows = np.sort(rng.choice(valid_rows, sample_size, replace=False))
+        samples = np.asarray(matrix[sample_rows], dtype=np.float32)
+        centroids = samples[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(LocalIvfIndex.KMEANS_ITERATIONS):
+            assignments = LocalIvfIndex.__assign(samples, np.arange(sample_size), centroids)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=nlist)
+            non_empty = counts > 0
+            starts = (np.cumsum(counts) - counts)[non_empty]
+            centroids[non_empty] = LocalIvfIndex.__normalize(np.add.reduceat(samples[order], starts, axis=0))
+            # 空聚类重新随机选取中心
+            empty_count = int((~non_empty).sum())
+            if empty_count:
+                centroids[~non_empty] = samples[rng.choice(sample_size, empty_count, replace=False)]
+        return centroids
+
+    @staticmethod
+    def __assign(matrix: np.ndarray, rows: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        if len(centroids) == 0:
+            if len(rows) > 0:
+                raise ValueError("没有聚类中心，无法分配向量")
+            return np.empty(0, dtype=np.int64)
+        assignments = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), LocalIvfIndex.BLOCK_ROWS):
+            block = np.asarray(matrix[rows[start:start + LocalIvfIndex.BLOCK_ROWS]], dtype=np.float32)
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    @staticmethod
+    def __write_lists(dir_path: str, column: str, matrix, ids: np.ndarray, rows: np.ndarray, assignments: np.ndarray,
+                      centroids: np.ndarray):
+        order = np.argsort(assignments, kind="stable")
+        sorted_rows = rows[order]
+        vectors = np.lib.format.open_memmap(os.path.join(dir_path, f"{column}_vectors.npy"), mode="w+",
+                                            dtype=matrix.dtype, shape=(len(sorted_rows), centroids.shape[1]))
+        for start in range(0, len(sorted_rows), LocalIvfIndex.BLOCK_ROWS):
+            vectors[start:start + LocalIvfIndex.BLOCK_ROWS] = matrix[sorted_rows[start:start + LocalIvfIndex.BLOCK_ROWS]]
+        vectors.flush()
+        del vectors
+        np.save(os.path.join(dir_path, f"{column}_ids.npy"), ids[order])
+        np.save(os.path.join(dir_path, f"{column}_offsets.npy"),
+                np.searchsorted(assignments[order], np.arange(len(centroids) + 1)))
+        np.save(os.path.join(dir_path, f"{column}_centroids.npy"), centroids.astype(np.float32))
+
+    @staticmethod
+    def __write_meta(dir_path: str, dim: int, dtype: str, synced_gmt_modified: datetime | None):
+        LocalIvfIndex.__save_meta(dir_path, {"format_version": LocalIvfIndex.FORMAT_VERSION, "dim": dim, "dtype": dtype,
+                                             "created": datetime.now().isoformat(timespec="seconds"),
+                                             "synced_gmt_modified": synced_gmt_modified.isoformat() if synced_gmt_modified else None})
+
+    @staticmethod
+    def __save_meta(dir_path: str, meta: dict):
+        # 先写入临时文件再替换，检索进程不会读到写了一半的文件
+        temp_file_path = os.path.join(dir_path, "meta.json.tmp")
+        with open(temp_file_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file_path, os.path.join(dir_path, "meta.json"))
+
+    @staticmethod
+    def __replace_dir(temp_path: str, path: str):
+        old_path = path + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(temp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @staticmethod
+    def __normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+
+class _ConcatRows:
+    """ 将基础向量中的指定行与增量向量拼接为一个只读矩阵，按行号读取时不复制整个基础向量文件。"""
+
+    def __init__(self, base: np.ndarray, base_rows: np.ndarray, delta: np.ndarray):
+        self.base = base
+        self.baseRows = base_rows
+        self.delta = delta.astype(base.dtype)
+        self.dtype = base.dtype
+
+    def __getitem__(self, rows: np.ndarray) -> np.ndarray:
+        is_base = rows < len(self.baseRows)
+        result = np.empty((len(rows), self.base.shape[1]), dtype=self.dtype)
+        result[is_base] = self.base[self.baseRows[rows[is_base]]]
+        result[~is_base] = self.delta[rows[~is_base] - len(self.baseRows)]
+        return result
@@ -0,0 +1,182 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+local_vector_index.py
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Iterable
+
+import numpy as np
+
+from src.app.db.models.image_info_result import ImageInfoResult
+from src.app.log.logger import logger
+
+
+class LocalVectorIndex:
+    """ 本地向量快照及其精确检索。
+
+    快照是一个目录，由run_export_vector_snapshot.py从数据库导出：
+    - meta.json：快照格式、向量维度、精度、记录数和导出时间；
+    - {列名}.npy：归一化后的向量矩阵，每行对应一条记录，向量为空的行填0；
+    - {列名}_valid.npy：每行的向量是否不为空；
+    - items.jsonl：每行一条记录的主键、sha256、文件路径和文件名，顺序与向量矩阵一致。
+
+    向量矩阵以内存映射方式打开，只有检索时读到的部分才会载入内存。检索时分块计算矩阵乘法，
+    每块用argpartition取出前k个，最后合并排序，结果与按余弦距离全表排序相同。
+    """
+    FORMAT_VERSION = 1
+    VECTOR_COLUMNS = ("image_vector", "all_text_vector")
+    # 每块参与矩阵乘法的行数，块内的向量会转换为float32
+    BLOCK_ROWS = 16384
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta: dict = json.load(f)
+        if self.meta["format_version"] != LocalVectorIndex.FORMAT_VERSION:
+            raise ValueError(f"不支持的向量快照格式：{self.meta['format_version']}")
+        count = self.meta["count"]
+        self.matrices: dict[str, np.ndarray] = {}
+        self.valids: dict[str, np.ndarray] = {}
+        for column in LocalVectorIndex.VECTOR_COLUMNS:
+            self.matrices[column] = np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")[:count]
+            self.valids[column] = np.load(os.path.join(path, f"{column}_valid.npy"))[:count]
+        self.ids = np.empty(count, dtype=np.int64)
+        self.fileSha256List: list[str] = []
+        self.filePathList: list[str] = []
+        self.fileNameList: list[str] = []
+        with open(os.path.join(path, "items.jsonl"), encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if i >= count:
+                    break
+                item = json.loads(line)
+                self.ids[i] = item["id"]
+                self.fileSha256List.append(item["file_sha256"])
+                self.filePathList.append(item["file_path"])
+                self.fileNameList.append(item["file_name"])
+        # 查询向量时使用。在加载时建立，多个检索线程可以同时读取
+        self.idRowDict: dict[int, int] = {int(id): row for row, id in enumerate(self.ids)}
+        self.sha256RowDict: dict[str, int] = {}
+        for row, sha256 in enumerate(self.fileSha256List):
+            # 同一内容有多条记录时取向量完整的一条
+            if sha256 not in self.sha256RowDict and self.__is_complete(row):
+                self.sha256RowDict[sha256] = row
+        logger.info(f"已加载向量快照：{path}，记录数：{count}，精度：{self.meta['dtype']}，导出时间：{self.meta['created']}")
+
+    def search(self, column: str, vector, cosine_similarity: float | None, limit: int) -> list[ImageInfoResult]:
+        """ 按余弦距离精确检索最相似的记录。
+
+        Args:
+            column: image_vector或all_text_vector
+            vector: 查询向量
+            cosine_similarity: 相似度阈值，为None时不过滤
+            limit: 最多返回的记录数量
+
+        Returns:
+            按余弦距离升序排列的结果
+        """
+        matrix = self.matrices[column]
+        valid = self.valids[column]
+        query = LocalVectorIndex.__normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        candidate_rows = []
+        candidate_scores = []
+        for start in range(0, len(matrix), LocalVectorIndex.BLOCK_ROWS):
+            end = min(start + LocalVectorIndex.BLOCK_ROWS, len(matrix))
+            # 快照中的向量已归一化，内积即为余弦相似度
+            scores = np.asarray(matrix[start:end], dtype=np.float32) @ query
+            scores[~valid[start:end]] = -np.inf
+            if len(scores) > limit:
+                rows = np.argpartition(-scores, limit - 1)[:limit]
+            else:
+                rows = np.arange(len(scores))
+            candidate_rows.append(rows + start)
+            candidate_scores.append(scores[rows])
+        if not candidate_rows:
+            return []
+        rows = np.concatenate(candidate_rows)
+        scores = np.concatenate(candidate_scores)
+        order = np.argsort(-scores, kind="stable")[:limit]
+        result = []
+        for row, score in zip(rows[order], scores[order]):
+            if score == -np.inf:
+                break
+            cosine_distance = float(1 - score)
+            if cosine_similarity is not None and cosine_distance >= 1 - cosine_similarity:
+                break
+            result.append(ImageInfoResult(id=int(self.ids[row]), file_path=self.filePathList[row], file_name=self.fileNameList[row],
+                                          file_sha256=self.fileSha256List[row], cosine_distance=cosine_distance))
+        return result
+
+    def query_vectors(self, id: int | None = None, file_sha256: str | None = None) -> tuple | None:
+        """ 按主键或文件sha256查询快照中的图片特征向量和文本特征向量。
+
+        Returns:
+            (图片特征向量, 文本特征向量)，记录不存在或向量为空时返回None
+        """
+        row = self.idRowDict.get(id) if id is not None else self.sha256RowDict.get(file_sha256)
+        if row is None or not self.__is_complete(row):
+            return None
+        return tuple(np.asarray(self.matrices[column][row], dtype=np.float32) for column in LocalVectorIndex.VECTOR_COLUMNS)
+
+    def __is_complete(self, row: int) -> bool:
+        return all(self.valids[column][row] for column in LocalVectorIndex.VECTOR_COLUMNS)
+
+    @staticmethod
+    def export(path: str, rows: Iterable[tuple], count: int, dim: int, dtype: str = "float16") -> int:
+        """ 将记录写入新的向量快照。先写入临时目录，全部写完后再替换原快照，检索进程不会读到写了一半的快照。
+
+        Args:
+            path: 快照目录
+            rows: (主键, sha256, 文件路径, 文件名, 图片特征向量, 文本特征向量)，向量可以为None
+            count: 记录数量上限，用于预先分配向量文件
+            dim: 向量维度
+            dtype: 向量精度，float16时文件大小为float32的一半
+
+        Returns:
+            写入的记录数量
+        """
+        temp_path = path + ".tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        matrices = {column: np.lib.format.open_memmap(os.path.join(temp_path, f"{column}.npy"), mode="w+",
+                                                      dtype=dtype, shape=(count, dim))
+                    for column in LocalVectorIndex.VECTOR_COLUMNS}
+        valids = {column: np.zeros(count, dtype=bool) for column in LocalVectorIndex.VECTOR_COLUMNS}
+        written_count = 0
+        with open(os.path.join(temp_path, "items.jsonl"), "w", encoding="utf-8") as f:
+            for id, file_sha256, file_path, file_name, *vectors in rows:
+                if written_count >= count:
+                    break
+                for column, vector in zip(LocalVectorIndex.VECTOR_COLUMNS, vectors):
+                    if vector is not None:
+                        matrices[column][written_count] = LocalVectorIndex.__normalize(
+                            np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+                        valids[column][written_count] = True
+                f.write(json.dumps({"id": id, "file_sha256": file_sha256, "file_path": file_path, "file_name": file_name},
+                                   ensure_ascii=False) + "\n")
+                written_count += 1
+        for column in LocalVectorIndex.VECTOR_COLUMNS:
+            matrices[column].flush()
+            np.save(os.path.join(temp_path, f"{column}_valid.npy"), valids[column])
+        del matrices
+        with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"format_version": LocalVectorIndex.FORMAT_VERSION, "dim": dim, "dtype": dtype, "count": written_count,
+                       "created": datetime.now().isoformat(timespec="seconds")}, f, ensure_ascii=False, indent=2)
+
+        old_path = path + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(temp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return written_count
+
+    @staticmethod
+    def __normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
@@ -0,0 +1,17 @@
+"""
+Copyright © 2025-2025 tmx0103.
+Licensed under the Apache-2.0 License.
+For full terms, see the LICENSE file.
+vector_search_backend_enum.py
+"""
+from enum import Enum
+
+
+class VectorSearchBackendEnum(Enum):
+    """ 检索相似图片时使用的向量检索后端，通过.env中的VECTOR_SEARCH_BACKEND配置。"""
+    # 在PostgreSQL中使用pgvector检索
+    POSTGRES = "postgres"
+    # 在本进程中对导出的向量快照精确检索，无需连接数据库
+    LOCAL = "local"
+    # 在本进程中使用本地IVF近似索引检索，支持增量同步数据库中的变化
+    LOCAL_IVF = "local_ivf"